@@ -0,0 +1,32 @@
+"""add customer lookup indexes
+
+Revision ID: 0735666197ef
+Revises: 20b204210ee3
+Create Date: 2026-10-17 23:48:03.551207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0735666197ef'
+down_revision: Union[str, None] = '20b204210ee3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('customer') as batch_op:
+        batch_op.create_index('ix_customer_email', ['email'], unique=False)
+        batch_op.create_index('ix_customer_last_name', ['last_name'], unique=False)
+        batch_op.create_index('ix_customer_first_name', ['first_name'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('customer') as batch_op:
+        batch_op.drop_index('ix_customer_first_name')
+        batch_op.drop_index('ix_customer_last_name')
+        batch_op.drop_index('ix_customer_email')
@@ -0,0 +1,43 @@
+"""add webhook inbox table
+
+Revision ID: 20b204210ee3
+Revises: dff89a37225c
+Create Date: 2026-10-17 23:12:40.318825
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20b204210ee3'
+down_revision: Union[str, None] = 'dff89a37225c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'webhook_inbox',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('idempotency_key', sa.String(length=255), nullable=True),
+        sa.Column('order_id', sa.UUID(), nullable=False),
+        sa.Column('payment_status', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.Enum('pending', 'processing', 'done', 'failed', name='webhookinboxstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('webhook_inbox', schema=None) as batch_op:
+        batch_op.create_index('ix_webhook_inbox_status_id', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('webhook_inbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_webhook_inbox_status_id')
+
+    op.drop_table('webhook_inbox')
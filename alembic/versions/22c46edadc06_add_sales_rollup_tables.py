@@ -0,0 +1,44 @@
+"""add sales rollup tables
+
+Revision ID: 22c46edadc06
+Revises: 0735666197ef
+Create Date: 2026-10-18 00:31:27.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '22c46edadc06'
+down_revision: Union[str, None] = '0735666197ef'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'customer_sales',
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('completed_order_count', sa.Integer(), nullable=False),
+        sa.Column('lifetime_spend', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('last_order_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['customer_id'], ['customer.id'], ),
+        sa.PrimaryKeyConstraint('customer_id')
+    )
+    op.create_table(
+        'product_sales',
+        sa.Column('product_id', sa.UUID(), nullable=False),
+        sa.Column('units_ordered', sa.Integer(), nullable=False),
+        sa.Column('units_sold', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('product_sales')
+    op.drop_table('customer_sales')
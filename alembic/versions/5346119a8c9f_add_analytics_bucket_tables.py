@@ -0,0 +1,42 @@
+"""add analytics bucket tables
+
+Revision ID: 5346119a8c9f
+Revises: 22c46edadc06
+Create Date: 2026-10-18 01:14:52.730961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5346119a8c9f'
+down_revision: Union[str, None] = '22c46edadc06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sales_bucket',
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('event', sa.Enum('placed', 'completed', 'canceled', name='orderevent'), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('bucket', 'event')
+    )
+    op.create_table(
+        'product_sales_bucket',
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('product_id', sa.UUID(), nullable=False),
+        sa.Column('units_sold', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.PrimaryKeyConstraint('bucket', 'product_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('product_sales_bucket')
+    op.drop_table('sales_bucket')
@@ -0,0 +1,34 @@
+"""add order reservation columns
+
+Revision ID: a3c3b2234633
+Revises: 90f40b9ea4e5
+Create Date: 2026-10-17 20:10:42.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c3b2234633'
+down_revision: Union[str, None] = '90f40b9ea4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.add_column(sa.Column('reservation_status', sa.Enum('pending', 'reserved', 'expired', 'completed', 'cancelled', name='reservationstatus'), nullable=True))
+        batch_op.add_column(sa.Column('reserved_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('reservation_expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_orders_reservation_expiry', ['reservation_status', 'reservation_expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_index('ix_orders_reservation_expiry')
+        batch_op.drop_column('reservation_expires_at')
+        batch_op.drop_column('reserved_at')
+        batch_op.drop_column('reservation_status')
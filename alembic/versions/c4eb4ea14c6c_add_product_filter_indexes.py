@@ -0,0 +1,30 @@
+"""add product filter indexes
+
+Revision ID: c4eb4ea14c6c
+Revises: a3c3b2234633
+Create Date: 2026-10-17 21:02:15.480137
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4eb4ea14c6c'
+down_revision: Union[str, None] = 'a3c3b2234633'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.create_index('ix_product_quantity', ['quantity'], unique=False)
+        batch_op.create_index('ix_product_price', ['price'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_index('ix_product_price')
+        batch_op.drop_index('ix_product_quantity')
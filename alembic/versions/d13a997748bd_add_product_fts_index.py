@@ -0,0 +1,32 @@
+"""add product fts index
+
+Revision ID: d13a997748bd
+Revises: 5346119a8c9f
+Create Date: 2026-10-18 01:52:19.446083
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd13a997748bd'
+down_revision: Union[str, None] = '5346119a8c9f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # FTS5 虚拟表只在 SQLite 上创建，并用现有产品回填
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('CREATE VIRTUAL TABLE product_fts USING fts5(key UNINDEXED, name, description)')
+    op.execute('INSERT INTO product_fts (key, name, description) SELECT id, name, description FROM product')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE product_fts')
@@ -0,0 +1,34 @@
+"""add order hot path indexes
+
+Revision ID: f60a9f319776
+Revises: c4eb4ea14c6c
+Create Date: 2026-10-17 21:18:40.927351
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f60a9f319776'
+down_revision: Union[str, None] = 'c4eb4ea14c6c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.create_index('ix_orders_status_payment_created', ['status', 'payment_status', 'created_at'], unique=False)
+        batch_op.create_index('ix_orders_customer_created', ['customer_id', 'created_at'], unique=False)
+    with op.batch_alter_table('order_product') as batch_op:
+        batch_op.create_index('ix_order_product_product_id', ['product_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('order_product') as batch_op:
+        batch_op.drop_index('ix_order_product_product_id')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_index('ix_orders_customer_created')
+        batch_op.drop_index('ix_orders_status_payment_created')
@@ -13,3 +13,52 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger(__name__)
+
+# 过期库存预订的清理间隔（秒）和每批处理的订单数
+RESERVATION_SWEEP_INTERVAL_SECONDS = float(
+    os.getenv("RESERVATION_SWEEP_INTERVAL_SECONDS", "30")
+)
+RESERVATION_SWEEP_BATCH_SIZE = int(os.getenv("RESERVATION_SWEEP_BATCH_SIZE", "500"))
+
+# 数据库连接池配置
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# 产品读缓存：条目有效期（秒）和最大条目数
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "60"))
+PRODUCT_CACHE_MAX_SIZE = int(os.getenv("PRODUCT_CACHE_MAX_SIZE", "1024"))
+
+# 列表接口直接用 orjson 输出，跳过 response_model 的再次校验
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() == "true"
+
+# 流式导出时每次从数据库游标取的行数
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# 批量导入/更新产品时每个事务写入的行数
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+# webhook 幂等键的内存缓存（数据库中的 webhook_event 表为准）
+WEBHOOK_IDEMPOTENCY_CACHE_SIZE = int(os.getenv("WEBHOOK_IDEMPOTENCY_CACHE_SIZE", "10000"))
+WEBHOOK_IDEMPOTENCY_CACHE_TTL_SECONDS = float(
+    os.getenv("WEBHOOK_IDEMPOTENCY_CACHE_TTL_SECONDS", "3600")
+)
+
+# 支付回调的处理方式：inline 在请求中直接处理；queued 先写入 webhook_inbox 立即返回，由后台任务批量处理
+WEBHOOK_INGESTION_MODE = os.getenv("WEBHOOK_INGESTION_MODE", "inline").lower()
+# 队列中待处理的记录超过该值时拒绝新的回调（503），让支付服务稍后重试
+WEBHOOK_QUEUE_MAX_DEPTH = int(os.getenv("WEBHOOK_QUEUE_MAX_DEPTH", "10000"))
+WEBHOOK_WORKER_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_WORKER_INTERVAL_SECONDS", "1"))
+WEBHOOK_WORKER_BATCH_SIZE = int(os.getenv("WEBHOOK_WORKER_BATCH_SIZE", "200"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+# 处理完成（done）的 webhook_inbox 记录保留的时间，过期后由清理任务分批删除
+WEBHOOK_INBOX_RETENTION_SECONDS = float(os.getenv("WEBHOOK_INBOX_RETENTION_SECONDS", "86400"))
+WEBHOOK_INBOX_CLEANUP_INTERVAL_SECONDS = float(
+    os.getenv("WEBHOOK_INBOX_CLEANUP_INTERVAL_SECONDS", "60")
+)
+WEBHOOK_INBOX_CLEANUP_BATCH_SIZE = int(os.getenv("WEBHOOK_INBOX_CLEANUP_BATCH_SIZE", "1000"))
+# 批量支付回调一次最多包含的订单数（受 IN 列表长度限制）
+WEBHOOK_BATCH_MAX_SIZE = int(os.getenv("WEBHOOK_BATCH_MAX_SIZE", "1000"))
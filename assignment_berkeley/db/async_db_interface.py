@@ -0,0 +1,168 @@
+from typing import Any, Iterable, List, Optional
+from assignment_berkeley.db.db_interface import BaseDBInterface, DataObject
+from assignment_berkeley.db.models import serializer_for, to_dict
+from assignment_berkeley.helpers.db_helpers import (
+    with_async_session,
+    async_validate_and_get_item,
+    _parse_item_id,
+)
+
+
+class AsyncDBInterface(BaseDBInterface):
+    """DBInterface 的异步版本，基于 AsyncSession，查询构建逻辑与同步版本共用"""
+
+    @with_async_session
+    async def get_by_id(self, id: str, *, session: Optional[Any] = None) -> DataObject:
+        async def load() -> DataObject:
+            return to_dict(await async_validate_and_get_item(session, id, self.db_class))
+
+        if self.cache is None:
+            return await load()
+        return await self.cache.get_or_load_async(self._cache_key(id), load)
+
+    @with_async_session
+    async def get_all(
+        self,
+        filter_params: dict = None,
+        *,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        session: Optional[Any] = None,
+    ) -> list[DataObject]:
+        fields = self._projection(fields)
+        query = self._build_query(filter_params, limit, offset, fields)
+        if fields:
+            items = (await session.execute(query)).all()
+        else:
+            items = (await session.scalars(query)).all()
+        return list(map(serializer_for(self.db_class, fields), items))
+
+    @with_async_session
+    async def count(
+        self, filter_params: dict = None, *, session: Optional[Any] = None
+    ) -> int:
+        return await session.scalar(self._count_query(filter_params))
+
+    @with_async_session
+    async def get_keyset_page(
+        self,
+        filter_params: dict = None,
+        *,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        session: Optional[Any] = None,
+    ) -> tuple[list[DataObject], Optional[str]]:
+        query = self._keyset_query(
+            filter_params, cursor, limit, session.get_bind().dialect.name
+        )
+        items = (await session.scalars(query)).all()
+        return self._keyset_result(items, limit)
+
+    async def _sync_search(self, ids: Iterable[Any], session: Any, **kwargs) -> None:
+        for statement in self._search_sync_statements(ids, session, **kwargs):
+            await session.execute(statement)
+
+    @with_async_session
+    async def search(
+        self,
+        query: str,
+        *,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        session: Optional[Any] = None,
+    ) -> list[DataObject]:
+        statement, _ = self._search_queries(query, limit, offset, session)
+        if statement is None:
+            return []
+        return list(map(to_dict, (await session.scalars(statement)).all()))
+
+    @with_async_session
+    async def search_count(self, query: str, *, session: Optional[Any] = None) -> int:
+        _, statement = self._search_queries(query, None, None, session)
+        return 0 if statement is None else await session.scalar(statement)
+
+    @with_async_session
+    async def create(
+        self, data: DataObject, *, session: Optional[Any] = None
+    ) -> DataObject:
+        item = self.db_class(**data)
+        session.add(item)
+        await session.flush()
+        await session.refresh(item)
+        await self._sync_search([item.id], session)
+        return to_dict(item)
+
+    @with_async_session
+    async def update(
+        self, id: str, data: DataObject, *, session: Optional[Any] = None
+    ) -> DataObject:
+        item = await async_validate_and_get_item(session, id, self.db_class)
+        for key, value in data.items():
+            setattr(item, key, value)
+        await session.flush()
+        self._invalidate(id, session)
+        await self._sync_search([item.id], session, changed=data)
+        # onupdate 生成的字段在 flush 后过期，异步模式下不能懒加载
+        await session.refresh(item)
+        return to_dict(item)
+
+    @with_async_session
+    async def delete(self, id: str, *, session: Optional[Any] = None) -> DataObject:
+        item = await async_validate_and_get_item(session, id, self.db_class)
+        await session.delete(item)
+        self._invalidate(id, session)
+        await self._sync_search([item.id], session, deleted=True)
+        return {"detail": "Product deleted successfully"}
+
+    @with_async_session
+    async def bulk_create(
+        self, rows: List[DataObject], *, session: Optional[Any] = None
+    ) -> int:
+        if not rows:
+            return 0
+        result = await session.execute(self._bulk_insert_query(), rows)
+        if self.search_index is not None:
+            await self._sync_search(result.scalars().all(), session)
+        return len(rows)
+
+    @with_async_session
+    async def bulk_update(
+        self, rows: List[DataObject], *, session: Optional[Any] = None
+    ) -> int:
+        updated = 0
+        for statement, params in self._bulk_update_batches(rows):
+            updated += (await session.execute(statement, params)).rowcount
+        self._invalidate_many((row["id"] for row in rows), session)
+        await self._sync_search(
+            (_parse_item_id(row["id"]) for row in rows),
+            session,
+            changed={key for row in rows for key in row},
+        )
+        return updated
+
+    @with_async_session
+    async def bulk_delete(
+        self, ids: List[Any], *, session: Optional[Any] = None
+    ) -> int:
+        ids = [_parse_item_id(id) for id in ids]
+        if not ids:
+            return 0
+        for statement in self._secondary_delete_queries(ids):
+            await session.execute(statement)
+        result = await session.execute(
+            self._bulk_delete_query(ids),
+            execution_options={"synchronize_session": False},
+        )
+        self._invalidate_many(ids, session)
+        await self._sync_search(ids, session, deleted=True)
+        return result.rowcount
+
+    @with_async_session
+    async def existing_ids(
+        self, ids: List[Any], *, session: Optional[Any] = None
+    ) -> set:
+        ids = [_parse_item_id(id) for id in ids]
+        if not ids:
+            return set()
+        return set(await session.scalars(self._existing_ids_query(ids)))
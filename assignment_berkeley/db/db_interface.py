@@ -1,48 +1,346 @@
-from typing import Any, Dict, Type, Optional
+from datetime import datetime
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Type, Optional
 from uuid import UUID
 from fastapi import HTTPException
-from sqlalchemy import and_
+from sqlalchemy import (
+    String,
+    and_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    inspect,
+    or_,
+    select,
+    type_coerce,
+    update,
+)
+from sqlalchemy.sql import Select
 from assignment_berkeley.db.models import (
     Base,
     to_dict,
+    serializer_for,
     order_product,
     DBProduct,
     DBOrder,
 )
-from assignment_berkeley.helpers.db_helpers import with_session, validate_and_get_item
+from assignment_berkeley.db import engine as db_engine
+from assignment_berkeley.db.filters import compile_filters
+from assignment_berkeley.db.search import FTS5Index
+from assignment_berkeley.helpers.cache import ReadThroughCache
+from assignment_berkeley.helpers.db_helpers import (
+    with_session,
+    validate_and_get_item,
+    _parse_item_id,
+)
+from assignment_berkeley.helpers.pagination import encode_cursor, decode_cursor
 
 DataObject = dict[str, Any]
 
 
-class DBInterface:
-    def __init__(self, db_class: type[Base]):
+class BaseDBInterface:
+    """同步和异步接口共用的查询构建逻辑"""
+
+    def __init__(
+        self,
+        db_class: type[Base],
+        cache: Optional[ReadThroughCache] = None,
+        search_index: Optional[FTS5Index] = None,
+    ):
         self.db_class = db_class
+        # 按ID读取的缓存，update/delete 时失效
+        self.cache = cache
+        # 全文索引，所有写操作后按主键同步
+        self.search_index = search_index
+
+    def _cache_key(self, id: str) -> str:
+        return str(_parse_item_id(id))
+
+    def _invalidate(self, id: str, session: Any) -> None:
+        self._invalidate_many([id], session)
+
+    def _invalidate_many(self, ids: Iterable[Any], session: Any) -> None:
+        if self.cache is not None:
+            self.cache.invalidate([self._cache_key(id) for id in ids], session)
+
+    def _search_sync_statements(
+        self,
+        ids: Iterable[Any],
+        session: Any,
+        changed: Optional[Iterable[str]] = None,
+        deleted: bool = False,
+    ) -> list:
+        """写入后同步全文索引的语句；changed 为更新的列，没有涉及索引列时不需要同步"""
+        if self.search_index is None or not self.search_index.enabled(session):
+            return []
+        if changed is not None and not set(changed) & set(self.search_index.columns):
+            return []
+        return self.search_index.sync_statements(ids, deleted)
+
+    def _search_queries(
+        self,
+        query: str,
+        limit: Optional[int],
+        offset: Optional[int],
+        session: Any,
+    ) -> tuple:
+        """(结果查询, 计数查询)，没有可搜索的词时均为 None"""
+        if self.search_index is None:
+            raise ValueError(f"{self.db_class.__name__} has no search index")
+        dialect = session.get_bind().dialect.name
+        return (
+            self.search_index.search_query(query, dialect, limit, offset),
+            self.search_index.count_query(query, dialect),
+        )
+
+    def _primary_key(self):
+        return self.db_class.__table__.c.id
+
+    def _existing_ids_query(self, ids: list) -> Select:
+        return select(self._primary_key()).where(self._primary_key().in_(ids))
+
+    def _bulk_update_batches(self, rows: Iterable[DataObject]) -> list[tuple]:
+        """
+        按主键批量UPDATE：每行必须包含 id，字段集合相同的行合并成一条 executemany，
+        SET 子句由参数的键决定，updated_at 等 onupdate 列照常生效
+        """
+        groups: Dict[tuple, list] = defaultdict(list)
+        for row in rows:
+            values = {key: value for key, value in row.items() if key != "id"}
+            if values:
+                groups[tuple(sorted(values))].append(
+                    {"_id": _parse_item_id(row["id"]), **values}
+                )
+        statement = update(self.db_class.__table__).where(
+            self._primary_key() == bindparam("_id")
+        )
+        return [(statement, params) for params in groups.values()]
+
+    def _bulk_insert_query(self):
+        """有全文索引时用 RETURNING 取回主键（包括由列默认值生成的），供同步索引使用"""
+        query = insert(self.db_class)
+        if self.search_index is not None:
+            query = query.returning(self._primary_key())
+        return query
+
+    def _bulk_delete_query(self, ids: list):
+        return delete(self.db_class).where(self._primary_key().in_(ids))
+
+    def _secondary_delete_queries(self, ids: list) -> list:
+        """
+        批量删除前先删掉多对多关联表（如 order_product）中引用这些主键的行，
+        与 session.delete 通过 relationship(secondary=...) 清理关联行的行为一致
+        """
+        source = self.db_class.__table__
+        return [
+            delete(relation.secondary).where(column.in_(ids))
+            for relation in inspect(self.db_class).relationships
+            if relation.secondary is not None
+            for column in relation.secondary.columns
+            if any(key.references(source) for key in column.foreign_keys)
+        ]
+
+    def _filter_clauses(self, filter_params: Optional[dict] = None) -> list:
+        """把过滤参数转换为WHERE条件，支持 _gt/_lte/_in/_like 等后缀，见 db/filters.py"""
+        return compile_filters(self.db_class, filter_params)
+
+    def _order_columns(self) -> tuple:
+        """分页使用的稳定排序：优先 (created_at, id)，否则按主键"""
+        if hasattr(self.db_class, "created_at"):
+            return (self.db_class.created_at, self.db_class.id)
+        return tuple(self.db_class.__table__.primary_key.columns)
 
+    def _projection(self, fields: Optional[Iterable[str]] = None) -> Optional[tuple]:
+        """校验要投影的列名（去重、保持顺序），None 表示全部列"""
+        if not fields:
+            return None
+        fields = tuple(dict.fromkeys(fields))
+        columns = inspect(self.db_class).column_attrs
+        unknown = [name for name in fields if name not in columns]
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+        return fields
+
+    def _build_query(
+        self,
+        filter_params: Optional[dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        fields: Optional[tuple] = None,
+    ) -> Select:
+        """fields 不为空时只 SELECT 这些列"""
+        if fields:
+            query = select(*(getattr(self.db_class, name) for name in fields))
+        else:
+            query = select(self.db_class)
+        query = query.where(*self._filter_clauses(filter_params))
+        if limit is not None or offset:
+            query = query.order_by(*self._order_columns())
+            if limit is not None:
+                query = query.limit(limit)
+            if offset:
+                query = query.offset(offset)
+        return query
+
+    def _count_query(self, filter_params: Optional[dict] = None) -> Select:
+        return (
+            select(func.count())
+            .select_from(self.db_class)
+            .where(*self._filter_clauses(filter_params))
+        )
+
+    def _keyset_clause(self, columns: tuple, values: list, dialect_name: str):
+        """(c1, c2, ...) > (v1, v2, ...) 的字典序条件，可以利用 (created_at, id) 索引"""
+        if dialect_name == "sqlite":
+            # SQLite 把 server_default 的时间存成不带微秒的文本，
+            # 按相同格式的字符串比较，避免同一秒内的记录被跳过
+            values = [
+                type_coerce(str(value), String) if isinstance(value, datetime) else value
+                for value in values
+            ]
+        clause = columns[-1] > values[-1]
+        for column, value in zip(reversed(columns[:-1]), reversed(values[:-1])):
+            clause = or_(column > value, and_(column == value, clause))
+        return clause
+
+    def _keyset_query(
+        self,
+        filter_params: Optional[dict],
+        cursor: Optional[str],
+        limit: int,
+        dialect_name: str,
+    ) -> Select:
+        """多取一条用来判断是否还有下一页"""
+        columns = self._order_columns()
+        query = select(self.db_class).where(*self._filter_clauses(filter_params))
+        if cursor:
+            values = decode_cursor(cursor, [c.type.python_type for c in columns])
+            query = query.where(self._keyset_clause(columns, values, dialect_name))
+        return query.order_by(*columns).limit(limit + 1)
+
+    def _keyset_result(
+        self, items: list, limit: int
+    ) -> tuple[list[DataObject], Optional[str]]:
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(
+                [getattr(items[-1], column.key) for column in self._order_columns()]
+            )
+        return list(map(serializer_for(self.db_class), items)), next_cursor
+
+
+class DBInterface(BaseDBInterface):
     @with_session
     def get_by_id(self, id: str, *, session: Optional[Any] = None) -> DataObject:
         """通过ID获取记录"""
         if session is None:
             raise ValueError("Session is required")
-        item = validate_and_get_item(session, id, self.db_class)
-        return to_dict(item)
+        if self.cache is None:
+            return to_dict(validate_and_get_item(session, id, self.db_class))
+        return self.cache.get_or_load(
+            self._cache_key(id),
+            lambda: to_dict(validate_and_get_item(session, id, self.db_class)),
+        )
 
     @with_session
     def get_all(
-        self, filter_params: dict = None, *, session: Optional[Any] = None
+        self,
+        filter_params: dict = None,
+        *,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        session: Optional[Any] = None,
     ) -> list[DataObject]:
-        """增强的get_all方法，支持通用过滤"""
+        """
+        增强的get_all方法，支持通用过滤；传入limit/offset时在数据库端分页，
+        传入fields时只查询并返回这些列
+        """
         if session is None:
             raise ValueError("Session is required")
 
-        query = session.query(self.db_class)
+        fields = self._projection(fields)
+        query = self._build_query(filter_params, limit, offset, fields)
+        items = session.execute(query).all() if fields else session.scalars(query).all()
+        return list(map(serializer_for(self.db_class, fields), items))
 
-        if filter_params:
-            for key, value in filter_params.items():
-                if hasattr(self.db_class, key) and value is not None:
-                    query = query.filter(getattr(self.db_class, key) == value)
+    @with_session
+    def count(
+        self, filter_params: dict = None, *, session: Optional[Any] = None
+    ) -> int:
+        """统计满足过滤条件的记录数（SELECT COUNT）"""
+        if session is None:
+            raise ValueError("Session is required")
 
-        items = query.all()
-        return [to_dict(item) for item in items]
+        return session.scalar(self._count_query(filter_params))
+
+    @with_session
+    def get_keyset_page(
+        self,
+        filter_params: dict = None,
+        *,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        session: Optional[Any] = None,
+    ) -> tuple[list[DataObject], Optional[str]]:
+        """基于游标的分页，深翻页也只需要一次索引范围扫描"""
+        if session is None:
+            raise ValueError("Session is required")
+
+        query = self._keyset_query(
+            filter_params, cursor, limit, session.get_bind().dialect.name
+        )
+        return self._keyset_result(session.scalars(query).all(), limit)
+
+    def stream(
+        self, filter_params: dict = None, *, batch_size: int = 1000
+    ) -> Iterator[DataObject]:
+        """
+        按 (created_at, id) 顺序流式读取全部记录，用于导出。
+        查询在调用时构建（过滤参数错误立即报出），迭代时才打开自己的session，
+        用 yield_per 分批从数据库游标取数，内存占用与总行数无关。
+        """
+        query = (
+            select(*self.db_class.__table__.columns)
+            .where(*self._filter_clauses(filter_params))
+            .order_by(*self._order_columns())
+            .execution_options(yield_per=batch_size)
+        )
+        return self._stream_rows(query, serializer_for(self.db_class))
+
+    @staticmethod
+    def _stream_rows(query: Select, serialize) -> Iterator[DataObject]:
+        with db_engine.DBSession() as session:
+            for row in session.execute(query):
+                yield serialize(row)
+
+    @with_session
+    def search(
+        self,
+        query: str,
+        *,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        session: Optional[Any] = None,
+    ) -> list[DataObject]:
+        """全文搜索，按相关度排序"""
+        statement, _ = self._search_queries(query, limit, offset, session)
+        if statement is None:
+            return []
+        return list(map(to_dict, session.scalars(statement)))
+
+    @with_session
+    def search_count(self, query: str, *, session: Optional[Any] = None) -> int:
+        _, statement = self._search_queries(query, None, None, session)
+        return 0 if statement is None else session.scalar(statement)
+
+    def _sync_search(self, ids: Iterable[Any], session: Any, **kwargs) -> None:
+        for statement in self._search_sync_statements(ids, session, **kwargs):
+            session.execute(statement)
 
     @with_session
     def create(self, data: DataObject, *, session: Optional[Any] = None) -> DataObject:
@@ -53,6 +351,7 @@ class DBInterface:
         # 强制刷新以确保获取到数据库生成的字段（如id, timestamps）
         session.flush()
         session.refresh(item)
+        self._sync_search([item.id], session)
         return to_dict(item)
 
     @with_session
@@ -65,6 +364,8 @@ class DBInterface:
         for key, value in data.items():
             setattr(item, key, value)
         session.flush()  # 确保更新被应用
+        self._invalidate(id, session)
+        self._sync_search([item.id], session, changed=data)
         return to_dict(item)
 
     @with_session
@@ -74,8 +375,70 @@ class DBInterface:
             raise ValueError("Session is required")
         item = validate_and_get_item(session, id, self.db_class)
         session.delete(item)
+        self._invalidate(id, session)
+        self._sync_search([item.id], session, deleted=True)
         return {"detail": "Product deleted successfully"}
 
+    @with_session
+    def bulk_create(
+        self, rows: List[DataObject], *, session: Optional[Any] = None
+    ) -> int:
+        """一条多行INSERT（executemany）批量创建，不逐行 flush/refresh；返回插入的行数"""
+        if session is None:
+            raise ValueError("Session is required")
+        if not rows:
+            return 0
+        result = session.execute(self._bulk_insert_query(), rows)
+        if self.search_index is not None:
+            self._sync_search(result.scalars().all(), session)
+        return len(rows)
+
+    @with_session
+    def bulk_update(
+        self, rows: List[DataObject], *, session: Optional[Any] = None
+    ) -> int:
+        """按主键批量更新，不存在的ID直接跳过；返回实际更新的行数"""
+        if session is None:
+            raise ValueError("Session is required")
+        updated = 0
+        for statement, params in self._bulk_update_batches(rows):
+            updated += session.execute(statement, params).rowcount
+        self._invalidate_many((row["id"] for row in rows), session)
+        self._sync_search(
+            (_parse_item_id(row["id"]) for row in rows),
+            session,
+            changed={key for row in rows for key in row},
+        )
+        return updated
+
+    @with_session
+    def bulk_delete(self, ids: List[Any], *, session: Optional[Any] = None) -> int:
+        """一条 DELETE ... WHERE id IN (...) 批量删除，多对多关联表中的行一并删除；返回删除的行数"""
+        if session is None:
+            raise ValueError("Session is required")
+        ids = [_parse_item_id(id) for id in ids]
+        if not ids:
+            return 0
+        for statement in self._secondary_delete_queries(ids):
+            session.execute(statement)
+        result = session.execute(
+            self._bulk_delete_query(ids),
+            execution_options={"synchronize_session": False},
+        )
+        self._invalidate_many(ids, session)
+        self._sync_search(ids, session, deleted=True)
+        return result.rowcount
+
+    @with_session
+    def existing_ids(self, ids: List[Any], *, session: Optional[Any] = None) -> set:
+        """返回 ids 中在数据库里存在的主键"""
+        if session is None:
+            raise ValueError("Session is required")
+        ids = [_parse_item_id(id) for id in ids]
+        if not ids:
+            return set()
+        return set(session.scalars(self._existing_ids_query(ids)))
+
 
 class DBOrderInterface(DBInterface):
     def __init__(self):
@@ -1,13 +1,141 @@
-from sqlalchemy.engine import Engine, create_engine
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, URL, create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from assignment_berkeley.db.models import Base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from assignment_berkeley.config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT_MS,
+    logger,
+)
 
-engine: Engine = None
+engine: Optional[Engine] = None
 DBSession = sessionmaker()
 
+async_engine: Optional[AsyncEngine] = None
+AsyncDBSession = async_sessionmaker(expire_on_commit=False)
 
-def init_db(file: str):
+# 同步驱动对应的异步驱动：本地 aiosqlite，生产 asyncpg
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def _is_sqlite_memory(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _configure_sqlite_connection(dbapi_connection, connection_record) -> None:
+    """每个新的SQLite连接：WAL让读写互不阻塞，busy_timeout等待写锁而不是立即报错"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _engine_options(url: URL) -> dict:
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if not _is_sqlite_memory(url):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def _register_pragmas(url: URL, sync_engine: Engine) -> None:
+    if url.get_backend_name() == "sqlite" and not _is_sqlite_memory(url):
+        event.listen(sync_engine, "connect", _configure_sqlite_connection)
+
+
+def create_db_engine(url: str, **overrides) -> Engine:
+    """Create an engine with the pool settings from config; keyword overrides win."""
+    url = make_url(url)
+    new_engine = create_engine(url, **{**_engine_options(url), **overrides})
+    _register_pragmas(url, new_engine)
+    return new_engine
+
+
+def to_async_url(url: str) -> URL:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.drivername in ASYNC_DRIVERS.values():
+        return url
+    return url.set(drivername=driver)
+
+
+def create_async_db_engine(url: str, **overrides) -> AsyncEngine:
+    """Async counterpart of create_db_engine, using the same pool settings."""
+    url = to_async_url(url)
+    options = _engine_options(url)
+    if url.get_backend_name() == "sqlite":
+        # aiosqlite 在自己的线程里执行，不需要 check_same_thread；
+        # 文件库默认是 NullPool，显式使用连接池复用连接
+        options.pop("connect_args", None)
+        if not _is_sqlite_memory(url):
+            options["poolclass"] = AsyncAdaptedQueuePool
+    new_engine = create_async_engine(url, **{**options, **overrides})
+    _register_pragmas(url, new_engine.sync_engine)
+    return new_engine
+
+
+def init_db(file: str) -> Engine:
     """Initialize the database, create engine and session."""
-    engine = create_engine(file)
-    Base.metadata.bind = engine
+    global engine
+    if engine is not None:
+        engine.dispose()
+    engine = create_db_engine(file)
     DBSession.configure(bind=engine)
+    logger.info(f"Database engine initialized: {engine.url!r}, pool={engine.pool.status()}")
+    return engine
+
+
+def get_engine() -> Engine:
+    """Return the live engine created by init_db."""
+    if engine is None:
+        raise RuntimeError("Database is not initialized, call init_db first")
+    return engine
+
+
+def dispose_db() -> None:
+    """Close all pooled connections, called on application shutdown."""
+    global engine
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
+
+def init_async_db(file: str) -> AsyncEngine:
+    """Initialize the async engine and AsyncDBSession for the async routers."""
+    global async_engine
+    async_engine = create_async_db_engine(file)
+    AsyncDBSession.configure(bind=async_engine)
+    return async_engine
+
+
+def get_async_engine() -> AsyncEngine:
+    if async_engine is None:
+        raise RuntimeError("Async database is not initialized, call init_async_db first")
+    return async_engine
+
+
+async def dispose_async_db() -> None:
+    global async_engine
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
@@ -0,0 +1,57 @@
+import operator
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import and_, inspect, true
+from assignment_berkeley.db.models import Base
+
+
+def _prefix_range(column: Any, value: str) -> Any:
+    """
+    前缀匹配改写成区间条件 column >= value AND column < 上界，
+    普通B树索引即可支持（LIKE 'x%' 在SQLite中默认不走索引）；区分大小写
+    """
+    if not value:
+        return true()
+    if ord(value[-1]) == 0x10FFFF:
+        return column >= value
+    return and_(column >= value, column < value[:-1] + chr(ord(value[-1]) + 1))
+
+
+# 过滤键的操作符后缀，例如 quantity_gt=0、price_lte=10、status_in=[...]
+OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "ne": operator.ne,
+    "in": lambda column, value: column.in_(value),
+    "like": lambda column, value: column.like(value),
+    "startswith": lambda column, value: column.startswith(value, autoescape=True),
+    "prefix": _prefix_range,
+}
+
+
+def _parse_key(db_class: type[Base], key: str) -> tuple[Any, Callable]:
+    """把 "<列名>" 或 "<列名>_<操作符>" 解析为 (列, 比较函数)"""
+    columns = inspect(db_class).column_attrs
+    if key in columns:
+        return getattr(db_class, key), operator.eq
+    name, _, suffix = key.rpartition("_")
+    if name in columns and suffix in OPERATORS:
+        return getattr(db_class, name), OPERATORS[suffix]
+    raise ValueError(f"Unknown filter: {key}")
+
+
+def compile_filters(db_class: type[Base], filter_params: Optional[dict] = None) -> list:
+    """
+    把过滤参数编译成SQL WHERE条件，值为None的键忽略。
+    不认识的列或操作符抛出ValueError，而不是静默忽略。
+    """
+    clauses = []
+    for key, value in (filter_params or {}).items():
+        if value is None:
+            continue
+        column, compare = _parse_key(db_class, key)
+        if compare is OPERATORS["in"] and isinstance(value, (str, bytes)):
+            raise ValueError(f"Filter {key} expects a list of values")
+        clauses.append(compare(column, value))
+    return clauses
@@ -7,34 +7,79 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Table,
+    Text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, backref
 from datetime import datetime
-from typing import Any
+from operator import attrgetter
+from typing import Any, Callable, Optional
 
 import uuid
 import enum
 
+from assignment_berkeley.db.search import FTS5Index
+
 Base = declarative_base()
 
 
+_SERIALIZERS: dict[tuple, Callable[[Any], dict[str, Any]]] = {}
+
+
+def _build_serializer(
+    db_class: type, fields: Optional[tuple] = None
+) -> Callable[[Any], dict[str, Any]]:
+    """预先解析列名和需要转成字符串的列（UUID、时间），序列化时只做一次 attrgetter"""
+    columns = list(db_class.__table__.columns)
+    if fields is not None:
+        columns = [db_class.__table__.columns[name] for name in fields]
+    names = tuple(c.name for c in columns)
+    if not names:
+        return lambda obj: {}
+    getter = attrgetter(*names)
+    if len(names) == 1:
+        getter = lambda obj, _get=getter: (_get(obj),)
+    str_indexes = tuple(
+        i for i, c in enumerate(columns) if isinstance(c.type, (UUID, DateTime))
+    )
+
+    def serialize(obj: Any) -> dict[str, Any]:
+        values = list(getter(obj))
+        for i in str_indexes:
+            if values[i] is not None:
+                values[i] = str(values[i])
+        return dict(zip(names, values))
+
+    return serialize
+
+
+def serializer_for(
+    db_class: type, fields: Optional[tuple] = None
+) -> Callable[[Any], dict[str, Any]]:
+    """fields 为 None 时序列化全部列，否则只序列化这些列（也可用于投影查询返回的 Row）"""
+    key = (db_class, fields)
+    serializer = _SERIALIZERS.get(key)
+    if serializer is None:
+        serializer = _SERIALIZERS[key] = _build_serializer(db_class, fields)
+    return serializer
+
+
 # Mapping to raw data
 def to_dict(obj: Base) -> dict[str, Any]:
-    return {
-        c.name: (
-            str(getattr(obj, c.name))
-            if isinstance(getattr(obj, c.name), (uuid.UUID, datetime))
-            else getattr(obj, c.name)
-        )
-        for c in obj.__table__.columns
-    }
+    return serializer_for(type(obj))(obj)
 
 
 class DBCustomer(Base):
     __tablename__ = "customer"
+    __table_args__ = (
+        # 按邮箱精确查找、按姓/名前缀搜索
+        Index("ix_customer_email", "email"),
+        Index("ix_customer_last_name", "last_name"),
+        Index("ix_customer_first_name", "first_name"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     first_name = Column(String(250), nullable=True)
     last_name = Column(String(250), nullable=True)
@@ -55,6 +100,11 @@ class PaymentStatus(enum.Enum):
 
 class DBProduct(Base):
     __tablename__ = "product"
+    __table_args__ = (
+        # 产品列表的库存和价格区间过滤
+        Index("ix_product_quantity", "quantity"),
+        Index("ix_product_price", "price"),
+    )
     id = Column(
         UUID(as_uuid=True),
         primary_key=True,
@@ -77,6 +127,10 @@ class DBProduct(Base):
     )
 
 
+# 产品名称和描述的全文索引，create_all/drop_all 时随 product 表一起建删（仅 SQLite）
+product_search_index = FTS5Index("product_fts", DBProduct, ["name", "description"])
+
+
 order_product = Table(
     "order_product",
     Base.metadata,
@@ -85,19 +139,33 @@ order_product = Table(
         "product_id", UUID(as_uuid=True), ForeignKey("product.id"), primary_key=True
     ),
     Column("quantity", Integer, nullable=False),
+    # 主键以 order_id 开头，按产品反查（库存归还、删除产品）需要单独的索引
+    Index("ix_order_product_product_id", "product_id"),
 )
 
 
-# class ReservationStatus(str, enum.Enum):
-#     pending = "pending"
-#     reserved = "reserved"
-#     expired = "expired"
-#     completed = "completed"
-#     cancelled = "cancelled"
+class ReservationStatus(str, enum.Enum):
+    pending = "pending"
+    reserved = "reserved"
+    expired = "expired"
+    completed = "completed"
+    cancelled = "cancelled"
 
 
 class DBOrder(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # 过期预订清理：WHERE reservation_status = 'reserved' AND reservation_expires_at <= now
+        Index(
+            "ix_orders_reservation_expiry",
+            "reservation_status",
+            "reservation_expires_at",
+        ),
+        # 订单列表：按 status/payment_status 过滤，按 (created_at, id) 分页
+        Index("ix_orders_status_payment_created", "status", "payment_status", "created_at"),
+        # 按客户查询订单
+        Index("ix_orders_customer_created", "customer_id", "created_at"),
+    )
     id = Column(
         UUID(as_uuid=True),
         primary_key=True,
@@ -120,9 +188,9 @@ class DBOrder(Base):
         onupdate=func.now(),
         nullable=False,
     )
-    # reservation_status = Column(SQLEnum(ReservationStatus), default=ReservationStatus.pending)
-    # reserved_at = Column(DateTime, nullable=True)
-    # reservation_expires_at = Column(DateTime, nullable=True)
+    reservation_status = Column(Enum(ReservationStatus), nullable=True)
+    reserved_at = Column(DateTime, nullable=True)
+    reservation_expires_at = Column(DateTime, nullable=True)
 
     customer = relationship(
         "DBCustomer", backref=backref("orders", cascade="all, delete-orphan")
@@ -135,3 +203,96 @@ class DBOrder(Base):
 DBProduct.orders = relationship(
     "DBOrder", secondary=order_product, back_populates="products"
 )
+
+
+class DBWebhookEvent(Base):
+    """已处理的 webhook 投递，按幂等键唯一，保存首次处理的响应"""
+
+    __tablename__ = "webhook_event"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String(255), nullable=False, unique=True)
+    order_id = Column(UUID(as_uuid=True), nullable=True)
+    response = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class WebhookInboxStatus(str, enum.Enum):
+    pending = "pending"
+    processing = "processing"
+    done = "done"
+    failed = "failed"
+
+
+class DBWebhookInbox(Base):
+    """排队模式下收到的 webhook，先持久化再由后台任务批量处理"""
+
+    __tablename__ = "webhook_inbox"
+    __table_args__ = (
+        # 工作进程按 id 顺序认领待处理的记录，也用于统计队列长度
+        Index("ix_webhook_inbox_status_id", "status", "id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String(255), nullable=True)
+    order_id = Column(UUID(as_uuid=True), nullable=False)
+    payment_status = Column(String(20), nullable=False)
+    status = Column(
+        Enum(WebhookInboxStatus), nullable=False, default=WebhookInboxStatus.pending
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    received_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    processed_at = Column(DateTime, nullable=True)
+
+
+class DBCustomerSales(Base):
+    """按客户汇总的订单计数，与订单写入在同一事务中增量维护（见 operations/sales.py）"""
+
+    __tablename__ = "customer_sales"
+    customer_id = Column(Integer, ForeignKey("customer.id"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    completed_order_count = Column(Integer, nullable=False, default=0)
+    lifetime_spend = Column(Numeric(12, 2), nullable=False, default=0)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class DBProductSales(Base):
+    """按产品汇总的销量：units_ordered 为所有订单的数量，units_sold 只统计已完成订单"""
+
+    __tablename__ = "product_sales"
+    product_id = Column(UUID(as_uuid=True), ForeignKey("product.id"), primary_key=True)
+    units_ordered = Column(Integer, nullable=False, default=0)
+    units_sold = Column(Integer, nullable=False, default=0)
+
+
+class OrderEvent(str, enum.Enum):
+    placed = "placed"
+    completed = "completed"
+    canceled = "canceled"
+
+
+class DBSalesBucket(Base):
+    """按小时汇总的订单事件：下单/完成/取消的订单数和金额，事件发生时在同一事务中累加"""
+
+    __tablename__ = "sales_bucket"
+    bucket = Column(DateTime, primary_key=True)  # 事件发生的整点（UTC）
+    event = Column(Enum(OrderEvent), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    amount = Column(Numeric(12, 2), nullable=False, default=0)
+
+
+class DBProductSalesBucket(Base):
+    """按小时汇总的产品销量（订单完成时计入）"""
+
+    __tablename__ = "product_sales_bucket"
+    bucket = Column(DateTime, primary_key=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("product.id"), primary_key=True)
+    units_sold = Column(Integer, nullable=False, default=0)
+
+
+# 模型定义完成后预先编译序列化器
+for _db_class in (DBCustomer, DBProduct, DBOrder):
+    serializer_for(_db_class)
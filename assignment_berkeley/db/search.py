@@ -0,0 +1,113 @@
+import re
+from typing import Any, Iterable, List, Optional
+from sqlalchemy import DDL, Select, column, delete, event, func, literal_column, or_, select, table
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    把用户输入转换成安全的 FTS5 MATCH 表达式：只保留单词，逐个加引号（隐式 AND），
+    最后一个词按前缀匹配；没有可搜索的词时返回 None
+    """
+    tokens = _TOKEN.findall(query)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"' for token in tokens) + "*"
+
+
+class FTS5Index:
+    """
+    SQLite FTS5 全文索引，key 列（UNINDEXED）保存源表主键；在 db/models.py 中紧跟模型定义，
+    建表/删表事件随源表注册到 metadata。
+    由 DBInterface 在 create/update/delete 和批量写入时按主键重建对应的行，与源表在同一事务中。
+    非 SQLite 数据库不维护索引，search_query 退化为 LIKE 查询。
+    """
+
+    def __init__(self, name: str, db_class: type, columns: List[str]):
+        self.name = name
+        self.db_class = db_class
+        self.columns = columns
+        self.key = db_class.__table__.c.id
+        self.table = table(
+            name,
+            column("key", self.key.type),
+            *(column(text_column) for text_column in columns),
+        )
+        source = db_class.__table__
+        event.listen(
+            source,
+            "after_create",
+            DDL(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} "
+                f"USING fts5(key UNINDEXED, {', '.join(columns)})"
+            ).execute_if(dialect="sqlite"),
+        )
+        event.listen(
+            source,
+            "before_drop",
+            DDL(f"DROP TABLE IF EXISTS {name}").execute_if(dialect="sqlite"),
+        )
+
+    @staticmethod
+    def enabled(session: Any) -> bool:
+        return session.get_bind().dialect.name == "sqlite"
+
+    def sync_statements(self, ids: Iterable[Any], deleted: bool = False) -> list:
+        """删除这些主键的索引行，源行未被删除时再从源表重新插入"""
+        ids = list(ids)
+        if not ids:
+            return []
+        statements = [delete(self.table).where(self.table.c.key.in_(ids))]
+        if deleted:
+            return statements
+        source = self.db_class.__table__
+        return statements + [
+            self.table.insert().from_select(
+                ["key", *self.columns],
+                select(source.c.id, *(source.c[name] for name in self.columns)).where(
+                    source.c.id.in_(ids)
+                ),
+            )
+        ]
+
+    def _matches(self, expression: str, dialect: str) -> Select:
+        """匹配的 (主键, 排序值)，FTS5 的 rank 为 bm25 分数，越小越相关"""
+        if dialect == "sqlite":
+            return select(
+                self.table.c.key.label("key"), literal_column("rank").label("rank")
+            ).where(literal_column(self.name).op("MATCH")(expression))
+        source = self.db_class.__table__
+        terms = [term.strip('"*') for term in expression.split()]
+        return select(source.c.id.label("key"), literal_column("0").label("rank")).where(
+            *(
+                or_(*(source.c[name].ilike(f"%{term}%") for name in self.columns))
+                for term in terms
+            )
+        )
+
+    def search_query(
+        self, query: str, dialect: str, limit: Optional[int], offset: Optional[int]
+    ) -> Optional[Select]:
+        """按相关度排序的源表记录；没有可搜索的词时返回 None"""
+        expression = match_expression(query)
+        if expression is None:
+            return None
+        matches = self._matches(expression, dialect).subquery()
+        statement = (
+            select(self.db_class)
+            .join(matches, matches.c.key == self.key)
+            .order_by(matches.c.rank, self.key)
+        )
+        if limit is not None:
+            statement = statement.limit(limit)
+        if offset:
+            statement = statement.offset(offset)
+        return statement
+
+    def count_query(self, query: str, dialect: str) -> Optional[Select]:
+        expression = match_expression(query)
+        if expression is None:
+            return None
+        matches = self._matches(expression, dialect).subquery()
+        return select(func.count()).select_from(matches)
@@ -0,0 +1,88 @@
+import csv
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional, Tuple, TypeVar
+import orjson
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """把请求体的字节块切成行，不需要把整个请求体读进内存"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def _parse_ndjson_line(line: bytes) -> Optional[Any]:
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+
+
+async def iter_request_records(request: Request) -> AsyncIterator[Optional[dict]]:
+    """
+    按 Content-Type 逐条读取请求体中的记录：
+    application/json 为JSON数组；application/x-ndjson 每行一个JSON对象；
+    text/csv 第一行为表头（不支持字段内换行），空值视为未提供。
+    无法解析的行返回 None，由调用方记为失败。
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type == NDJSON_MEDIA_TYPE:
+        async for line in _iter_lines(request.stream()):
+            if line.strip():
+                yield _parse_ndjson_line(line)
+    elif media_type == CSV_MEDIA_TYPE:
+        header = None
+        async for line in _iter_lines(request.stream()):
+            if not line.strip():
+                continue
+            values = next(csv.reader([line.decode("utf-8").rstrip("\r")]))
+            if header is None:
+                header = values
+                continue
+            yield {key: value for key, value in zip(header, values) if value != ""}
+    else:
+        try:
+            records = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        for record in records:
+            yield record
+
+
+async def enumerate_chunks(
+    records: AsyncIterable[T], chunk_size: int
+) -> AsyncIterator[List[Tuple[int, T]]]:
+    """按 chunk_size 分块，保留每条记录在请求中的序号"""
+    chunk: List[Tuple[int, T]] = []
+    index = 0
+    async for record in records:
+        chunk.append((index, record))
+        index += 1
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validation_error_message(error: Exception) -> str:
+    """把 Pydantic 的校验错误压缩成一行"""
+    errors = getattr(error, "errors", None)
+    if errors is None:
+        return str(error)
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'record'}: {err['msg']}"
+        for err in errors()
+    )
@@ -0,0 +1,141 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional, Protocol, Tuple
+from sqlalchemy import event
+from assignment_berkeley.config import (
+    PRODUCT_CACHE_MAX_SIZE,
+    PRODUCT_CACHE_TTL_SECONDS,
+    WEBHOOK_IDEMPOTENCY_CACHE_SIZE,
+    WEBHOOK_IDEMPOTENCY_CACHE_TTL_SECONDS,
+)
+from assignment_berkeley.helpers.metrics import metrics
+
+
+class CacheBackend(Protocol):
+    """缓存存储的接口，可以替换为 Redis 等外部实现"""
+
+    def get(self, key: Hashable) -> Optional[Any]: ...
+
+    def set(self, key: Hashable, value: Any) -> None: ...
+
+    def delete(self, key: Hashable) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class TTLLRUBackend:
+    """进程内缓存：条目超过 ttl 秒失效，超过 max_size 时淘汰最久未使用的条目"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """未命中或已过期时返回 None"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class ReadThroughCache:
+    """
+    读穿缓存：未命中时调用 loader 从数据库加载并写入缓存。
+    命中/未命中次数记录到 metrics 的 "<name>.hits" / "<name>.misses"。
+    """
+
+    def __init__(self, name: str, backend: CacheBackend):
+        self.name = name
+        self.backend = backend
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.backend.get(key)
+        if value is None:
+            metrics.incr(f"{self.name}.misses")
+            return None
+        metrics.incr(f"{self.name}.hits")
+        # 返回副本，调用方修改结果不会影响缓存
+        return dict(value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.backend.set(key, dict(value))
+        return value
+
+    async def get_or_load_async(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = await loader()
+            self.backend.set(key, dict(value))
+        return value
+
+    def invalidate(self, keys: Iterable[Hashable], session: Optional[Any] = None) -> None:
+        """
+        立即删除缓存条目；传入session时在事务结束（提交或回滚）后再删除一次，
+        避免事务期间读到的未提交数据留在缓存里
+        """
+        keys = list(keys)
+        for key in keys:
+            self.backend.delete(key)
+        if session is not None and keys:
+            event.listen(
+                getattr(session, "sync_session", session),
+                "after_transaction_end",
+                lambda *_: [self.backend.delete(key) for key in keys],
+                once=True,
+            )
+
+    def set_after_commit(self, key: Hashable, value: Any, session: Any) -> None:
+        """事务提交后才写入缓存，回滚时不写入"""
+        event.listen(
+            getattr(session, "sync_session", session),
+            "after_commit",
+            lambda *_: self.backend.set(key, dict(value)),
+            once=True,
+        )
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+product_cache = ReadThroughCache(
+    "product_cache",
+    TTLLRUBackend(PRODUCT_CACHE_MAX_SIZE, PRODUCT_CACHE_TTL_SECONDS),
+)
+
+# webhook 幂等键 -> 已返回过的响应，挡在 webhook_event 表前面
+webhook_response_cache = ReadThroughCache(
+    "webhook_idempotency_cache",
+    TTLLRUBackend(WEBHOOK_IDEMPOTENCY_CACHE_SIZE, WEBHOOK_IDEMPOTENCY_CACHE_TTL_SECONDS),
+)
@@ -1,10 +1,14 @@
 from uuid import UUID
 from fastapi import HTTPException
 from functools import wraps
-from typing import Any, Callable, Dict, Type, TypeVar, Union
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Type, TypeVar, Union
+from sqlalchemy import Select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from assignment_berkeley.db.models import DBCustomer, DBOrder, DBProduct, Base
-from assignment_berkeley.db.engine import DBSession
+from assignment_berkeley.db import engine as db_engine
 
 DB_CLASS_MAPPING: Dict[Type[Base], str] = {
     DBProduct: "Product",
@@ -16,18 +20,26 @@ T = TypeVar("T")
 
 
 def with_session(func: Callable) -> T:
+    """
+    为方法注入session：调用方（请求级依赖或外层方法）已传入session时直接复用，
+    由session的创建者统一提交；否则自己创建session，成功后提交、出错回滚。
+    """
+
     @wraps(func)
     def wrapper(self, *args, **kwargs) -> T:
-        session = DBSession()
+        if kwargs.get("session") is not None:
+            return func(self, *args, **kwargs)
+        session = db_engine.DBSession()
         kwargs["session"] = session
         try:
             result = func(self, *args, **kwargs)
-            if func.__name__ in ["create", "update", "delete"]:
-                session.commit()
+            session.commit()
             return result
+        except HTTPException:
+            session.rollback()
+            raise
         except Exception as e:
-            if func.__name__ in ["create", "update", "delete"]:
-                session.rollback()
+            session.rollback()
             raise HTTPException(status_code=400, detail=str(e))
         finally:
             session.close()
@@ -35,17 +47,148 @@ def with_session(func: Callable) -> T:
     return wrapper
 
 
-def validate_and_get_item(
-    session: Session, id: Union[str | int], db_class: type[Base]
-) -> type[Base]:
+def with_async_session(func: Callable) -> T:
+    """with_session 的异步版本，使用 AsyncDBSession"""
+
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs) -> T:
+        if kwargs.get("session") is not None:
+            return await func(self, *args, **kwargs)
+        async with db_engine.AsyncDBSession() as session:
+            kwargs["session"] = session
+            try:
+                result = await func(self, *args, **kwargs)
+                await session.commit()
+                return result
+            except HTTPException:
+                await session.rollback()
+                raise
+            except Exception as e:
+                await session.rollback()
+                raise HTTPException(status_code=400, detail=str(e))
+
+    return wrapper
+
+
+def get_db_session() -> Iterator[Session]:
+    """
+    FastAPI依赖：每个请求一个Session，贯穿DBInterface和operations层，请求结束时提交一次。
+    传入session时 with_session 不再转换异常，这里把参数错误（ValueError）转换为400
+    """
+    session = db_engine.DBSession()
     try:
-        item_primary_id = UUID(id) if isinstance(id, str) else id
+        yield session
+        session.commit()
+    except ValueError as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+async def get_async_db_session() -> AsyncIterator[AsyncSession]:
+    """get_db_session 的异步版本，供 async 路由使用"""
+    async with db_engine.AsyncDBSession() as session:
+        try:
+            yield session
+            await session.commit()
+        except ValueError as e:
+            await session.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def run_in_async_session(session: AsyncSession, func: Callable, *args, **kwargs):
+    """在 AsyncSession 上运行接受 session 关键字参数的同步操作（AsyncSession.run_sync）"""
+    return await session.run_sync(
+        lambda sync_session: func(*args, session=sync_session, **kwargs)
+    )
+
+
+def _dialect_insert(session: Session, table: Any):
+    """支持 ON CONFLICT 的 INSERT（PostgreSQL / SQLite 各自的方言实现）"""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql_insert(table)
+    return sqlite_insert(table)
+
+
+def _insert_on_conflict_do_nothing(session: Session, table: Any):
+    return _dialect_insert(session, table).on_conflict_do_nothing()
+
+
+def insert_or_ignore(session: Session, table: Any, values: Dict[str, Any]) -> bool:
+    """INSERT ... ON CONFLICT DO NOTHING，返回是否插入了新行（唯一键已存在时为 False）"""
+    result = session.execute(
+        _insert_on_conflict_do_nothing(session, table).values(**values)
+    )
+    return result.rowcount == 1
+
+
+def insert_many_or_ignore(
+    session: Session, table: Any, rows: List[Dict[str, Any]]
+) -> None:
+    """insert_or_ignore 的批量版本，一次 executemany 写入，唯一键冲突的行跳过"""
+    if rows:
+        session.execute(_insert_on_conflict_do_nothing(session, table), rows)
+
+
+def accumulate_from_select(
+    session: Session,
+    table: Any,
+    key_columns: List[str],
+    source: Select,
+    merge: Optional[Dict[str, Callable[[Any, Any], Any]]] = None,
+) -> None:
+    """
+    INSERT INTO table SELECT ... ON CONFLICT (key) DO UPDATE，把 source 的聚合结果累加到计数表：
+    非主键列默认 col = col + excluded.col，merge 可以为个别列指定 (当前值, 新值) -> 表达式
+    """
+    columns = [column.key for column in source.selected_columns]
+    statement = _dialect_insert(session, table).from_select(columns, source)
+    merge = merge or {}
+    set_ = {
+        name: merge.get(name, lambda current, incoming: current + incoming)(
+            table.c[name], statement.excluded[name]
+        )
+        for name in columns
+        if name not in key_columns
+    }
+    session.execute(statement.on_conflict_do_update(index_elements=key_columns, set_=set_))
+
+
+def _parse_item_id(id: Union[str | int]) -> Union[UUID | int]:
+    try:
+        return UUID(id) if isinstance(id, str) else id
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid UUID format")
 
+
+def _not_found(db_class: type[Base]) -> HTTPException:
+    entity_name: str = DB_CLASS_MAPPING.get(db_class, "Unknown")
+    return HTTPException(status_code=404, detail=f"{entity_name} not found")
+
+
+def validate_and_get_item(
+    session: Session, id: Union[str | int], db_class: type[Base]
+) -> type[Base]:
+    item_primary_id = _parse_item_id(id)
+
     item = session.query(db_class).filter(db_class.id == item_primary_id).first()
     if item is None:
-        entity_name: str = DB_CLASS_MAPPING.get(db_class, "Unknown")
-        raise HTTPException(status_code=404, detail=f"{entity_name} not found")
+        raise _not_found(db_class)
 
     return item
+
+
+async def async_validate_and_get_item(
+    session: AsyncSession, id: Union[str | int], db_class: type[Base]
+) -> type[Base]:
+    item = await session.get(db_class, _parse_item_id(id))
+    if item is None:
+        raise _not_found(db_class)
+    return item
@@ -0,0 +1,75 @@
+import csv
+import enum
+import io
+from itertools import islice
+from typing import Any, Iterable, Iterator, List
+import orjson
+from fastapi.responses import StreamingResponse
+from assignment_berkeley.helpers.responses import json_default
+
+
+class ExportFormat(str, enum.Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _chunks(records: Iterable[dict], chunk_size: int) -> Iterator[List[dict]]:
+    records = iter(records)
+    while chunk := list(islice(records, chunk_size)):
+        yield chunk
+
+
+def iter_ndjson(records: Iterable[dict], chunk_size: int = 500) -> Iterator[bytes]:
+    """每条记录一行JSON，按块输出以减少写入次数"""
+    for chunk in _chunks(records, chunk_size):
+        yield b"".join(orjson.dumps(record, default=json_default) + b"\n" for record in chunk)
+
+
+def _csv_value(value: Any) -> Any:
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def iter_csv(
+    records: Iterable[dict], columns: List[str], chunk_size: int = 500
+) -> Iterator[str]:
+    """先输出表头，再按块输出数据行"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in _chunks(records, chunk_size):
+        for record in chunk:
+            writer.writerow([_csv_value(record.get(column)) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(
+    records: Iterable[dict],
+    export_format: ExportFormat,
+    filename: str,
+    csv_columns: List[str],
+) -> StreamingResponse:
+    """
+    流式导出响应；records 是惰性的生成器，StreamingResponse 在线程池中逐块迭代，
+    整个导出过程中内存里只有一个块
+    """
+    if export_format is ExportFormat.csv:
+        body = iter_csv(records, csv_columns)
+    else:
+        body = iter_ndjson(records)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'
+        },
+    )
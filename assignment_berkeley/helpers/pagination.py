@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Generic, List, Optional, Sequence, TypeVar
+from uuid import UUID
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    """Keyset 分页结果，next_cursor 为 None 表示已经到最后一页"""
+
+    items: List[T]
+    size: int
+    next_cursor: Optional[str] = None
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """把排序键的值编码成不透明的游标字符串"""
+    raw = json.dumps([_to_json_value(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, python_types: Sequence[type]) -> list:
+    """解码游标，并按排序列的python类型还原每个值"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(python_types):
+            raise ValueError("cursor length mismatch")
+        return [
+            datetime.fromisoformat(value) if python_type is datetime
+            else python_type(value)
+            for value, python_type in zip(values, python_types)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Callable, Optional
+from fastapi.concurrency import run_in_threadpool
+from assignment_berkeley.config import logger
+from assignment_berkeley.helpers.metrics import metrics
+
+
+class PeriodicTask:
+    """
+    在事件循环里按固定间隔运行一个同步任务（放到线程池执行，不阻塞事件循环）。
+    每个进程只启动一个实例，耗时记录到 metrics 的 "<name>.duration"。
+    """
+
+    def __init__(self, name: str, func: Callable[[], int], interval_seconds: float):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> int:
+        with metrics.timer(f"{self.name}.duration"):
+            processed = self.func()
+        metrics.incr(f"{self.name}.runs")
+        metrics.incr(f"{self.name}.processed", processed or 0)
+        return processed
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await run_in_threadpool(self.run_once)
+            except Exception:
+                metrics.incr(f"{self.name}.errors")
+                logger.exception(f"Periodic task {self.name} failed")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
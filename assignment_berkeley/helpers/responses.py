@@ -0,0 +1,57 @@
+from decimal import Decimal
+from math import ceil
+from typing import Any, List, Optional
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi_pagination import Params
+from pydantic import BaseModel
+from assignment_berkeley.config import FAST_JSON_RESPONSES
+
+
+def json_default(value: Any) -> Any:
+    """orjson 不支持的类型：Pydantic 模型、Numeric 列的 Decimal"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """用 orjson 直接序列化，UUID/datetime/Enum 由 orjson 原生处理"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """解析 fields=id,status,total_price 查询参数，为空表示返回全部字段"""
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip()] or None
+
+
+def page_content(items: List[Any], total: int, params: Params) -> dict:
+    """
+    与 Page[...] 相同结构的字典（items/total/page/size/pages）。
+    不使用 create_page：add_pagination 启动后它会按路由的 response_model 逐条校验 items，
+    既多一次校验，也不接受只含部分字段（fields=）的记录
+    """
+    return {
+        "items": items,
+        "total": total,
+        "page": params.page,
+        "size": params.size,
+        "pages": ceil(total / params.size) if params.size else 0,
+    }
+
+
+def list_response(content: Any, *, projected: bool = False) -> Any:
+    """
+    列表接口的返回值：开启 FAST_JSON_RESPONSES 时直接返回预序列化的JSON，
+    跳过 response_model 对每一条记录的再次校验；关闭时交给 FastAPI 按 response_model 处理。
+    只返回部分字段（projected）时不符合 response_model，总是直接输出JSON。
+    """
+    if FAST_JSON_RESPONSES or projected:
+        return FastJSONResponse(content)
+    return content
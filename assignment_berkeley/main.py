@@ -1,7 +1,20 @@
 from fastapi import FastAPI
 from fastapi_pagination import add_pagination
-from assignment_berkeley.db.engine import init_db
-from assignment_berkeley.routers import customers, products, orders, webhooks
+from assignment_berkeley.config import WEBHOOK_INGESTION_MODE
+from assignment_berkeley.db.engine import (
+    init_db,
+    dispose_db,
+    init_async_db,
+    dispose_async_db,
+)
+from assignment_berkeley.routers import (
+    analytics,
+    customers,
+    products,
+    orders,
+    webhooks,
+    metrics,
+)
 
 app = FastAPI()
 add_pagination(app)
@@ -14,9 +27,25 @@ DB_FILE = "sqlite:///berkeley.db"
 @app.on_event("startup")
 def startup_event():
     init_db(DB_FILE)
+    init_async_db(DB_FILE)
+    orders.reservation_sweeper.start()
+    if WEBHOOK_INGESTION_MODE == "queued":
+        webhooks.webhook_worker.start()
+        webhooks.webhook_inbox_cleaner.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await orders.reservation_sweeper.stop()
+    await webhooks.webhook_worker.stop()
+    await webhooks.webhook_inbox_cleaner.stop()
+    dispose_db()
+    await dispose_async_db()
 
 
 app.include_router(customers.router)
 app.include_router(products.router)
 app.include_router(orders.router)
 app.include_router(webhooks.router)
+app.include_router(metrics.router)
+app.include_router(analytics.router)
@@ -0,0 +1,225 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+from assignment_berkeley.db.models import (
+    DBOrder,
+    DBProductSalesBucket,
+    DBSalesBucket,
+    OrderEvent,
+    OrderStatus,
+    order_product,
+)
+from assignment_berkeley.helpers.db_helpers import accumulate_from_select, with_session
+
+
+class Granularity(str, Enum):
+    hour = "hour"
+    day = "day"
+
+
+class RevenuePoint(BaseModel):
+    bucket: str
+    revenue: float
+    orders: int
+
+
+class OrderEventCounts(BaseModel):
+    placed: int = 0
+    completed: int = 0
+    canceled: int = 0
+
+
+class TopProduct(BaseModel):
+    product_id: str
+    units_sold: int
+
+
+def hour_bucket(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def record_order_events(
+    order_ids: Iterable[UUID],
+    event: OrderEvent,
+    session: Session,
+    at: Optional[datetime] = None,
+) -> None:
+    """
+    把一组订单的事件累加到当前小时的 sales_bucket（订单数、金额），
+    订单完成时同时累加 product_sales_bucket 的产品销量。与订单写入在同一事务中执行。
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    bucket = literal(hour_bucket(at or datetime.utcnow()), DBSalesBucket.bucket.type)
+
+    accumulate_from_select(
+        session,
+        DBSalesBucket.__table__,
+        ["bucket", "event"],
+        select(
+            bucket.label("bucket"),
+            literal(event, DBSalesBucket.event.type).label("event"),
+            func.count().label("order_count"),
+            func.coalesce(func.sum(DBOrder.total_price), 0).label("amount"),
+        ).where(DBOrder.id.in_(order_ids)),
+    )
+    if event == OrderEvent.completed:
+        accumulate_from_select(
+            session,
+            DBProductSalesBucket.__table__,
+            ["bucket", "product_id"],
+            select(
+                bucket.label("bucket"),
+                order_product.c.product_id.label("product_id"),
+                func.sum(order_product.c.quantity).label("units_sold"),
+            )
+            .where(order_product.c.order_id.in_(order_ids))
+            .group_by(order_product.c.product_id),
+        )
+
+
+def rebuild_analytics_buckets(session: Session, batch_size: int = 1000) -> None:
+    """
+    从 orders 全量重建时间桶：下单按 created_at 计入，完成/取消按 updated_at 计入。
+    逐批读取订单并在内存中按小时汇总，只保留桶的累计值。
+    """
+    session.execute(delete(DBSalesBucket))
+    session.execute(delete(DBProductSalesBucket))
+
+    sales: Dict[Tuple[datetime, OrderEvent], List] = defaultdict(lambda: [0, 0])
+    units: Dict[Tuple[datetime, UUID], int] = defaultdict(int)
+
+    def add(bucket: datetime, event: OrderEvent, amount) -> None:
+        totals = sales[(hour_bucket(bucket), event)]
+        totals[0] += 1
+        totals[1] += amount
+
+    orders = session.execute(
+        select(DBOrder.status, DBOrder.total_price, DBOrder.created_at, DBOrder.updated_at)
+        .execution_options(yield_per=batch_size)
+    )
+    for order in orders:
+        add(order.created_at, OrderEvent.placed, order.total_price)
+        if order.status != OrderStatus.pending:
+            add(order.updated_at or order.created_at, OrderEvent(order.status.value), order.total_price)
+
+    lines = session.execute(
+        select(DBOrder.updated_at, order_product.c.product_id, order_product.c.quantity)
+        .join(order_product, order_product.c.order_id == DBOrder.id)
+        .where(DBOrder.status == OrderStatus.completed)
+        .execution_options(yield_per=batch_size)
+    )
+    for line in lines:
+        units[(hour_bucket(line.updated_at), line.product_id)] += line.quantity
+
+    if sales:
+        session.execute(
+            insert(DBSalesBucket),
+            [
+                {"bucket": bucket, "event": event, "order_count": count, "amount": amount}
+                for (bucket, event), (count, amount) in sales.items()
+            ],
+        )
+    if units:
+        session.execute(
+            insert(DBProductSalesBucket),
+            [
+                {"bucket": bucket, "product_id": product_id, "units_sold": quantity}
+                for (bucket, product_id), quantity in units.items()
+            ],
+        )
+
+
+def _check_range(start: datetime, end: datetime) -> None:
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+
+@with_session
+def get_revenue(
+    start: datetime,
+    end: datetime,
+    granularity: Granularity = Granularity.hour,
+    *,
+    session=None,
+) -> List[RevenuePoint]:
+    """[start, end) 内每小时/每天的收入（已完成订单的金额），只读取 sales_bucket"""
+    _check_range(start, end)
+    rows = session.execute(
+        select(DBSalesBucket.bucket, DBSalesBucket.order_count, DBSalesBucket.amount)
+        .where(
+            DBSalesBucket.bucket >= hour_bucket(start),
+            DBSalesBucket.bucket < end,
+            DBSalesBucket.event == OrderEvent.completed,
+        )
+        .order_by(DBSalesBucket.bucket)
+    )
+    # 按天汇总时最多合并24个小时桶，在Python中完成，不依赖数据库的日期函数
+    points: Dict[datetime, List] = {}
+    for row in rows:
+        bucket = row.bucket
+        if granularity == Granularity.day:
+            bucket = bucket.replace(hour=0)
+        totals = points.setdefault(bucket, [0, 0])
+        totals[0] += row.amount
+        totals[1] += row.order_count
+    return [
+        RevenuePoint(bucket=bucket.isoformat(), revenue=revenue, orders=orders)
+        for bucket, (revenue, orders) in points.items()
+    ]
+
+
+@with_session
+def get_order_event_counts(start: datetime, end: datetime, *, session=None) -> OrderEventCounts:
+    """[start, end) 内下单、完成、取消的订单数"""
+    _check_range(start, end)
+    rows = session.execute(
+        select(DBSalesBucket.event, func.sum(DBSalesBucket.order_count))
+        .where(DBSalesBucket.bucket >= hour_bucket(start), DBSalesBucket.bucket < end)
+        .group_by(DBSalesBucket.event)
+    )
+    return OrderEventCounts(**{event.value: count for event, count in rows})
+
+
+@with_session
+def get_top_products(
+    start: datetime, end: datetime, limit: int = 10, *, session=None
+) -> List[TopProduct]:
+    """[start, end) 内销量最高的产品"""
+    _check_range(start, end)
+    units_sold = func.sum(DBProductSalesBucket.units_sold).label("units_sold")
+    rows = session.execute(
+        select(DBProductSalesBucket.product_id, units_sold)
+        .where(
+            DBProductSalesBucket.bucket >= hour_bucket(start),
+            DBProductSalesBucket.bucket < end,
+        )
+        .group_by(DBProductSalesBucket.product_id)
+        .order_by(units_sold.desc(), DBProductSalesBucket.product_id)
+        .limit(limit)
+    )
+    return [
+        TopProduct(product_id=str(row.product_id), units_sold=row.units_sold)
+        for row in rows
+    ]
+
+
+def _naive_utc(at: datetime) -> datetime:
+    if at.tzinfo is None:
+        return at
+    return at.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def default_range(
+    start: Optional[datetime], end: Optional[datetime], days: int = 7
+) -> Tuple[datetime, datetime]:
+    """统一成 UTC 的 naive 时间（与桶一致）；未指定时查询最近 days 天"""
+    end = _naive_utc(end) if end else datetime.utcnow()
+    return (_naive_utc(start) if start else end - timedelta(days=days)), end
@@ -1,8 +1,7 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 from assignment_berkeley.db.db_interface import DBInterface, DataObject
-from assignment_berkeley.db.engine import DBSession
 from assignment_berkeley.db.models import DBCustomer
 from assignment_berkeley.operations.interface import DataInterface
 
@@ -24,17 +23,39 @@ class CustomerResponse(BaseModel):
 customer_interface: DataInterface = DBInterface(DBCustomer)
 
 
-def read_all_customers():
-    session = DBSession()
-    customers = session.query(DBCustomer).all()
-    return customers
+def customer_filters(
+    email: Optional[str] = None,
+    first_name: Optional[str] = None,
+    last_name: Optional[str] = None,
+) -> dict:
+    """客户列表的过滤条件：email 精确匹配，first_name/last_name 按前缀搜索，均有索引"""
+    return {
+        "email": email,
+        "first_name_prefix": first_name,
+        "last_name_prefix": last_name,
+    }
 
 
-def get_customer_by_id(customer_id: int):
-    session = DBSession()
-    customer = session.query(DBCustomer).get(customer_id)
-    return customer
+def read_all_customers(
+    filter_params: Optional[dict] = None,
+    *,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    session=None,
+) -> list[DataObject]:
+    return customer_interface.get_all(
+        filter_params, limit=limit, offset=offset, fields=fields, session=session
+    )
 
 
-def create_customer(data: CustomerCreateData) -> DataObject:
-    return customer_interface.create(data.dict(exclude_unset=True))
+def count_customers(filter_params: Optional[dict] = None, *, session=None) -> int:
+    return customer_interface.count(filter_params, session=session)
+
+
+def get_customer_by_id(customer_id: int, *, session=None) -> DataObject:
+    return customer_interface.get_by_id(customer_id, session=session)
+
+
+def create_customer(data: CustomerCreateData, *, session=None) -> DataObject:
+    return customer_interface.create(data.dict(exclude_unset=True), session=session)
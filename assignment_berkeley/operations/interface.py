@@ -1,4 +1,4 @@
-from typing import Any, Protocol
+from typing import Any, Iterable, Iterator, Optional, Protocol
 
 
 DataObject = dict[str, Any]
@@ -7,10 +7,45 @@ DataObject = dict[str, Any]
 class DataInterface(Protocol):
     def get_by_id(self, id: str) -> DataObject: ...
 
-    def get_all(self) -> list[DataObject]: ...
+    def get_all(
+        self,
+        filter_params: Optional[dict] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> list[DataObject]: ...
+
+    def count(self, filter_params: Optional[dict] = None) -> int: ...
+
+    def get_keyset_page(
+        self,
+        filter_params: Optional[dict] = None,
+        *,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> tuple[list[DataObject], Optional[str]]: ...
+
+    def stream(
+        self, filter_params: Optional[dict] = None, *, batch_size: int = 1000
+    ) -> Iterator[DataObject]: ...
 
     def create(self, data: DataObject) -> DataObject: ...
 
     def update(self, id: str, data: DataObject) -> DataObject: ...
 
     def delete(self, id: str) -> DataObject: ...
+
+    def bulk_create(self, rows: list[DataObject]) -> int: ...
+
+    def bulk_update(self, rows: list[DataObject]) -> int: ...
+
+    def bulk_delete(self, ids: list[Any]) -> int: ...
+
+    def existing_ids(self, ids: list[Any]) -> set: ...
+
+    def search(
+        self, query: str, *, limit: Optional[int] = None, offset: Optional[int] = None
+    ) -> list[DataObject]: ...
+
+    def search_count(self, query: str) -> int: ...
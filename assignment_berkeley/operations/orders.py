@@ -1,17 +1,34 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
 from fastapi import HTTPException
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from sqlalchemy import case, func, insert, or_, select, update
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
 from uuid import UUID
-from assignment_berkeley.helpers.db_helpers import with_session, validate_and_get_item
+from assignment_berkeley.helpers.db_helpers import (
+    with_session,
+    with_async_session,
+    validate_and_get_item,
+    run_in_async_session,
+)
 from assignment_berkeley.db.db_interface import DBInterface, DataObject
-from assignment_berkeley.db.engine import DBSession
+from assignment_berkeley.helpers.cache import product_cache
+from assignment_berkeley.operations.products import product_interface
+from assignment_berkeley.operations.sales import (
+    record_orders_canceled,
+    record_orders_completed,
+    record_orders_placed,
+)
 from assignment_berkeley.db.models import (
     DBOrder,
     DBCustomer,
     DBProduct,
     OrderStatus,
     PaymentStatus,
+    ReservationStatus,
     order_product,
+    serializer_for,
     to_dict,
 )
 
@@ -42,13 +59,62 @@ class OrderResponse(BaseModel):
     products: List[OrderProductData]
     created_at: str
     updated_at: str
+    reservation_status: Optional[str] = None
+    reservation_expires_at: Optional[str] = None
+
+
+class CustomerOrderSummary(BaseModel):
+    order_count: int
+    lifetime_spend: float
+    last_order_at: Optional[str] = None
+
+
+class OrderBatchResult(BaseModel):
+    index: int
+    success: bool
+    order: Optional[OrderResponse] = None
+    error: Optional[str] = None
+
+
+class OrderBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchResult]
+
+
+# CSV 导出每个订单明细一行，没有明细的订单输出一行空的产品列
+ORDER_EXPORT_COLUMNS = [column.name for column in DBOrder.__table__.columns] + [
+    "product_id",
+    "quantity",
+]
+
+
+def flatten_order_lines(orders: Iterable[DataObject]) -> Iterator[DataObject]:
+    for order in orders:
+        lines = order.pop("products") or [{}]
+        for line in lines:
+            yield {
+                **order,
+                "product_id": line.get("product_id"),
+                "quantity": line.get("quantity"),
+            }
 
 
 class OrderOperations(DBInterface):
-    # RESERVATION_TIMEOUT = timedelta(minutes=15)
+    RESERVATION_TIMEOUT = timedelta(minutes=15)
+
     def __init__(self):
         super().__init__(DBOrder)
 
+    def _new_reservation(self) -> Dict[str, Any]:
+        """创建订单时已扣减库存，记录预订的有效期"""
+        now = datetime.utcnow()
+        return {
+            "reservation_status": ReservationStatus.reserved,
+            "reserved_at": now,
+            "reservation_expires_at": now + self.RESERVATION_TIMEOUT,
+        }
+
     def _prepare_order_data(self, data: OrderCreateData, session) -> Dict[str, Any]:
         """准备订单数据，计算总价并验证库存"""
         customer = validate_and_get_item(session, data.customer_id, DBCustomer)
@@ -59,13 +125,12 @@ class OrderOperations(DBInterface):
         order_products = []
 
         for item in data.products:
-            product = validate_and_get_item(session, item.product_id, DBProduct)
-            if not product:
-                raise HTTPException(status_code=404, detail="Product not found")
-            if product.quantity < item.quantity:
+            # 价格和库存预检走产品缓存，真正的扣减由 _reserve_stock 的条件UPDATE保证
+            product = product_interface.get_by_id(item.product_id, session=session)
+            if product["quantity"] < item.quantity:
                 raise HTTPException(status_code=400, detail="Insufficient stock")
 
-            total_price += product.price * item.quantity
+            total_price += product["price"] * item.quantity
             order_products.append(
                 {
                     "product_id": UUID(item.product_id),
@@ -79,64 +144,445 @@ class OrderOperations(DBInterface):
                 "total_price": total_price,
                 "status": OrderStatus.pending,
                 "payment_status": PaymentStatus.unpaid,
+                **self._new_reservation(),
             },
             "order_products": order_products,
         }
 
-    def _add_products_to_response(self, order_dict: Dict, session) -> OrderResponse:
-        """添加产品信息到订单响应"""
-        order_products = (
-            session.query(order_product)
-            .filter_by(order_id=UUID(order_dict["id"]))
-            .all()
+    def _load_order_products(
+        self, order_ids: Iterable[UUID], session
+    ) -> Dict[UUID, List[OrderProductData]]:
+        """一次查询批量加载多个订单的产品明细，按订单ID分组"""
+        grouped: Dict[UUID, List[OrderProductData]] = defaultdict(list)
+        order_ids = list(order_ids)
+        if not order_ids:
+            return grouped
+
+        rows = session.execute(
+            select(order_product).where(order_product.c.order_id.in_(order_ids))
         )
-        products = [
-            OrderProductData(product_id=str(op.product_id), quantity=op.quantity)
-            for op in order_products
+        for row in rows:
+            grouped[row.order_id].append(
+                OrderProductData(product_id=str(row.product_id), quantity=row.quantity)
+            )
+        return grouped
+
+    def _build_order_responses(
+        self, order_dicts: List[Dict], session
+    ) -> List[OrderResponse]:
+        """根据分组后的产品明细组装订单响应"""
+        order_products = self._load_order_products(
+            (UUID(order_dict["id"]) for order_dict in order_dicts), session
+        )
+        return [
+            OrderResponse(
+                **order_dict, products=order_products.get(UUID(order_dict["id"]), [])
+            )
+            for order_dict in order_dicts
         ]
-        return OrderResponse(**order_dict, products=products)
+
+    def _add_products_to_response(self, order_dict: Dict, session) -> OrderResponse:
+        """添加产品信息到订单响应"""
+        return self._build_order_responses([order_dict], session)[0]
+
+    @staticmethod
+    def _line_quantities(order_products: List[Dict[str, Any]]) -> Dict[UUID, int]:
+        """按产品汇总订单明细中的数量"""
+        quantities: Dict[UUID, int] = defaultdict(int)
+        for item in order_products:
+            quantities[item["product_id"]] += item["quantity"]
+        return quantities
+
+    def _release_stock(self, quantities: Dict[UUID, int], session) -> None:
+        """归还库存"""
+        product_cache.invalidate(map(str, quantities), session)
+        for product_id, quantity in quantities.items():
+            session.execute(
+                update(DBProduct)
+                .where(DBProduct.id == product_id)
+                .values(quantity=DBProduct.quantity + quantity)
+                .execution_options(synchronize_session=False)
+            )
+
+    def _reserve_stock(self, quantities: Dict[UUID, int], session) -> bool:
+        """
+        用条件UPDATE原子扣减库存：
+        UPDATE product SET quantity = quantity - :n WHERE id = :id AND quantity >= :n
+        只锁定涉及的行，按产品ID顺序加锁避免死锁。
+        任一产品库存不足时回补本次已扣减的部分并返回False。
+        """
+        product_cache.invalidate(map(str, quantities), session)
+        reserved: Dict[UUID, int] = {}
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            result = session.execute(
+                update(DBProduct)
+                .where(DBProduct.id == product_id, DBProduct.quantity >= quantity)
+                .values(quantity=DBProduct.quantity - quantity)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                self._release_stock(reserved, session)
+                return False
+            reserved[product_id] = quantity
+        return True
 
     @with_session
     def create_order(self, data: OrderCreateData, *, session=None) -> OrderResponse:
-        """使用基类的create方法创建订单"""
+        """使用基类的create方法创建订单，库存扣减与订单写入在同一个事务中"""
         prepared_data = self._prepare_order_data(data, session)
+        quantities = self._line_quantities(prepared_data["order_products"])
+        if not self._reserve_stock(quantities, session):
+            raise HTTPException(status_code=400, detail="Insufficient stock")
+
         order_dict = self.create(prepared_data["order_data"], session=session)
 
-        # 创建订单-产品关联
-        for item in prepared_data["order_products"]:
+        # 创建订单-产品关联；没有产品时跳过（空列表的 executemany 会变成 INSERT ... DEFAULT VALUES）
+        if quantities:
             session.execute(
-                order_product.insert().values(
-                    order_id=UUID(order_dict["id"]),
-                    product_id=item["product_id"],
-                    quantity=item["quantity"],
-                )
+                order_product.insert(),
+                [
+                    {
+                        "order_id": UUID(order_dict["id"]),
+                        "product_id": product_id,
+                        "quantity": quantity,
+                    }
+                    for product_id, quantity in quantities.items()
+                ],
             )
+        record_orders_placed([UUID(order_dict["id"])], session)
 
         return self._add_products_to_response(order_dict, session)
 
+    @staticmethod
+    def _parse_product_ids(orders: List[OrderCreateData]) -> set:
+        product_ids = set()
+        for data in orders:
+            for item in data.products:
+                try:
+                    product_ids.add(UUID(item.product_id))
+                except ValueError:
+                    pass  # 在逐单校验时报告
+        return product_ids
+
+    def _prepare_batch_order(
+        self,
+        data: OrderCreateData,
+        customer_ids: set,
+        products: Dict[UUID, DBProduct],
+        remaining: Dict[UUID, int],
+    ) -> Dict[str, Any]:
+        """用预加载的客户/产品校验单个订单，并从批次剩余库存中扣减"""
+        if data.customer_id not in customer_ids:
+            raise HTTPException(status_code=404, detail="Customer not found")
+
+        quantities: Dict[UUID, int] = defaultdict(int)
+        for item in data.products:
+            try:
+                product_id = UUID(item.product_id)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid UUID format")
+            if product_id not in products:
+                raise HTTPException(status_code=404, detail="Product not found")
+            quantities[product_id] += item.quantity
+
+        for product_id, quantity in quantities.items():
+            if remaining[product_id] < quantity:
+                raise HTTPException(status_code=400, detail="Insufficient stock")
+
+        total_price = 0
+        for product_id, quantity in quantities.items():
+            remaining[product_id] -= quantity
+            total_price += products[product_id].price * quantity
+
+        order_id = uuid.uuid4()
+        return {
+            "order_data": {
+                "id": order_id,
+                "customer_id": data.customer_id,
+                "total_price": total_price,
+                "status": OrderStatus.pending,
+                "payment_status": PaymentStatus.unpaid,
+                **self._new_reservation(),
+            },
+            "order_products": [
+                {"order_id": order_id, "product_id": product_id, "quantity": quantity}
+                for product_id, quantity in quantities.items()
+            ],
+        }
+
+    @with_session
+    def create_orders_batch(
+        self, orders: List[OrderCreateData], *, session=None
+    ) -> OrderBatchResponse:
+        """批量创建订单：客户和产品各一次查询，汇总校验库存，executemany 批量写入
+
+        库存按订单逐个用条件UPDATE扣减，失败的订单不影响同批次其他订单。
+        """
+        customer_ids = set(
+            session.scalars(
+                select(DBCustomer.id).where(
+                    DBCustomer.id.in_({data.customer_id for data in orders})
+                )
+            )
+        )
+        products = {
+            product.id: product
+            for product in session.scalars(
+                select(DBProduct).where(
+                    DBProduct.id.in_(self._parse_product_ids(orders))
+                )
+            )
+        }
+        remaining = {product_id: p.quantity for product_id, p in products.items()}
+
+        order_rows, order_product_rows, results = [], [], []
+        for index, data in enumerate(orders):
+            try:
+                prepared = self._prepare_batch_order(
+                    data, customer_ids, products, remaining
+                )
+            except HTTPException as e:
+                results.append(
+                    OrderBatchResult(index=index, success=False, error=e.detail)
+                )
+                continue
+            # 并发下库存可能已被其他请求占用，以条件UPDATE的结果为准
+            quantities = self._line_quantities(prepared["order_products"])
+            if not self._reserve_stock(quantities, session):
+                results.append(
+                    OrderBatchResult(
+                        index=index, success=False, error="Insufficient stock"
+                    )
+                )
+                continue
+            order_rows.append(prepared["order_data"])
+            order_product_rows.extend(prepared["order_products"])
+            results.append(OrderBatchResult(index=index, success=True))
+
+        if order_rows:
+            session.execute(insert(DBOrder), order_rows)
+            # 空列表的 executemany 会变成 INSERT ... DEFAULT VALUES
+            if order_product_rows:
+                session.execute(order_product.insert(), order_product_rows)
+            record_orders_placed([row["id"] for row in order_rows], session)
+
+            created = session.scalars(
+                select(DBOrder).where(
+                    DBOrder.id.in_([row["id"] for row in order_rows])
+                )
+            )
+            responses = {
+                response.id: response
+                for response in self._build_order_responses(
+                    [to_dict(order) for order in created], session
+                )
+            }
+            created_results = (r for r in results if r.success)
+            for result, row in zip(created_results, order_rows):
+                result.order = responses[str(row["id"])]
+
+        return OrderBatchResponse(
+            created=len(order_rows),
+            failed=len(orders) - len(order_rows),
+            results=results,
+        )
+
     @with_session
     def get_order_by_id(self, order_id: str, *, session=None) -> OrderResponse:
         """使用基类的get_by_id方法获取订单"""
         order_dict = self.get_by_id(order_id, session=session)
         return self._add_products_to_response(order_dict, session)
 
+    @staticmethod
+    def _order_filters(
+        status: Optional[str] = None, payment_status: Optional[str] = None
+    ) -> Dict[str, Any]:
+        filter_params = {}
+        if status:
+            filter_params["status"] = status
+        if payment_status:
+            filter_params["payment_status"] = payment_status
+        return filter_params
+
     @with_session
     def get_all_orders(
         self,
         status: Optional[str] = None,
         payment_status: Optional[str] = None,
         *,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        fields: Optional[List[str]] = None,
         session=None
     ) -> List[OrderResponse]:
-        """使用基类的get_all方法获取订单列表"""
-        filter_params = {}
-        if status:
-            filter_params["status"] = status
-        if payment_status:
-            filter_params["payment_status"] = payment_status
+        """使用基类的get_all方法获取订单列表，limit/offset下推到SQL"""
+        filter_params = self._order_filters(status, payment_status)
+        if fields:
+            return self._get_projected_orders(
+                filter_params, fields, limit=limit, offset=offset, session=session
+            )
+        orders = self.get_all(
+            filter_params, limit=limit, offset=offset, session=session
+        )
+        return self._build_order_responses(orders, session)
+
+    def _get_projected_orders(
+        self,
+        filter_params: Dict[str, Any],
+        fields: List[str],
+        *,
+        limit: Optional[int],
+        offset: Optional[int],
+        session,
+    ) -> List[DataObject]:
+        """只查询指定的列，"products" 表示附带产品明细（需要按订单ID加载）"""
+        with_products = "products" in fields
+        columns = [name for name in fields if name != "products"]
+        query_columns = ["id", *columns] if with_products else columns
+        orders = self.get_all(
+            filter_params,
+            limit=limit,
+            offset=offset,
+            fields=query_columns,
+            session=session,
+        )
+        if with_products:
+            order_products = self._load_order_products(
+                (UUID(order["id"]) for order in orders), session
+            )
+            for order in orders:
+                order_id = order["id"] if "id" in columns else order.pop("id")
+                order["products"] = order_products.get(UUID(order_id), [])
+        return orders
+
+    def stream_orders(
+        self,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        *,
+        batch_size: int = 1000,
+    ) -> Iterator[DataObject]:
+        """
+        流式导出订单：一条 LEFT JOIN 查询带出产品明细，按 (created_at, id) 排序，
+        相邻的同一订单的行合并成一条记录，内存里只保留当前订单
+        """
+        query = (
+            select(
+                *DBOrder.__table__.columns,
+                order_product.c.product_id.label("line_product_id"),
+                order_product.c.quantity.label("line_quantity"),
+            )
+            .outerjoin(order_product, order_product.c.order_id == DBOrder.id)
+            .where(*self._filter_clauses(self._order_filters(status, payment_status)))
+            .order_by(*self._order_columns())
+            .execution_options(yield_per=batch_size)
+        )
+        return self._group_order_rows(self._stream_rows(query, lambda row: row))
+
+    @staticmethod
+    def _group_order_rows(rows: Iterable[Any]) -> Iterator[DataObject]:
+        serialize = serializer_for(DBOrder)
+        current = None
+        for row in rows:
+            if current is None or current["id"] != str(row.id):
+                if current is not None:
+                    yield current
+                current = serialize(row)
+                current["products"] = []
+            if row.line_product_id is not None:
+                current["products"].append(
+                    {"product_id": str(row.line_product_id), "quantity": row.line_quantity}
+                )
+        if current is not None:
+            yield current
+
+    @with_session
+    def get_orders_after(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        *,
+        session=None
+    ) -> Tuple[List[OrderResponse], Optional[str]]:
+        """按 (created_at, id) 游标分页获取订单，返回订单和下一页游标"""
+        orders, next_cursor = self.get_keyset_page(
+            self._order_filters(status, payment_status),
+            cursor=cursor,
+            limit=limit,
+            session=session,
+        )
+        return self._build_order_responses(orders, session), next_cursor
 
-        orders = self.get_all(filter_params, session=session)
-        return [self._add_products_to_response(order, session) for order in orders]
+    def count_orders(
+        self,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        *,
+        session=None
+    ) -> int:
+        """统计满足过滤条件的订单数"""
+        return self.count(self._order_filters(status, payment_status), session=session)
+
+    @with_session
+    def get_customer_order_summary(
+        self, customer_id: int, *, session=None
+    ) -> CustomerOrderSummary:
+        """
+        一条聚合查询（走 ix_orders_customer_created）得到客户的订单数、
+        累计消费（已完成订单的总价）和最近下单时间；客户不存在时返回404
+        """
+        row = session.execute(
+            select(
+                func.count(DBOrder.id).label("order_count"),
+                func.coalesce(
+                    func.sum(
+                        case(
+                            (DBOrder.status == OrderStatus.completed, DBOrder.total_price),
+                            else_=0,
+                        )
+                    ),
+                    0,
+                ).label("lifetime_spend"),
+                func.max(DBOrder.created_at).label("last_order_at"),
+            ).where(DBOrder.customer_id == customer_id)
+        ).one()
+        if row.order_count == 0:
+            validate_and_get_item(session, customer_id, DBCustomer)
+        return CustomerOrderSummary(
+            order_count=row.order_count,
+            lifetime_spend=row.lifetime_spend,
+            last_order_at=str(row.last_order_at) if row.last_order_at else None,
+        )
+
+    @with_session
+    def get_customer_orders(
+        self, customer_id: int, *, limit: int, offset: int = 0, session=None
+    ) -> List[OrderResponse]:
+        """
+        客户的订单（最近的在前）及其明细：先在子查询中按索引取出当前页的订单，
+        再 LEFT JOIN order_product，一条查询带出整页的产品明细
+        """
+        page = (
+            select(DBOrder.__table__)
+            .where(DBOrder.customer_id == customer_id)
+            .order_by(DBOrder.created_at.desc(), DBOrder.id.desc())
+            .limit(limit)
+            .offset(offset)
+            .subquery()
+        )
+        rows = session.execute(
+            select(
+                *page.c,
+                order_product.c.product_id.label("line_product_id"),
+                order_product.c.quantity.label("line_quantity"),
+            )
+            .outerjoin(order_product, order_product.c.order_id == page.c.id)
+            .order_by(page.c.created_at.desc(), page.c.id.desc())
+        )
+        return [OrderResponse(**order) for order in self._group_order_rows(rows)]
 
     @with_session
     def update_order_status(
@@ -150,192 +596,319 @@ class OrderOperations(DBInterface):
 
         if data.status not in allowed_transitions.get(order.status, []):
             raise HTTPException(status_code=400, detail="Invalid status transition")
+        if self.settle_reservations([order.id], data.status, session=session):
+            raise HTTPException(status_code=400, detail="Reservation has expired")
         updated_data = {"status": data.status}
         if data.status == "completed":
             updated_data["payment_status"] = "paid"
-        order_dict = self.update(order_id, updated_data, session=session)
-        return self._add_products_to_response(order_dict, session)
+        self.update(order_id, updated_data, session=session)
+        if data.status == "completed":
+            record_orders_completed([order.id], session)
+        else:
+            record_orders_canceled([order.id], session)
+        # 预订状态是用Core UPDATE修改的，重新加载订单
+        session.refresh(order)
+        return self.get_order_by_id(order_id, session=session)
+
+    def _claim_reservations(
+        self,
+        target: ReservationStatus,
+        session,
+        *,
+        order_ids=None,
+        expired: Optional[bool] = None,
+    ) -> List[UUID]:
+        """
+        把仍处于reserved的预订原子地切换到目标状态（UPDATE ... RETURNING），
+        返回实际切换成功的订单ID。并发的清理任务/取消请求只会有一方成功。
+        """
+        now = datetime.utcnow()
+        conditions = [DBOrder.reservation_status == ReservationStatus.reserved]
+        if order_ids is not None:
+            conditions.append(DBOrder.id.in_(order_ids))
+        if expired is True:
+            conditions.append(DBOrder.reservation_expires_at <= now)
+        elif expired is False:
+            conditions.append(DBOrder.reservation_expires_at > now)
+
+        result = session.execute(
+            update(DBOrder)
+            .where(*conditions)
+            .values(reservation_status=target)
+            .returning(DBOrder.id)
+            .execution_options(synchronize_session=False)
+        )
+        return [row.id for row in result]
+
+    def _release_order_stock(self, order_ids: List[UUID], session) -> None:
+        """按订单明细归还库存，一条UPDATE处理所有涉及的产品"""
+        if not order_ids:
+            return
+        released = (
+            select(func.sum(order_product.c.quantity))
+            .where(
+                order_product.c.order_id.in_(order_ids),
+                order_product.c.product_id == DBProduct.id,
+            )
+            .scalar_subquery()
+        )
+        product_ids = session.scalars(
+            update(DBProduct)
+            .where(
+                DBProduct.id.in_(
+                    select(order_product.c.product_id).where(
+                        order_product.c.order_id.in_(order_ids)
+                    )
+                )
+            )
+            .values(quantity=DBProduct.quantity + released)
+            .returning(DBProduct.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        product_cache.invalidate(map(str, product_ids), session)
+
+    @with_session
+    def settle_reservations(
+        self, order_ids: List[UUID], status: str, *, session=None
+    ) -> set:
+        """
+        订单完成或取消时结算预订：
+        - completed：有效期内的预订标记为completed
+        - canceled：归还仍被占用的库存，预订标记为cancelled
+        返回因预订已过期而不能完成的订单ID。
+        """
+        status = OrderStatus(status)
+        if status == OrderStatus.canceled:
+            claimed = self._claim_reservations(
+                ReservationStatus.cancelled, session, order_ids=order_ids
+            )
+            self._release_order_stock(claimed, session)
+            session.execute(
+                update(DBOrder)
+                .where(
+                    DBOrder.id.in_(order_ids),
+                    DBOrder.reservation_status == ReservationStatus.expired,
+                )
+                .values(reservation_status=ReservationStatus.cancelled)
+                .execution_options(synchronize_session=False)
+            )
+            return set()
+
+        claimed = set(
+            self._claim_reservations(
+                ReservationStatus.completed,
+                session,
+                order_ids=order_ids,
+                expired=False,
+            )
+        )
+        unclaimed = [order_id for order_id in order_ids if order_id not in claimed]
+        if not unclaimed:
+            return set()
+        # 没有预订记录的历史订单可以直接完成
+        return set(
+            session.scalars(
+                select(DBOrder.id).where(
+                    DBOrder.id.in_(unclaimed),
+                    DBOrder.reservation_status.is_not(None),
+                )
+            )
+        )
+
+    @with_session
+    def reserve_order(self, order_id: str, *, session=None) -> OrderResponse:
+        """
+        为待支付订单重新预订库存（15分钟有效）。
+        仍在有效期内的预订不能重复预订；已过期但尚未清理的预订直接续期。
+        """
+        order = validate_and_get_item(session, order_id, DBOrder)
+        if order.status != OrderStatus.pending:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot reserve order in {order.status.value} status",
+            )
+
+        if order.reservation_status == ReservationStatus.reserved:
+            if order.reservation_expires_at > datetime.utcnow():
+                raise HTTPException(status_code=400, detail="Order is already reserved")
+            # 库存仍被占用，只需要续期
+            renewed = session.execute(
+                update(DBOrder)
+                .where(
+                    DBOrder.id == order.id,
+                    DBOrder.reservation_status == ReservationStatus.reserved,
+                )
+                .values(**self._new_reservation())
+                .execution_options(synchronize_session=False)
+            )
+            if renewed.rowcount == 1:
+                session.refresh(order)
+                return self.get_order_by_id(order_id, session=session)
+            # 清理任务已经释放了库存，按重新预订处理
+
+        claimed = session.execute(
+            update(DBOrder)
+            .where(
+                DBOrder.id == order.id,
+                or_(
+                    DBOrder.reservation_status.is_(None),
+                    DBOrder.reservation_status == ReservationStatus.expired,
+                ),
+            )
+            .values(**self._new_reservation())
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount != 1:
+            raise HTTPException(status_code=400, detail="Order is already reserved")
+
+        order_products = session.execute(
+            select(order_product).where(order_product.c.order_id == order.id)
+        ).mappings()
+        if not self._reserve_stock(self._line_quantities(order_products), session):
+            raise HTTPException(status_code=400, detail="Insufficient stock")
 
-    # @with_session
-    # def reserve_order(self, order_id: str, *, session=None) -> OrderResponse:
-    #     """
-    #     Reserve products for an order with 15-minute timeout
-    #     """
-    #     try:
-    #         # 锁定订单记录
-    #         order = (
-    #             session.query(DBOrder)
-    #             .filter(DBOrder.id == UUID(order_id))
-    #             .with_for_update()
-    #             .first()
-    #         )
-
-    #         if not order:
-    #             raise HTTPException(
-    #                 status_code=status.HTTP_404_NOT_FOUND, detail="Order not found"
-    #             )
-
-    #         # 检查订单状态
-    #         if order.status != OrderStatus.pending:
-    #             raise HTTPException(
-    #                 status_code=status.HTTP_400_BAD_REQUEST,
-    #                 detail=f"Cannot reserve order in {order.status} status",
-    #             )
-
-    #         if order.reservation_status == ReservationStatus.reserved:
-    #             if order.reservation_expires_at > datetime.now():
-    #                 raise HTTPException(
-    #                     status_code=status.HTTP_400_BAD_REQUEST,
-    #                     detail="Order is already reserved",
-    #                 )
-
-    #         # 获取并锁定订单中的所有产品
-    #         order_products = (
-    #             session.query(order_product)
-    #             .filter(order_product.c.order_id == order.id)
-    #             .all()
-    #         )
-
-    #         # 锁定并检查产品库存
-    #         for op in order_products:
-    #             product = (
-    #                 session.query(DBProduct)
-    #                 .filter(DBProduct.id == op.product_id)
-    #                 .with_for_update()
-    #                 .first()
-    #             )
-
-    #             if not product:
-    #                 raise HTTPException(
-    #                     status_code=status.HTTP_404_NOT_FOUND,
-    #                     detail=f"Product {op.product_id} not found",
-    #                 )
-
-    #             if product.quantity < op.quantity:
-    #                 raise HTTPException(
-    #                     status_code=status.HTTP_400_BAD_REQUEST,
-    #                     detail=f"Insufficient stock for product {product.id}",
-    #                 )
-
-    #             # 预扣库存
-    #             product.quantity -= op.quantity
-
-    #         # 更新订单预订状态
-    #         now = datetime.now()
-    #         order.reservation_status = ReservationStatus.reserved
-    #         order.reserved_at = now
-    #         order.reservation_expires_at = now + self.RESERVATION_TIMEOUT
-
-    #         # 提交更改
-    #         session.flush()
-
-    #         # 构建响应
-    #         products = [
-    #             OrderProductData(product_id=str(op.product_id), quantity=op.quantity)
-    #             for op in order_products
-    #         ]
-
-    #         return OrderResponse(
-    #             **to_dict(order),
-    #             products=products,
-    #             reservation_expires_at=order.reservation_expires_at,
-    #         )
-
-    #     except Exception as e:
-    #         session.rollback()
-    #         if isinstance(e, HTTPException):
-    #             raise e
-    #         raise HTTPException(
-    #             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-    #             detail=f"Failed to reserve order: {str(e)}",
-    #         )
-
-    # @with_session
-    # def handle_reservation_expiration(self, *, session=None):
-    #     """
-    #     处理过期的预订，释放库存
-    #     """
-    #     expired_orders = (
-    #         session.query(DBOrder)
-    #         .filter(
-    #             and_(
-    #                 DBOrder.reservation_status == ReservationStatus.reserved,
-    #                 DBOrder.reservation_expires_at <= datetime.now(),
-    #                 DBOrder.status == OrderStatus.pending,
-    #             )
-    #         )
-    #         .with_for_update()
-    #         .all()
-    #     )
-
-    #     for order in expired_orders:
-    #         # 获取订单产品
-    #         order_products = (
-    #             session.query(order_product)
-    #             .filter(order_product.c.order_id == order.id)
-    #             .all()
-    #         )
-
-    #         # 返还库存
-    #         for op in order_products:
-    #             product = (
-    #                 session.query(DBProduct)
-    #                 .filter(DBProduct.id == op.product_id)
-    #                 .with_for_update()
-    #                 .first()
-    #             )
-    #             if product:
-    #                 product.quantity += op.quantity
-
-    #         # 更新订单状态
-    #         order.reservation_status = ReservationStatus.expired
-
-    #     session.flush()
-
-    # @with_session
-    # def complete_reserved_order(self, order_id: str, *, session=None) -> OrderResponse:
-    #     """
-    #     完成已预订的订单
-    #     """
-    #     order = (
-    #         session.query(DBOrder)
-    #         .filter(DBOrder.id == UUID(order_id))
-    #         .with_for_update()
-    #         .first()
-    #     )
-
-    #     if not order:
-    #         raise HTTPException(
-    #             status_code=status.HTTP_404_NOT_FOUND, detail="Order not found"
-    #         )
-
-    #     if order.reservation_status != ReservationStatus.reserved:
-    #         raise HTTPException(
-    #             status_code=status.HTTP_400_BAD_REQUEST, detail="Order is not reserved"
-    #         )
-
-    #     if order.reservation_expires_at <= datetime.now():
-    #         raise HTTPException(
-    #             status_code=status.HTTP_400_BAD_REQUEST,
-    #             detail="Reservation has expired",
-    #         )
-
-    #     # 更新订单状态
-    #     order.status = OrderStatus.completed
-    #     order.reservation_status = ReservationStatus.completed
-
-    #     session.flush()
-
-    #     # 构建响应
-    #     order_products = (
-    #         session.query(order_product)
-    #         .filter(order_product.c.order_id == order.id)
-    #         .all()
-    #     )
-
-    #     products = [
-    #         OrderProductData(product_id=str(op.product_id), quantity=op.quantity)
-    #         for op in order_products
-    #     ]
-
-    #     return OrderResponse(**to_dict(order), products=products)
+        session.refresh(order)
+        return self.get_order_by_id(order_id, session=session)
+
+    @with_session
+    def complete_reserved_order(self, order_id: str, *, session=None) -> OrderResponse:
+        """完成已预订的订单"""
+        order = validate_and_get_item(session, order_id, DBOrder)
+        if order.reservation_status != ReservationStatus.reserved:
+            raise HTTPException(status_code=400, detail="Order is not reserved")
+        return self.update_order_status(
+            order_id, OrderStatusUpdateData(status="completed"), session=session
+        )
+
+    def release_expired_reservations(
+        self, batch_size: int = 500, *, session=None
+    ) -> int:
+        """
+        释放过期预订：每批一条UPDATE认领过期订单（走 ix_orders_reservation_expiry），
+        一条UPDATE归还库存，返回释放的订单数。
+        未传入session时每批使用单独的session并提交，缩短持有写锁的时间；
+        传入session时所有批次都在该session中执行，由调用方提交。
+        """
+        released = 0
+        while True:
+            claimed = self._release_expired_batch(batch_size, session=session)
+            released += claimed
+            if claimed < batch_size:
+                return released
+
+    @with_session
+    def _release_expired_batch(self, batch_size: int, *, session=None) -> int:
+        expired_ids = (
+            select(DBOrder.id)
+            .where(
+                DBOrder.reservation_status == ReservationStatus.reserved,
+                DBOrder.reservation_expires_at <= datetime.utcnow(),
+                DBOrder.status == OrderStatus.pending,
+            )
+            .limit(batch_size)
+        )
+        claimed = self._claim_reservations(
+            ReservationStatus.expired, session, order_ids=expired_ids, expired=True
+        )
+        self._release_order_stock(claimed, session)
+        return len(claimed)
+
+
+class AsyncOrderOperations:
+    """
+    OrderOperations 的异步版本：通过 AsyncSession.run_sync 复用同步的订单逻辑，
+    数据库I/O走异步驱动，不占用线程池。
+    """
+
+    def __init__(self, order_ops: Optional[OrderOperations] = None):
+        self.order_ops = order_ops or OrderOperations()
+
+    @with_async_session
+    async def create_order(self, data: OrderCreateData, *, session=None) -> OrderResponse:
+        return await run_in_async_session(session, self.order_ops.create_order, data)
+
+    @with_async_session
+    async def create_orders_batch(
+        self, orders: List[OrderCreateData], *, session=None
+    ) -> OrderBatchResponse:
+        return await run_in_async_session(
+            session, self.order_ops.create_orders_batch, orders
+        )
+
+    @with_async_session
+    async def get_order_by_id(self, order_id: str, *, session=None) -> OrderResponse:
+        return await run_in_async_session(
+            session, self.order_ops.get_order_by_id, order_id
+        )
+
+    @with_async_session
+    async def get_all_orders(
+        self,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        fields: Optional[List[str]] = None,
+        session=None
+    ) -> List[OrderResponse]:
+        return await run_in_async_session(
+            session,
+            self.order_ops.get_all_orders,
+            status,
+            payment_status,
+            limit=limit,
+            offset=offset,
+            fields=fields,
+        )
+
+    @with_async_session
+    async def count_orders(
+        self,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        *,
+        session=None
+    ) -> int:
+        return await run_in_async_session(
+            session, self.order_ops.count_orders, status, payment_status
+        )
+
+    @with_async_session
+    async def get_orders_after(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        *,
+        session=None
+    ) -> Tuple[List[OrderResponse], Optional[str]]:
+        return await run_in_async_session(
+            session,
+            self.order_ops.get_orders_after,
+            cursor,
+            limit,
+            status,
+            payment_status,
+        )
+
+    @with_async_session
+    async def update_order_status(
+        self, order_id: str, data: OrderStatusUpdateData, *, session=None
+    ) -> OrderResponse:
+        return await run_in_async_session(
+            session, self.order_ops.update_order_status, order_id, data
+        )
+
+    @with_async_session
+    async def reserve_order(self, order_id: str, *, session=None) -> OrderResponse:
+        return await run_in_async_session(session, self.order_ops.reserve_order, order_id)
+
+    @with_async_session
+    async def complete_reserved_order(
+        self, order_id: str, *, session=None
+    ) -> OrderResponse:
+        return await run_in_async_session(
+            session, self.order_ops.complete_reserved_order, order_id
+        )
@@ -1,9 +1,20 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional
-from fastapi import Query
+import uuid
+from uuid import UUID
+from pydantic import BaseModel, Field, ValidationError, validator
+from typing import AsyncIterable, Iterator, List, Optional, Set
+from fastapi import HTTPException, Query
+from assignment_berkeley.config import BULK_CHUNK_SIZE
 from assignment_berkeley.operations.interface import DataInterface
 from assignment_berkeley.db.db_interface import DBInterface, DataObject
-from assignment_berkeley.db.models import DBProduct
+from assignment_berkeley.db.async_db_interface import AsyncDBInterface
+from assignment_berkeley.db.models import DBProduct, product_search_index
+from assignment_berkeley.helpers.bulk import enumerate_chunks, validation_error_message
+from assignment_berkeley.helpers.cache import product_cache
+from assignment_berkeley.helpers.db_helpers import (
+    with_session,
+    with_async_session,
+    run_in_async_session,
+)
 
 
 class ProductCreateData(BaseModel):
@@ -29,13 +40,39 @@ class ProductUpdateData(BaseModel):
         default=5, gt=0, description="Must be greater than 0"
     )
 
-    @validator("price", "quantity", pre=True, always=True)
+    @validator("price", "quantity", always=True)
     def check_positive_optional(cls, value):
         if value is not None and value <= 0:
             raise ValueError("Must be greater than 0")
         return value
 
 
+class ProductBulkUpdateData(ProductUpdateData):
+    """批量更新的一行：按 id 定位，只更新请求中给出的字段"""
+
+    id: str
+
+    @validator("name", "price", "quantity")
+    def check_not_null(cls, value):
+        # 显式的 null 会违反 NOT NULL，导致整个分块的 executemany 失败，在行级别拒绝
+        if value is None:
+            raise ValueError("Must not be null")
+        return value
+
+
+class ProductBulkResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ProductBulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[ProductBulkResult]
+
+
 class ProductResponse(BaseModel):
     id: str
     name: str
@@ -47,25 +84,258 @@ class ProductResponse(BaseModel):
 
 
 # Create an instance of DBInterface where contains the CRUD methods
-# The pass-in argument is the DBProduct
-product_interface: DataInterface = DBInterface(DBProduct)
+# The pass-in argument is the DBProduct; reads by id go through product_cache
+product_interface: DataInterface = DBInterface(
+    DBProduct, cache=product_cache, search_index=product_search_index
+)
+async_product_interface = AsyncDBInterface(
+    DBProduct, cache=product_cache, search_index=product_search_index
+)
+
+
+def create_product(data: ProductCreateData, *, session=None):
+    return product_interface.create(data.dict(), session=session)
+
+
+def update_product(product_id: str, data: ProductUpdateData, *, session=None):
+    return product_interface.update(
+        product_id, data.dict(exclude_none=True), session=session
+    )
+
+
+def product_filters(
+    in_stock: Optional[bool] = True,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> dict:
+    """产品列表的过滤条件，由 DBInterface 编译成SQL WHERE；in_stock 为 None 时不按库存过滤"""
+    filter_params = {"price_gte": min_price, "price_lte": max_price}
+    if in_stock is not None:
+        filter_params["quantity_gt" if in_stock else "quantity_lte"] = 0
+    return filter_params
+
+
+def get_all_products(
+    filter_params: dict,
+    *,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    session=None,
+):
+    return product_interface.get_all(
+        filter_params, limit=limit, offset=offset, fields=fields, session=session
+    )
+
+
+def count_products(filter_params: dict, *, session=None) -> int:
+    return product_interface.count(filter_params, session=session)
+
+
+def get_products_after(
+    filter_params: dict, cursor: Optional[str], limit: int, *, session=None
+):
+    return product_interface.get_keyset_page(
+        filter_params, cursor=cursor, limit=limit, session=session
+    )
+
+
+PRODUCT_EXPORT_COLUMNS = [column.name for column in DBProduct.__table__.columns]
+
+
+def stream_products(filter_params: dict, *, batch_size: int = 1000) -> Iterator[DataObject]:
+    return product_interface.stream(filter_params, batch_size=batch_size)
+
+
+def search_products(
+    query: str, *, limit: Optional[int] = None, offset: Optional[int] = None, session=None
+) -> List[DataObject]:
+    """按名称和描述全文搜索，按相关度排序"""
+    return product_interface.search(query, limit=limit, offset=offset, session=session)
+
+
+def get_product_by_id(product_id: str, *, session=None) -> DataObject:
+    return product_interface.get_by_id(product_id, session=session)
 
 
-def create_product(data: ProductCreateData):
-    return product_interface.create(data.dict())
+def delete_product_by_id(product_id: str, *, session=None) -> dict:
+    return product_interface.delete(product_id, session=session)
 
 
-def update_product(product_id: str, data: ProductUpdateData):
-    return product_interface.update(product_id, data.dict(exclude_none=True))
+# 异步版本，供 async 路由使用
+async def create_product_async(data: ProductCreateData, *, session=None):
+    return await async_product_interface.create(data.dict(), session=session)
 
 
-def get_all_products(filter_params: dict):
-    return product_interface.get_all(filter_params)
+async def update_product_async(
+    product_id: str, data: ProductUpdateData, *, session=None
+):
+    return await async_product_interface.update(
+        product_id, data.dict(exclude_none=True), session=session
+    )
+
+
+async def get_all_products_async(
+    filter_params: dict,
+    *,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    session=None,
+):
+    return await async_product_interface.get_all(
+        filter_params, limit=limit, offset=offset, fields=fields, session=session
+    )
+
+
+async def count_products_async(filter_params: dict, *, session=None) -> int:
+    return await async_product_interface.count(filter_params, session=session)
+
+
+async def get_products_after_async(
+    filter_params: dict, cursor: Optional[str], limit: int, *, session=None
+):
+    return await async_product_interface.get_keyset_page(
+        filter_params, cursor=cursor, limit=limit, session=session
+    )
+
+
+async def search_products_async(
+    query: str, *, limit: Optional[int] = None, offset: Optional[int] = None, session=None
+) -> List[DataObject]:
+    return await async_product_interface.search(
+        query, limit=limit, offset=offset, session=session
+    )
+
+
+async def count_search_products_async(query: str, *, session=None) -> int:
+    return await async_product_interface.search_count(query, session=session)
+
+
+async def get_product_by_id_async(product_id: str, *, session=None) -> DataObject:
+    return await async_product_interface.get_by_id(product_id, session=session)
+
+
+async def delete_product_by_id_async(product_id: str, *, session=None) -> dict:
+    return await async_product_interface.delete(product_id, session=session)
+
+
+# 批量导入和更新：每个分块一个事务，一条 executemany 写入，逐行报告结果
+@with_session
+def _insert_product_rows(rows: List[dict], *, session=None) -> List[str]:
+    # 预先生成ID，用于逐行报告结果
+    for row in rows:
+        row["id"] = uuid.uuid4()
+    product_interface.bulk_create(rows, session=session)
+    return [str(row["id"]) for row in rows]
+
+
+@with_session
+def _update_product_rows(rows: List[dict], *, session=None) -> Set[UUID]:
+    """按主键批量UPDATE，返回不存在的产品ID"""
+    ids = {row["id"] for row in rows}
+    existing = product_interface.existing_ids(list(ids), session=session)
+    product_interface.bulk_update(
+        [row for row in rows if row["id"] in existing], session=session
+    )
+    return ids - existing
+
+
+@with_async_session
+async def _insert_product_rows_async(rows: List[dict], *, session=None) -> List[str]:
+    return await run_in_async_session(session, _insert_product_rows, rows)
+
+
+@with_async_session
+async def _update_product_rows_async(rows: List[dict], *, session=None) -> Set[UUID]:
+    return await run_in_async_session(session, _update_product_rows, rows)
+
+
+def _validate_rows(chunk, model: type[BaseModel], results: List[ProductBulkResult]):
+    """校验一个分块，失败的行直接记入结果，返回 (序号, 模型) 列表"""
+    valid = []
+    for index, record in chunk:
+        if not isinstance(record, dict):
+            results.append(
+                ProductBulkResult(index=index, success=False, error="Malformed record")
+            )
+            continue
+        try:
+            valid.append((index, model(**record)))
+        except (ValidationError, ValueError) as e:
+            results.append(
+                ProductBulkResult(
+                    index=index, success=False, error=validation_error_message(e)
+                )
+            )
+    return valid
+
+
+def _bulk_response(results: List[ProductBulkResult]) -> ProductBulkResponse:
+    results.sort(key=lambda result: result.index)
+    succeeded = sum(result.success for result in results)
+    return ProductBulkResponse(
+        succeeded=succeeded, failed=len(results) - succeeded, results=results
+    )
 
 
-def get_product_by_id(product_id: str) -> DataObject:
-    return product_interface.get_by_id(product_id)
+async def bulk_create_products_async(
+    records: AsyncIterable[Optional[dict]], *, chunk_size: int = BULK_CHUNK_SIZE
+) -> ProductBulkResponse:
+    results: List[ProductBulkResult] = []
+    async for chunk in enumerate_chunks(records, chunk_size):
+        valid = _validate_rows(chunk, ProductCreateData, results)
+        if not valid:
+            continue
+        try:
+            ids = await _insert_product_rows_async([data.dict() for _, data in valid])
+        except HTTPException as e:
+            results.extend(
+                ProductBulkResult(index=index, success=False, error=e.detail)
+                for index, _ in valid
+            )
+            continue
+        results.extend(
+            ProductBulkResult(index=index, success=True, id=product_id)
+            for (index, _), product_id in zip(valid, ids)
+        )
+    return _bulk_response(results)
 
 
-def delete_product_by_id(product_id: str) -> dict:
-    return product_interface.delete(product_id)
+async def bulk_update_products_async(
+    records: AsyncIterable[Optional[dict]], *, chunk_size: int = BULK_CHUNK_SIZE
+) -> ProductBulkResponse:
+    results: List[ProductBulkResult] = []
+    async for chunk in enumerate_chunks(records, chunk_size):
+        rows = []
+        for index, data in _validate_rows(chunk, ProductBulkUpdateData, results):
+            try:
+                product_id = UUID(data.id)
+            except ValueError:
+                results.append(
+                    ProductBulkResult(
+                        index=index, success=False, id=data.id, error="Invalid UUID format"
+                    )
+                )
+                continue
+            rows.append((index, {**data.dict(exclude_unset=True), "id": product_id}))
+        if not rows:
+            continue
+        try:
+            missing = await _update_product_rows_async([row for _, row in rows])
+        except HTTPException as e:
+            results.extend(
+                ProductBulkResult(index=index, success=False, id=str(row["id"]), error=e.detail)
+                for index, row in rows
+            )
+            continue
+        results.extend(
+            ProductBulkResult(
+                index=index,
+                success=row["id"] not in missing,
+                id=str(row["id"]),
+                error="Product not found" if row["id"] in missing else None,
+            )
+            for index, row in rows
+        )
+    return _bulk_response(results)
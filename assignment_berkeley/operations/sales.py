@@ -0,0 +1,166 @@
+from typing import Iterable, Optional
+from uuid import UUID
+from pydantic import BaseModel
+from sqlalchemy import case, delete, func, literal, null, select
+from sqlalchemy.orm import Session
+from assignment_berkeley.db.models import (
+    DBCustomerSales,
+    DBOrder,
+    DBProductSales,
+    OrderEvent,
+    OrderStatus,
+    order_product,
+)
+from assignment_berkeley.operations.analytics import (
+    rebuild_analytics_buckets,
+    record_order_events,
+)
+from assignment_berkeley.helpers.db_helpers import (
+    accumulate_from_select,
+    with_session,
+)
+
+
+class CustomerSales(BaseModel):
+    customer_id: int
+    order_count: int = 0
+    completed_order_count: int = 0
+    lifetime_spend: float = 0
+    last_order_at: Optional[str] = None
+
+
+class ProductSales(BaseModel):
+    product_id: str
+    units_ordered: int = 0
+    units_sold: int = 0
+
+
+def _later(current, incoming):
+    # 完成订单时 incoming 为 NULL，保留原值
+    return case(
+        (current.is_(None), incoming),
+        (incoming > current, incoming),
+        else_=current,
+    )
+
+
+def _accumulate(session: Session, conditions: list, placed: bool, completed: bool) -> None:
+    """
+    把满足条件的订单汇总后累加到 customer_sales / product_sales：
+    placed 统计下单（订单数、下单数量、最近下单时间），completed 统计其中已完成的订单
+    """
+    is_completed = DBOrder.status == OrderStatus.completed
+    zero = literal(0)
+
+    customer_totals = (
+        select(
+            DBOrder.customer_id.label("customer_id"),
+            (func.count() if placed else zero).label("order_count"),
+            (
+                func.coalesce(func.sum(case((is_completed, 1), else_=0)), 0)
+                if completed
+                else zero
+            ).label("completed_order_count"),
+            (
+                func.coalesce(func.sum(case((is_completed, DBOrder.total_price), else_=0)), 0)
+                if completed
+                else zero
+            ).label("lifetime_spend"),
+            (func.max(DBOrder.created_at) if placed else null()).label("last_order_at"),
+        )
+        .where(*conditions)
+        .group_by(DBOrder.customer_id)
+    )
+    accumulate_from_select(
+        session,
+        DBCustomerSales.__table__,
+        ["customer_id"],
+        customer_totals,
+        merge={"last_order_at": _later},
+    )
+
+    product_totals = (
+        select(
+            order_product.c.product_id.label("product_id"),
+            (func.sum(order_product.c.quantity) if placed else zero).label("units_ordered"),
+            (
+                func.coalesce(
+                    func.sum(case((is_completed, order_product.c.quantity), else_=0)), 0
+                )
+                if completed
+                else zero
+            ).label("units_sold"),
+        )
+        .join(DBOrder, DBOrder.id == order_product.c.order_id)
+        .where(*conditions)
+        .group_by(order_product.c.product_id)
+    )
+    accumulate_from_select(
+        session, DBProductSales.__table__, ["product_id"], product_totals
+    )
+
+
+def record_orders_placed(order_ids: Iterable[UUID], session: Session) -> None:
+    """新订单写入后调用（同一事务），订单和明细必须已经 flush"""
+    order_ids = list(order_ids)
+    if order_ids:
+        _accumulate(session, [DBOrder.id.in_(order_ids)], placed=True, completed=False)
+        record_order_events(order_ids, OrderEvent.placed, session)
+
+
+def record_orders_completed(order_ids: Iterable[UUID], session: Session) -> None:
+    """订单状态切换为 completed 后调用（同一事务）"""
+    order_ids = list(order_ids)
+    if order_ids:
+        _accumulate(session, [DBOrder.id.in_(order_ids)], placed=False, completed=True)
+        record_order_events(order_ids, OrderEvent.completed, session)
+
+
+def record_orders_canceled(order_ids: Iterable[UUID], session: Session) -> None:
+    """订单状态切换为 canceled 后调用（同一事务），只影响分析用的时间桶"""
+    record_order_events(order_ids, OrderEvent.canceled, session)
+
+
+def rebuild_sales_rollups(session: Session) -> None:
+    """清空汇总表和分析时间桶后从 orders / order_product 全量重新计算，用于首次上线回填或修复"""
+    session.execute(delete(DBCustomerSales))
+    session.execute(delete(DBProductSales))
+    _accumulate(session, [], placed=True, completed=True)
+    rebuild_analytics_buckets(session)
+
+
+@with_session
+def get_customer_sales(customer_id: int, *, session=None) -> CustomerSales:
+    row = session.get(DBCustomerSales, customer_id)
+    if row is None:
+        return CustomerSales(customer_id=customer_id)
+    return CustomerSales(
+        customer_id=customer_id,
+        order_count=row.order_count,
+        completed_order_count=row.completed_order_count,
+        lifetime_spend=row.lifetime_spend,
+        last_order_at=str(row.last_order_at) if row.last_order_at else None,
+    )
+
+
+@with_session
+def get_product_sales(product_id: str, *, session=None) -> ProductSales:
+    row = session.get(DBProductSales, UUID(product_id))
+    if row is None:
+        return ProductSales(product_id=product_id)
+    return ProductSales(
+        product_id=product_id,
+        units_ordered=row.units_ordered,
+        units_sold=row.units_sold,
+    )
+
+
+if __name__ == "__main__":
+    # poetry run python -m assignment_berkeley.operations.sales
+    from assignment_berkeley.db import engine as db_engine
+    from assignment_berkeley.main import DB_FILE
+
+    db_engine.init_db(DB_FILE)
+    with db_engine.DBSession() as session, session.begin():
+        rebuild_sales_rollups(session)
+    print("Sales rollups rebuilt")
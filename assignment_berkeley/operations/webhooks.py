@@ -1,14 +1,45 @@
 # assignment_berkeley/operations/webhook.py
 
-from datetime import datetime
-from typing import Optional
-from pydantic import UUID4, BaseModel
+from collections import defaultdict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from pydantic import UUID4, BaseModel, Field
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from uuid import UUID
-from assignment_berkeley.db.models import DBOrder, OrderStatus, PaymentStatus
-from assignment_berkeley.db.engine import DBSession
-from assignment_berkeley.helpers.db_helpers import validate_and_get_item, with_session
+from sqlalchemy import delete, func, select, update
+from assignment_berkeley.config import (
+    WEBHOOK_BATCH_MAX_SIZE,
+    WEBHOOK_MAX_ATTEMPTS,
+    WEBHOOK_QUEUE_MAX_DEPTH,
+)
+from assignment_berkeley.db.db_interface import DBInterface
+from assignment_berkeley.db.models import (
+    DBOrder,
+    DBWebhookEvent,
+    DBWebhookInbox,
+    OrderStatus,
+    PaymentStatus,
+    WebhookInboxStatus,
+)
+from assignment_berkeley.helpers.cache import webhook_response_cache
+from assignment_berkeley.helpers.metrics import metrics
+from assignment_berkeley.helpers.db_helpers import (
+    insert_many_or_ignore,
+    insert_or_ignore,
+    validate_and_get_item,
+    with_session,
+    with_async_session,
+    run_in_async_session,
+)
+from assignment_berkeley.operations.orders import OrderOperations
+from assignment_berkeley.operations.sales import (
+    record_orders_canceled,
+    record_orders_completed,
+)
+
+order_ops = OrderOperations()
 
 
 class PaymentWebhookPayload(BaseModel):
@@ -27,17 +58,72 @@ class PaymentWebhookResponse(BaseModel):
     updated_at: Optional[datetime] = None
 
 
-@with_session
-def payment_webhook(
-    payload: PaymentWebhookPayload, *, session=None
-) -> PaymentWebhookResponse:
-
+def _validate_payment_status(payload: PaymentWebhookPayload) -> None:
     # 验证支付状态值
     if not payload.is_valid_status:
         raise HTTPException(
             status_code=400, detail="Invalid payment status. Must be 'paid' or 'failed'"
         )
 
+
+def _idempotency_key(payload: PaymentWebhookPayload, idempotency_key: Optional[str]) -> str:
+    """优先使用请求头中的幂等键，否则同一订单、同一支付结果视为同一次投递"""
+    return idempotency_key or f"{payload.order_id}:{payload.payment_status.lower()}"
+
+
+def _stored_response(key: str, session: Session) -> PaymentWebhookResponse:
+    stored = session.scalar(
+        select(DBWebhookEvent.response).where(DBWebhookEvent.idempotency_key == key)
+    )
+    if stored is None:
+        raise HTTPException(
+            status_code=409, detail="Webhook delivery is already being processed"
+        )
+    metrics.incr("payment_webhook.duplicates")
+    response = PaymentWebhookResponse.model_validate_json(stored)
+    webhook_response_cache.set_after_commit(key, response.model_dump(), session)
+    return response
+
+
+@with_session
+def payment_webhook(
+    payload: PaymentWebhookPayload,
+    idempotency_key: Optional[str] = None,
+    *,
+    session=None,
+) -> PaymentWebhookResponse:
+    """
+    幂等处理支付回调：重复投递直接返回首次处理的响应，不再读写订单。
+    先查内存缓存，再用 INSERT ... ON CONFLICT DO NOTHING 占用 webhook_event 中的幂等键，
+    并发的重复投递在这一行上冲突，而不是竞争同一个订单行。
+    处理失败时事务回滚，幂等键随之释放，重试会重新处理。
+    """
+    _validate_payment_status(payload)
+
+    key = _idempotency_key(payload, idempotency_key)
+    cached = webhook_response_cache.get(key)
+    if cached is not None:
+        metrics.incr("payment_webhook.duplicates")
+        return PaymentWebhookResponse(**cached)
+
+    if not insert_or_ignore(
+        session,
+        DBWebhookEvent.__table__,
+        {"idempotency_key": key, "order_id": payload.order_id},
+    ):
+        return _stored_response(key, session)
+
+    response = _apply_payment(payload, session)
+    session.execute(
+        update(DBWebhookEvent)
+        .where(DBWebhookEvent.idempotency_key == key)
+        .values(response=response.model_dump_json())
+    )
+    webhook_response_cache.set_after_commit(key, response.model_dump(), session)
+    return response
+
+
+def _apply_payment(payload: PaymentWebhookPayload, session: Session) -> PaymentWebhookResponse:
     # 查找订单
     order = validate_and_get_item(session, payload.order_id, DBOrder)
     if not order:
@@ -58,16 +144,28 @@ def payment_webhook(
         if payload.payment_status.lower() == "paid"
         else PaymentStatus.failed
     )
+    new_order_status = (
+        OrderStatus.completed if new_status == PaymentStatus.paid else OrderStatus.canceled
+    )
+    # 结算库存预订：支付失败归还库存，预订已过期的订单不能完成
+    if order_ops.settle_reservations(
+        [order.id], new_order_status.value, session=session
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Reservation for order {payload.order_id} has expired",
+        )
+
     order.payment_status = new_status
     order.updated_at = datetime.utcnow()
 
-    # 如果支付成功,更新订单状态为已完成
-    if new_status == PaymentStatus.paid:
-        order.status = OrderStatus.completed
-    elif new_status == PaymentStatus.failed:
-        order.status = OrderStatus.cancelled
-
-    session.commit()
+    # 支付成功更新订单状态为已完成，支付失败则取消订单
+    order.status = new_order_status
+    session.flush()
+    if new_order_status == OrderStatus.completed:
+        record_orders_completed([order.id], session)
+    else:
+        record_orders_canceled([order.id], session)
 
     return PaymentWebhookResponse(
         success=True,
@@ -75,3 +173,394 @@ def payment_webhook(
         order_id=order.id,
         updated_at=order.updated_at,
     )
+
+
+@with_async_session
+async def payment_webhook_async(
+    payload: PaymentWebhookPayload,
+    idempotency_key: Optional[str] = None,
+    *,
+    session=None,
+) -> PaymentWebhookResponse:
+    """payment_webhook 的异步版本，不阻塞事件循环"""
+    return await run_in_async_session(session, payment_webhook, payload, idempotency_key)
+
+
+class PaymentWebhookBatchPayload(BaseModel):
+    payments: List[PaymentWebhookPayload] = Field(
+        ..., min_length=1, max_length=WEBHOOK_BATCH_MAX_SIZE
+    )
+
+
+class PaymentWebhookBatchResult(BaseModel):
+    index: int
+    order_id: UUID4
+    success: bool
+    payment_status: Optional[str] = None
+    updated_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class PaymentWebhookBatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[PaymentWebhookBatchResult]
+
+
+def _transition_orders(
+    order_ids: List[UUID], payment_status: PaymentStatus, now: datetime, session: Session
+) -> Tuple[set, set]:
+    """
+    把一组 pending 订单一次性切换到支付结果对应的状态（一条 UPDATE ... RETURNING），
+    返回 (切换成功的订单ID, 预订已过期不能完成的订单ID)
+    """
+    order_status = (
+        OrderStatus.completed if payment_status == PaymentStatus.paid else OrderStatus.canceled
+    )
+    expired = order_ops.settle_reservations(order_ids, order_status.value, session=session)
+    updated = session.scalars(
+        update(DBOrder)
+        .where(
+            DBOrder.id.in_([order_id for order_id in order_ids if order_id not in expired]),
+            DBOrder.status == OrderStatus.pending,
+        )
+        .values(status=order_status, payment_status=payment_status, updated_at=now)
+        .returning(DBOrder.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if order_status == OrderStatus.completed:
+        record_orders_completed(updated, session)
+    else:
+        record_orders_canceled(updated, session)
+    return set(updated), expired
+
+
+@with_session
+def payment_webhook_batch(
+    payload: PaymentWebhookBatchPayload, *, session=None
+) -> PaymentWebhookBatchResponse:
+    """
+    批量处理支付回调：一次查询加载所有订单，按支付结果分组，每组一条 UPDATE 完成状态切换，
+    逐条返回结果，单个订单失败不影响同批其他订单。
+    与单条回调共用 webhook_event 中的幂等键（订单ID:支付结果），重复投递返回首次处理的结果。
+    """
+    payments = payload.payments
+    results: Dict[int, PaymentWebhookBatchResult] = {}
+
+    def fail(index: int, error: str) -> None:
+        results[index] = PaymentWebhookBatchResult(
+            index=index, order_id=payments[index].order_id, success=False, error=error
+        )
+
+    def succeed(index: int, updated_at: Optional[datetime]) -> None:
+        results[index] = PaymentWebhookBatchResult(
+            index=index,
+            order_id=payments[index].order_id,
+            success=True,
+            payment_status=payments[index].payment_status.lower(),
+            updated_at=updated_at,
+        )
+
+    # 订单ID -> 在请求中的序号
+    pending: Dict[UUID, int] = {}
+    for index, item in enumerate(payments):
+        if not item.is_valid_status:
+            fail(index, "Invalid payment status. Must be 'paid' or 'failed'")
+        elif item.order_id in pending:
+            fail(index, "Duplicate order_id in batch")
+        else:
+            pending[item.order_id] = index
+
+    # 已处理过的投递直接返回首次处理的结果
+    keys = {_idempotency_key(payments[index], None): index for index in pending.values()}
+    for key, stored in session.execute(
+        select(DBWebhookEvent.idempotency_key, DBWebhookEvent.response).where(
+            DBWebhookEvent.idempotency_key.in_(list(keys))
+        )
+    ):
+        index = keys[key]
+        del pending[payments[index].order_id]
+        if stored is None:
+            fail(index, "Webhook delivery is already being processed")
+            continue
+        metrics.incr("payment_webhook.duplicates")
+        succeed(index, PaymentWebhookResponse.model_validate_json(stored).updated_at)
+
+    order_statuses = dict(
+        session.execute(
+            select(DBOrder.id, DBOrder.status).where(DBOrder.id.in_(list(pending)))
+        ).all()
+    )
+    by_payment_status: Dict[PaymentStatus, List[UUID]] = defaultdict(list)
+    for order_id, index in pending.items():
+        status = order_statuses.get(order_id)
+        if status is None:
+            fail(index, "Order not found")
+        elif status != OrderStatus.pending:
+            fail(index, "Order status must be 'pending'")
+        else:
+            by_payment_status[PaymentStatus(payments[index].payment_status.lower())].append(
+                order_id
+            )
+
+    now = datetime.utcnow()
+    events = []
+    for payment_status, order_ids in by_payment_status.items():
+        updated, expired = _transition_orders(order_ids, payment_status, now, session)
+        for order_id in order_ids:
+            index = pending[order_id]
+            if order_id in expired:
+                fail(index, "Reservation has expired")
+            elif order_id not in updated:
+                fail(index, "Order status must be 'pending'")
+            else:
+                succeed(index, now)
+                response = PaymentWebhookResponse(
+                    success=True,
+                    message=f"Successfully updated payment status to {payment_status}",
+                    order_id=order_id,
+                    updated_at=now,
+                )
+                events.append(
+                    {
+                        "idempotency_key": _idempotency_key(payments[index], None),
+                        "order_id": order_id,
+                        "response": response.model_dump_json(),
+                    }
+                )
+    insert_many_or_ignore(session, DBWebhookEvent.__table__, events)
+
+    ordered = [results[index] for index in range(len(payments))]
+    succeeded = sum(result.success for result in ordered)
+    return PaymentWebhookBatchResponse(
+        succeeded=succeeded, failed=len(ordered) - succeeded, results=ordered
+    )
+
+
+@with_async_session
+async def payment_webhook_batch_async(
+    payload: PaymentWebhookBatchPayload, *, session=None
+) -> PaymentWebhookBatchResponse:
+    return await run_in_async_session(session, payment_webhook_batch, payload)
+
+
+# 排队模式：请求只负责持久化，后台任务批量更新订单
+inbox_interface = DBInterface(DBWebhookInbox)
+
+
+def _queue_depth(session: Session) -> int:
+    return session.scalar(
+        select(func.count())
+        .select_from(DBWebhookInbox)
+        .where(DBWebhookInbox.status == WebhookInboxStatus.pending)
+    )
+
+
+class InboxDepth:
+    """
+    待处理回调数的进程内估计，入队时不再执行 COUNT(*)：
+    工作任务每轮结束时用一次 COUNT 校准，入队后在内存中加一。同时写入 webhook_inbox.depth 指标
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._value: Optional[int] = None
+
+    def get(self, session: Session) -> int:
+        with self._lock:
+            value = self._value
+        if value is None:
+            # 工作任务还没有运行过，查询一次作为初始值
+            value = self.refresh(session=session)
+        return value
+
+    @with_session
+    def refresh(self, *, session=None) -> int:
+        value = _queue_depth(session)
+        self._set(value)
+        return value
+
+    def add(self, count: int = 1) -> None:
+        with self._lock:
+            if self._value is None:
+                return
+            self._value += count
+            metrics.gauge("webhook_inbox.depth", self._value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._value = None
+
+    def _set(self, value: int) -> None:
+        with self._lock:
+            self._value = value
+        metrics.gauge("webhook_inbox.depth", value)
+
+
+inbox_depth = InboxDepth()
+
+
+@with_session
+def enqueue_payment_webhook(
+    payload: PaymentWebhookPayload,
+    idempotency_key: Optional[str] = None,
+    *,
+    session=None,
+) -> PaymentWebhookResponse:
+    """
+    校验后写入 webhook_inbox 并立即返回，订单由 process_webhook_inbox 批量更新。
+    待处理的记录达到 WEBHOOK_QUEUE_MAX_DEPTH 时返回503，让支付服务稍后重试。
+    """
+    _validate_payment_status(payload)
+    if inbox_depth.get(session) >= WEBHOOK_QUEUE_MAX_DEPTH:
+        metrics.incr("webhook_inbox.rejected")
+        raise HTTPException(
+            status_code=503,
+            detail="Webhook queue is full, retry later",
+            headers={"Retry-After": "5"},
+        )
+
+    session.add(
+        DBWebhookInbox(
+            idempotency_key=idempotency_key,
+            order_id=payload.order_id,
+            payment_status=payload.payment_status.lower(),
+        )
+    )
+    session.flush()
+    inbox_depth.add()
+    metrics.incr("webhook_inbox.enqueued")
+    return PaymentWebhookResponse(
+        success=True,
+        message="Payment status update queued",
+        order_id=payload.order_id,
+    )
+
+
+def _claim_inbox_batch(batch_size: int, session: Session) -> list:
+    """把一批 pending 记录原子地切换为 processing（UPDATE ... RETURNING），多个工作进程不会重复认领"""
+    pending_ids = (
+        select(DBWebhookInbox.id)
+        .where(DBWebhookInbox.status == WebhookInboxStatus.pending)
+        .order_by(DBWebhookInbox.id)
+        .limit(batch_size)
+    )
+    rows = session.execute(
+        update(DBWebhookInbox)
+        .where(
+            DBWebhookInbox.id.in_(pending_ids),
+            DBWebhookInbox.status == WebhookInboxStatus.pending,
+        )
+        .values(
+            status=WebhookInboxStatus.processing,
+            attempts=DBWebhookInbox.attempts + 1,
+        )
+        .returning(
+            DBWebhookInbox.id,
+            DBWebhookInbox.idempotency_key,
+            DBWebhookInbox.order_id,
+            DBWebhookInbox.payment_status,
+            DBWebhookInbox.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    ).all()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def _apply_inbox_row(row, session: Session) -> tuple:
+    """在 SAVEPOINT 中应用一条回调，返回 (状态, 错误信息)"""
+    payload = PaymentWebhookPayload(
+        order_id=row.order_id, payment_status=row.payment_status
+    )
+    try:
+        with session.begin_nested():
+            payment_webhook(payload, row.idempotency_key, session=session)
+        return WebhookInboxStatus.done, None
+    except HTTPException as e:
+        # 409 表示同一幂等键正在别处处理，属于暂时性错误
+        if e.status_code != 409:
+            return WebhookInboxStatus.failed, str(e.detail)
+        error = str(e.detail)
+    except Exception as e:
+        error = str(e)
+    if row.attempts >= WEBHOOK_MAX_ATTEMPTS:
+        return WebhookInboxStatus.failed, error
+    return WebhookInboxStatus.pending, error
+
+
+def process_webhook_inbox(batch_size: int = 200, *, session=None) -> int:
+    """
+    批量处理排队的回调：每批认领一次，逐条在 SAVEPOINT 中应用（单条失败不影响同批其他记录），
+    处理结果用一次 bulk_update 写回。未传入session时每批单独提交；传入时由调用方提交。
+    处理完后校准队列长度，返回处理的记录数。
+    """
+    processed = 0
+    while True:
+        claimed = _process_inbox_batch(batch_size, session=session)
+        processed += claimed
+        if claimed < batch_size:
+            inbox_depth.refresh(session=session)
+            return processed
+
+
+@with_session
+def _process_inbox_batch(batch_size: int, *, session=None) -> int:
+    claimed = _claim_inbox_batch(batch_size, session)
+    now = datetime.utcnow()
+    outcomes = []
+    for row in claimed:
+        status, error = _apply_inbox_row(row, session)
+        outcomes.append(
+            {"id": row.id, "status": status, "error": error, "processed_at": now}
+        )
+        metrics.incr(f"webhook_inbox.{status.value}")
+    inbox_interface.bulk_update(outcomes, session=session)
+    return len(claimed)
+
+
+def prune_webhook_inbox(
+    retention_seconds: float, batch_size: int = 1000, *, session=None
+) -> int:
+    """
+    删除处理完成（done）超过保留期的记录，每批一条 DELETE（按 id 顺序，走 ix_webhook_inbox_status_id），
+    failed 记录保留以便排查。返回删除的行数。
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=retention_seconds)
+    deleted = 0
+    while True:
+        count = _prune_inbox_batch(cutoff, batch_size, session=session)
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+@with_session
+def _prune_inbox_batch(cutoff: datetime, batch_size: int, *, session=None) -> int:
+    expired_ids = (
+        select(DBWebhookInbox.id)
+        .where(
+            DBWebhookInbox.status == WebhookInboxStatus.done,
+            DBWebhookInbox.processed_at < cutoff,
+        )
+        .order_by(DBWebhookInbox.id)
+        .limit(batch_size)
+    )
+    count = session.execute(
+        delete(DBWebhookInbox)
+        .where(DBWebhookInbox.id.in_(expired_ids))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    metrics.incr("webhook_inbox.pruned", count)
+    return count
+
+
+@with_async_session
+async def enqueue_payment_webhook_async(
+    payload: PaymentWebhookPayload,
+    idempotency_key: Optional[str] = None,
+    *,
+    session=None,
+) -> PaymentWebhookResponse:
+    return await run_in_async_session(
+        session, enqueue_payment_webhook, payload, idempotency_key
+    )
@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from assignment_berkeley.helpers.db_helpers import get_db_session
+from assignment_berkeley.operations.analytics import (
+    Granularity,
+    OrderEventCounts,
+    RevenuePoint,
+    TopProduct,
+    default_range,
+    get_order_event_counts,
+    get_revenue,
+    get_top_products,
+)
+
+
+router = APIRouter()
+
+_RANGE_DOC = "The range is [start, end) in UTC and defaults to the last 7 days. "
+
+
+@router.get(
+    "/api/analytics/revenue",
+    response_model=List[RevenuePoint],
+    summary="Revenue by hour or day",
+    description=_RANGE_DOC
+    + "Revenue is the total price of orders completed in each bucket. Answers come from hourly pre-aggregated buckets, not from the orders table.",
+)
+def api_get_revenue(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Granularity = Query(Granularity.hour),
+    session: Session = Depends(get_db_session),
+):
+    start, end = default_range(start, end)
+    return get_revenue(start, end, granularity, session=session)
+
+
+@router.get(
+    "/api/analytics/orders",
+    response_model=OrderEventCounts,
+    summary="Order counts by status transition",
+    description=_RANGE_DOC
+    + "Counts orders placed, completed and canceled within the range.",
+)
+def api_get_order_event_counts(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    session: Session = Depends(get_db_session),
+):
+    start, end = default_range(start, end)
+    return get_order_event_counts(start, end, session=session)
+
+
+@router.get(
+    "/api/analytics/top-products",
+    response_model=List[TopProduct],
+    summary="Best selling products",
+    description=_RANGE_DOC + "Products ranked by units sold in completed orders.",
+)
+def api_get_top_products(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=100),
+    session: Session = Depends(get_db_session),
+):
+    start, end = default_range(start, end)
+    return get_top_products(start, end, limit, session=session)
@@ -1,23 +1,76 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi_pagination import Page, Params
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from assignment_berkeley.helpers.db_helpers import get_db_session
+from assignment_berkeley.helpers.responses import (
+    list_response,
+    page_content,
+    parse_fields,
+)
 from assignment_berkeley.operations.customers import (
     CustomerCreateData,
     CustomerResponse,
+    count_customers,
     create_customer,
+    customer_filters,
     read_all_customers,
     get_customer_by_id,
 )
+from assignment_berkeley.operations.orders import (
+    CustomerOrderSummary,
+    OrderOperations,
+    OrderResponse,
+)
 
 router = APIRouter()
 
+order_ops = OrderOperations()
+
+
+class CustomerOrderHistory(BaseModel):
+    customer_id: int
+    summary: CustomerOrderSummary
+    orders: Page[OrderResponse]
+
 
-@router.get("/customers")
-def api_read_all_customers():
-    return read_all_customers()
+@router.get(
+    "/customers",
+    response_model=Page[CustomerResponse],
+    summary="Retrieve customers",
+    description="This endpoint returns customers ordered by id, one page at a time. Filter by exact email or search by first/last name prefix (case sensitive); all lookups use indexes.",
+)
+def api_read_all_customers(
+    email: Optional[str] = Query(None, description="Exact email address"),
+    first_name: Optional[str] = Query(None, description="First name prefix"),
+    last_name: Optional[str] = Query(None, description="Last name prefix"),
+    fields: Optional[str] = Query(
+        None, description="Comma separated columns to return, e.g. id,email"
+    ),
+    params: Params = Depends(),
+    session: Session = Depends(get_db_session),
+):
+    filter_params = customer_filters(email, first_name, last_name)
+    field_names = parse_fields(fields)
+    raw_params = params.to_raw_params()
+    customers = read_all_customers(
+        filter_params,
+        limit=raw_params.limit,
+        offset=raw_params.offset,
+        fields=field_names,
+        session=session,
+    )
+    total = count_customers(filter_params, session=session)
+    return list_response(
+        page_content(customers, total, params),
+        projected=field_names is not None,
+    )
 
 
-@router.get("/customer/{customer_id}")
-def api_get_customer_by_id(customer_id: int):
-    return get_customer_by_id(customer_id)
+@router.get("/customer/{customer_id}", response_model=CustomerResponse)
+def api_get_customer_by_id(customer_id: int, session: Session = Depends(get_db_session)):
+    return get_customer_by_id(customer_id, session=session)
 
 
 @router.post(
@@ -26,5 +79,35 @@ def api_get_customer_by_id(customer_id: int):
     summary="Create a new customer",
     description="Create a new customer with the provided information.",
 )
-def api_create_customer(customer: CustomerCreateData):
-    return create_customer(customer)
+def api_create_customer(
+    customer: CustomerCreateData, session: Session = Depends(get_db_session)
+):
+    return create_customer(customer, session=session)
+
+
+@router.get(
+    "/customers/{customer_id}/orders",
+    response_model=CustomerOrderHistory,
+    summary="Retrieve a customer's order history",
+    description="This endpoint returns one customer's orders, newest first, with their line items, plus the order count, lifetime spend (completed orders) and last order time. Aggregates are computed in SQL and each page of orders is loaded with one joined query.",
+)
+def api_get_customer_orders(
+    customer_id: int,
+    params: Params = Depends(),
+    session: Session = Depends(get_db_session),
+):
+    summary = order_ops.get_customer_order_summary(customer_id, session=session)
+    raw_params = params.to_raw_params()
+    orders = order_ops.get_customer_orders(
+        customer_id,
+        limit=raw_params.limit,
+        offset=raw_params.offset,
+        session=session,
+    )
+    return list_response(
+        {
+            "customer_id": customer_id,
+            "summary": summary,
+            "orders": page_content(orders, summary.order_count, params),
+        }
+    )
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from assignment_berkeley.helpers.metrics import metrics
+
+
+router = APIRouter()
+
+
+@router.get(
+    "/api/metrics",
+    summary="Retrieve in-process metrics",
+    description="This endpoint returns the counters and timings collected by this worker process, e.g. reservation sweep duration.",
+)
+def api_get_metrics():
+    return metrics.snapshot()
@@ -1,17 +1,44 @@
-from typing import Optional
-from fastapi import APIRouter, BackgroundTasks
-from fastapi_pagination import Page, paginate
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi_pagination import Page, Params
+from sqlalchemy.ext.asyncio import AsyncSession
+from assignment_berkeley.config import (
+    EXPORT_BATCH_SIZE,
+    RESERVATION_SWEEP_BATCH_SIZE,
+    RESERVATION_SWEEP_INTERVAL_SECONDS,
+)
+from assignment_berkeley.helpers.db_helpers import get_async_db_session
+from assignment_berkeley.helpers.export import ExportFormat, export_response
+from assignment_berkeley.helpers.pagination import CursorPage
+from assignment_berkeley.helpers.responses import (
+    list_response,
+    page_content,
+    parse_fields,
+)
+from assignment_berkeley.helpers.periodic import PeriodicTask
 from assignment_berkeley.operations.orders import (
     OrderOperations,
+    AsyncOrderOperations,
     OrderResponse,
     OrderStatusUpdateData,
     OrderCreateData,
+    OrderBatchResponse,
+    ORDER_EXPORT_COLUMNS,
+    flatten_order_lines,
 )
 
 
 router = APIRouter()
 
 order_ops = OrderOperations()
+async_order_ops = AsyncOrderOperations(order_ops)
+
+# 每个进程一个清理任务，定期批量释放过期的库存预订
+reservation_sweeper = PeriodicTask(
+    "reservation_sweep",
+    lambda: order_ops.release_expired_reservations(RESERVATION_SWEEP_BATCH_SIZE),
+    RESERVATION_SWEEP_INTERVAL_SECONDS,
+)
 
 
 @router.post(
@@ -20,8 +47,65 @@ order_ops = OrderOperations()
     summary="Create a new order",
     description="This endpoint allows you to create a new order. Provide customer ID and list of products with their quantities.",
 )
-def api_create_order(order_data: OrderCreateData) -> OrderResponse:
-    return order_ops.create_order(order_data)
+async def api_create_order(
+    order_data: OrderCreateData,
+    session: AsyncSession = Depends(get_async_db_session),
+) -> OrderResponse:
+    return await async_order_ops.create_order(order_data, session=session)
+
+
+@router.post(
+    "/api/orders/batch",
+    response_model=OrderBatchResponse,
+    summary="Create orders in batch",
+    description="This endpoint creates many orders in one transaction. Customers and products are loaded once for the whole batch, stock is validated across all orders, and the result reports success or failure per order.",
+)
+async def api_create_orders_batch(
+    orders: List[OrderCreateData],
+    session: AsyncSession = Depends(get_async_db_session),
+) -> OrderBatchResponse:
+    return await async_order_ops.create_orders_batch(orders, session=session)
+
+
+@router.get(
+    "/api/orders/cursor",
+    response_model=CursorPage[OrderResponse],
+    summary="Get orders with cursor pagination",
+    description="This endpoint walks orders ordered by (created_at, id). Pass the returned next_cursor to fetch the following page; deep pages cost the same as the first one.",
+)
+async def api_get_orders_by_cursor(
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    size: int = Query(50, ge=1, le=500),
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    orders, next_cursor = await async_order_ops.get_orders_after(
+        cursor=cursor,
+        limit=size,
+        status=status,
+        payment_status=payment_status,
+        session=session,
+    )
+    return list_response(CursorPage(items=orders, size=size, next_cursor=next_cursor))
+
+
+@router.get(
+    "/api/orders/export",
+    summary="Export orders as NDJSON or CSV",
+    description="This endpoint streams every matching order with its line items, ordered by (created_at, id). NDJSON returns one order per line; CSV returns one row per line item. Rows are read from a server-side cursor in batches, so memory use does not grow with the export size.",
+)
+async def api_export_orders(
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    format: ExportFormat = Query(ExportFormat.ndjson),
+):
+    orders = order_ops.stream_orders(
+        status, payment_status, batch_size=EXPORT_BATCH_SIZE
+    )
+    if format is ExportFormat.csv:
+        orders = flatten_order_lines(orders)
+    return export_response(orders, format, "orders", ORDER_EXPORT_COLUMNS)
 
 
 @router.get(
@@ -30,8 +114,11 @@ def api_create_order(order_data: OrderCreateData) -> OrderResponse:
     summary="Get an order by ID",
     description="This endpoint allows you to retrieve an order using its ID. It returns the order details along with the associated products.",
 )
-def api_get_order_by_id(order_id: str) -> OrderResponse:
-    return order_ops.get_order_by_id(order_id)
+async def api_get_order_by_id(
+    order_id: str,
+    session: AsyncSession = Depends(get_async_db_session),
+) -> OrderResponse:
+    return await async_order_ops.get_order_by_id(order_id, session=session)
 
 
 @router.get(
@@ -40,12 +127,32 @@ def api_get_order_by_id(order_id: str) -> OrderResponse:
     summary="Get all orders",
     description="This endpoint retrieves all orders, optionally filtering by order status and payment status.",
 )
-def api_get_all_orders(
+async def api_get_all_orders(
     status: Optional[str] = None,
     payment_status: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated columns to return, e.g. id,status,total_price; include products for line items",
+    ),
+    params: Params = Depends(),
+    session: AsyncSession = Depends(get_async_db_session),
 ):
-    return paginate(
-        order_ops.get_all_orders(status=status, payment_status=payment_status)
+    field_names = parse_fields(fields)
+    raw_params = params.to_raw_params()
+    orders = await async_order_ops.get_all_orders(
+        status=status,
+        payment_status=payment_status,
+        limit=raw_params.limit,
+        offset=raw_params.offset,
+        fields=field_names,
+        session=session,
+    )
+    total = await async_order_ops.count_orders(
+        status=status, payment_status=payment_status, session=session
+    )
+    return list_response(
+        page_content(orders, total, params),
+        projected=field_names is not None,
     )
 
 
@@ -55,30 +162,35 @@ def api_get_all_orders(
     summary="Update the status of an order",
     description="This endpoint allows you to update the status of an order with specific allowed transitions.",
 )
-def api_update_order_status(order_id: str, data: OrderStatusUpdateData):
-    return order_ops.update_order_status(order_id, data)
-
-
-# @router.post(
-#     "/api/orders/{order_id}/reserve",
-#     response_model=OrderResponse,
-#     summary="Reserve an order for 15 minutes",
-#     description="Reserves the order and its products for 15 minutes. If not completed within this time, the reservation will expire.",
-# )
-# def api_reserve_order(
-#     order_id: str, background_tasks: BackgroundTasks
-# ) -> OrderResponse:
-#     response = order_ops.reserve_order(order_id)
-#     # 添加后台任务处理过期预订
-#     background_tasks.add_task(order_ops.handle_reservation_expiration)
-#     return response
-
-
-# @router.post(
-#     "/api/orders/{order_id}/complete",
-#     response_model=OrderResponse,
-#     summary="Complete a reserved order",
-#     description="Completes a reserved order if the reservation hasn't expired.",
-# )
-# def api_complete_reserved_order(order_id: str) -> OrderResponse:
-#     return order_ops.complete_reserved_order(order_id)
+async def api_update_order_status(
+    order_id: str,
+    data: OrderStatusUpdateData,
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    return await async_order_ops.update_order_status(order_id, data, session=session)
+
+
+@router.post(
+    "/api/orders/{order_id}/reserve",
+    response_model=OrderResponse,
+    summary="Reserve an order for 15 minutes",
+    description="Reserves the order and its products for 15 minutes. If not completed within this time, the reservation will expire and the stock is released.",
+)
+async def api_reserve_order(
+    order_id: str,
+    session: AsyncSession = Depends(get_async_db_session),
+) -> OrderResponse:
+    return await async_order_ops.reserve_order(order_id, session=session)
+
+
+@router.post(
+    "/api/orders/{order_id}/complete",
+    response_model=OrderResponse,
+    summary="Complete a reserved order",
+    description="Completes a reserved order if the reservation hasn't expired.",
+)
+async def api_complete_reserved_order(
+    order_id: str,
+    session: AsyncSession = Depends(get_async_db_session),
+) -> OrderResponse:
+    return await async_order_ops.complete_reserved_order(order_id, session=session)
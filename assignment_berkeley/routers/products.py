@@ -1,16 +1,36 @@
-from fastapi import APIRouter, Query
-from fastapi_pagination import Page, paginate
-from typing import List
-from assignment_berkeley.config import logger
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_pagination import Page, Params
+from typing import List, Optional
+from assignment_berkeley.config import EXPORT_BATCH_SIZE, logger
+from assignment_berkeley.helpers.bulk import iter_request_records
+from assignment_berkeley.helpers.db_helpers import get_async_db_session
+from assignment_berkeley.helpers.export import ExportFormat, export_response
+from assignment_berkeley.helpers.pagination import CursorPage
+from assignment_berkeley.helpers.responses import (
+    list_response,
+    page_content,
+    parse_fields,
+)
 from assignment_berkeley.operations.products import (
     ProductCreateData,
     ProductUpdateData,
     ProductResponse,
-    create_product,
-    update_product,
-    get_all_products,
-    get_product_by_id,
-    delete_product_by_id,
+    ProductBulkResponse,
+    bulk_create_products_async,
+    bulk_update_products_async,
+    create_product_async,
+    update_product_async,
+    PRODUCT_EXPORT_COLUMNS,
+    product_filters,
+    stream_products,
+    get_all_products_async,
+    count_products_async,
+    get_products_after_async,
+    get_product_by_id_async,
+    delete_product_by_id_async,
+    search_products_async,
+    count_search_products_async,
 )
 
 
@@ -23,41 +43,149 @@ router = APIRouter()
     summary="Create a new product",
     description="This endpoint allows you to create a new product. You need to provide the product name, description, price, and quantity.",
 )
-def api_create_product(product: ProductCreateData):
+async def api_create_product(
+    product: ProductCreateData,
+    session: AsyncSession = Depends(get_async_db_session),
+):
     logger.info(f"Creating product with data: {product}")
-    created_product = create_product(product)
+    created_product = await create_product_async(product, session=session)
     logger.info(f"Product created successfully: {created_product}")
     return created_product
 
 
+_BULK_BODY_DOC = (
+    "The body is a JSON array, NDJSON (Content-Type: application/x-ndjson, one object per line) "
+    "or CSV (Content-Type: text/csv, header row first). NDJSON and CSV bodies are read as a stream. "
+)
+
+
+@router.post(
+    "/api/products/bulk",
+    response_model=ProductBulkResponse,
+    summary="Import products in bulk",
+    description=_BULK_BODY_DOC
+    + "Rows are validated like a single create, then written with one multi-row INSERT per chunk. "
+    "Each chunk is its own transaction. The response reports success or failure for every row.",
+)
+async def api_bulk_create_products(request: Request):
+    return await bulk_create_products_async(iter_request_records(request))
+
+
+@router.patch(
+    "/api/products/bulk",
+    response_model=ProductBulkResponse,
+    summary="Update products in bulk",
+    description=_BULK_BODY_DOC
+    + "Each row needs an id and only the fields present in the row are changed. "
+    "Rows are written with one UPDATE by primary key per chunk. "
+    "The response reports success or failure (for example an unknown id) for every row.",
+)
+async def api_bulk_update_products(request: Request):
+    return await bulk_update_products_async(iter_request_records(request))
+
+
 @router.put(
     "/api/products/{product_id}",
     response_model=ProductResponse,
     summary="Update an existing product by ID",
     description="This endpoint allows you to update an existing product by its ID.",
 )
-def api_update_product(product_id: str, product: ProductUpdateData):
-    return update_product(product_id, product)
+async def api_update_product(
+    product_id: str,
+    product: ProductUpdateData,
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    return await update_product_async(product_id, product, session=session)
 
 
 @router.get(
     "/api/products",
     response_model=Page[ProductResponse],
     summary="Retrieve all products",
-    description="This endpoint allows you to retrieve a list of all products.",
+    description="This endpoint allows you to retrieve a list of all products, optionally filtered by stock and price range. Filtering and pagination run in the database.",
+)
+async def api_get_all_products(
+    in_stock: bool = Query(True),
+    min_price: Optional[float] = Query(None, gt=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, gt=0, description="Maximum price"),
+    fields: Optional[str] = Query(
+        None, description="Comma separated columns to return, e.g. id,name,price"
+    ),
+    params: Params = Depends(),
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    filter_params = product_filters(in_stock, min_price, max_price)
+    field_names = parse_fields(fields)
+    raw_params = params.to_raw_params()
+    products = await get_all_products_async(
+        filter_params,
+        limit=raw_params.limit,
+        offset=raw_params.offset,
+        fields=field_names,
+        session=session,
+    )
+    total = await count_products_async(filter_params, session=session)
+    return list_response(
+        page_content(products, total, params),
+        projected=field_names is not None,
+    )
+
+
+@router.get(
+    "/api/products/cursor",
+    response_model=CursorPage[ProductResponse],
+    summary="Retrieve products with cursor pagination",
+    description="This endpoint walks products ordered by (created_at, id). Pass the returned next_cursor to fetch the following page.",
 )
-def api_get_all_products(
+async def api_get_products_by_cursor(
     in_stock: bool = Query(True),
-    # min_price: Optional[float] = Query(None, gt=0, description="Minimum price"),
-    # max_price: Optional[float] = Query(None, description="Maximum price"),
+    min_price: Optional[float] = Query(None, gt=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, gt=0, description="Maximum price"),
+    cursor: Optional[str] = None,
+    size: int = Query(50, ge=1, le=500),
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    filter_params = product_filters(in_stock, min_price, max_price)
+    products, next_cursor = await get_products_after_async(
+        filter_params, cursor, size, session=session
+    )
+    return list_response(CursorPage(items=products, size=size, next_cursor=next_cursor))
+
+
+@router.get(
+    "/api/products/search",
+    response_model=Page[ProductResponse],
+    summary="Search products by name and description",
+    description="This endpoint runs a full-text search over product names and descriptions (SQLite FTS5). Every word must match; the last word also matches as a prefix. Results are ranked by relevance (bm25) and paginated.",
+)
+async def api_search_products(
+    q: str = Query(..., min_length=1, max_length=200, description="Search text"),
+    params: Params = Depends(),
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    raw_params = params.to_raw_params()
+    products = await search_products_async(
+        q, limit=raw_params.limit, offset=raw_params.offset, session=session
+    )
+    total = await count_search_products_async(q, session=session)
+    return list_response(page_content(products, total, params))
+
+
+@router.get(
+    "/api/products/export",
+    summary="Export products as NDJSON or CSV",
+    description="This endpoint streams every matching product ordered by (created_at, id). Rows are read from a server-side cursor in batches, so memory use does not grow with the export size.",
+)
+async def api_export_products(
+    in_stock: Optional[bool] = None,
+    min_price: Optional[float] = Query(None, gt=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, gt=0, description="Maximum price"),
+    format: ExportFormat = Query(ExportFormat.ndjson),
 ):
-    filter_params = {
-        "quantity_gt": 0 if in_stock else float("-inf"),
-        "quantity_lte": float("inf") if in_stock else 0,
-        # "price_gt": min_price,
-        # "price_lte": max_price,
-    }
-    return paginate(get_all_products(filter_params))
+    products = stream_products(
+        product_filters(in_stock, min_price, max_price), batch_size=EXPORT_BATCH_SIZE
+    )
+    return export_response(products, format, "products", PRODUCT_EXPORT_COLUMNS)
 
 
 @router.get(
@@ -66,8 +194,11 @@ def api_get_all_products(
     summary="Retrieve product by ID",
     description="This endpoint allows you to retrieve a product by its UUID.",
 )
-def api_get_product_by_id(product_id: str):
-    return get_product_by_id(product_id)
+async def api_get_product_by_id(
+    product_id: str,
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    return await get_product_by_id_async(product_id, session=session)
 
 
 @router.delete(
@@ -75,5 +206,8 @@ def api_get_product_by_id(product_id: str):
     summary="Delete a product by ID",
     description="This endpoint allows you to delete a product by its ID.",
 )
-def api_delete_product_by_id(product_id: str):
-    return delete_product_by_id(product_id)
+async def api_delete_product_by_id(
+    product_id: str,
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    return await delete_product_by_id_async(product_id, session=session)
@@ -1,20 +1,83 @@
-from fastapi import APIRouter, HTTPException, Header
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from assignment_berkeley.config import (
+    WEBHOOK_INBOX_CLEANUP_BATCH_SIZE,
+    WEBHOOK_INBOX_CLEANUP_INTERVAL_SECONDS,
+    WEBHOOK_INBOX_RETENTION_SECONDS,
+    WEBHOOK_INGESTION_MODE,
+    WEBHOOK_WORKER_BATCH_SIZE,
+    WEBHOOK_WORKER_INTERVAL_SECONDS,
+)
+from assignment_berkeley.helpers.db_helpers import get_async_db_session
+from assignment_berkeley.helpers.periodic import PeriodicTask
 from assignment_berkeley.operations.webhooks import (
+    PaymentWebhookBatchPayload,
+    PaymentWebhookBatchResponse,
     PaymentWebhookPayload,
     PaymentWebhookResponse,
-    payment_webhook,
+    enqueue_payment_webhook_async,
+    payment_webhook_batch_async,
+    payment_webhook_async,
+    process_webhook_inbox,
+    prune_webhook_inbox,
 )
 
 
 router = APIRouter()
 
+# 排队模式下每个进程一个工作任务，定期批量处理 webhook_inbox
+webhook_worker = PeriodicTask(
+    "webhook_worker",
+    lambda: process_webhook_inbox(WEBHOOK_WORKER_BATCH_SIZE),
+    WEBHOOK_WORKER_INTERVAL_SECONDS,
+)
+
+# 定期删除保留期之外、已处理完成的 webhook_inbox 记录，避免表无限增长
+webhook_inbox_cleaner = PeriodicTask(
+    "webhook_inbox_cleanup",
+    lambda: prune_webhook_inbox(
+        WEBHOOK_INBOX_RETENTION_SECONDS, WEBHOOK_INBOX_CLEANUP_BATCH_SIZE
+    ),
+    WEBHOOK_INBOX_CLEANUP_INTERVAL_SECONDS,
+)
+
+
+def _check_token(authorization: str) -> None:
+    token = authorization.split(" ")[1]  # Get token from Bearer token
+    if token != "expected_token":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
 
 @router.post("/api/payment-webhook", response_model=PaymentWebhookResponse)
 async def api_payment_webhook(
     payload: PaymentWebhookPayload,
+    response: Response,
     authorization: str = Header(...),
+    idempotency_key: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_db_session),
 ):
-    token = authorization.split(" ")[1]  # Get token from Bearer token
-    if token != "expected_token":
-        raise HTTPException(status_code=403, detail="Unauthorized")
-    return payment_webhook(payload)
+    _check_token(authorization)
+    if WEBHOOK_INGESTION_MODE == "queued":
+        response.status_code = 202
+        return await enqueue_payment_webhook_async(
+            payload, idempotency_key, session=session
+        )
+    return await payment_webhook_async(payload, idempotency_key, session=session)
+
+
+@router.post(
+    "/api/payment-webhook/batch",
+    response_model=PaymentWebhookBatchResponse,
+    summary="Apply payment results for many orders",
+    description="Accepts a list of (order_id, payment_status) pairs. All orders are loaded in one query "
+    "and each group of paid or failed orders is transitioned with one UPDATE. "
+    "The response reports success or failure for every entry, in request order.",
+)
+async def api_payment_webhook_batch(
+    payload: PaymentWebhookBatchPayload,
+    authorization: str = Header(...),
+    session: AsyncSession = Depends(get_async_db_session),
+):
+    _check_token(authorization)
+    return await payment_webhook_batch_async(payload, session=session)
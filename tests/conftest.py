@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from assignment_berkeley.db.engine import (
+    DBSession,
+    AsyncDBSession,
+    create_db_engine,
+    create_async_db_engine,
+)
+from assignment_berkeley.db.models import Base
+from assignment_berkeley.helpers.cache import product_cache, webhook_response_cache
+from assignment_berkeley.operations.webhooks import inbox_depth
+
+
+@pytest.fixture
+def db_engine():
+    """把 DBSession 绑定到内存数据库，测试结束后恢复"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    # 跳过测试中临时声明、没有任何列的表（如 UnknownModel）
+    tables = [table for table in Base.metadata.sorted_tables if table.columns]
+    Base.metadata.create_all(engine, tables=tables)
+    previous_bind = DBSession.kw.get("bind")
+    DBSession.configure(bind=engine)
+    product_cache.clear()
+    webhook_response_cache.clear()
+    inbox_depth.reset()
+    yield engine
+    DBSession.configure(bind=previous_bind)
+    Base.metadata.drop_all(engine, tables=tables)
+    engine.dispose()
+
+
+@pytest.fixture
+def async_db_engine(tmp_path):
+    """同步和异步 session 指向同一个临时 SQLite 文件"""
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    engine = create_db_engine(url)
+    async_engine = create_async_db_engine(url)
+    tables = [table for table in Base.metadata.sorted_tables if table.columns]
+    Base.metadata.create_all(engine, tables=tables)
+    previous_bind = DBSession.kw.get("bind")
+    previous_async_bind = AsyncDBSession.kw.get("bind")
+    DBSession.configure(bind=engine)
+    AsyncDBSession.configure(bind=async_engine)
+    product_cache.clear()
+    webhook_response_cache.clear()
+    inbox_depth.reset()
+    yield async_engine
+    DBSession.configure(bind=previous_bind)
+    AsyncDBSession.configure(bind=previous_async_bind)
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+@pytest.fixture
+def app_db(async_db_engine, tmp_path, monkeypatch):
+    """应用启动时 init_db 打开的也是 async_db_engine 的临时数据库，而不是工作目录下的 berkeley.db"""
+    monkeypatch.setattr(
+        "assignment_berkeley.main.DB_FILE", f"sqlite:///{tmp_path / 'async.db'}"
+    )
+    return async_db_engine
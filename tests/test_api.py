@@ -1,12 +1,74 @@
+import asyncio
 import pytest
+from datetime import datetime, timedelta
 from uuid import UUID
 from unittest.mock import Mock, patch, MagicMock
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
 
-from assignment_berkeley.db.models import DBCustomer, DBOrder, DBProduct, Base
-from assignment_berkeley.helpers.db_helpers import with_session, validate_and_get_item
+from assignment_berkeley.db.models import (
+    DBCustomer,
+    DBOrder,
+    DBProduct,
+    DBWebhookInbox,
+    Base,
+    OrderStatus,
+    PaymentStatus,
+    order_product,
+    to_dict,
+)
+from assignment_berkeley.db.engine import (
+    DBSession,
+    create_db_engine,
+    dispose_db,
+    get_engine,
+    init_db,
+)
+from assignment_berkeley.helpers.db_helpers import (
+    with_session,
+    validate_and_get_item,
+    get_db_session,
+)
+from assignment_berkeley.helpers.cache import (
+    TTLLRUBackend,
+    product_cache,
+    webhook_response_cache,
+)
+from assignment_berkeley.helpers.metrics import metrics
+from assignment_berkeley.helpers.periodic import PeriodicTask
+from assignment_berkeley.operations.orders import (
+    OrderOperations,
+    OrderCreateData,
+    OrderProductData,
+    OrderStatusUpdateData,
+    AsyncOrderOperations,
+)
+from assignment_berkeley.operations.products import (
+    ProductCreateData,
+    create_product,
+    get_product_by_id,
+    update_product,
+    product_filters,
+    get_all_products,
+    count_products,
+    ProductUpdateData,
+    create_product_async,
+    update_product_async,
+    get_product_by_id_async,
+    get_all_products_async,
+    delete_product_by_id_async,
+)
+from assignment_berkeley.operations.webhooks import (
+    PaymentWebhookBatchPayload,
+    PaymentWebhookPayload,
+    enqueue_payment_webhook,
+    payment_webhook,
+    payment_webhook_batch,
+    payment_webhook_async,
+    process_webhook_inbox,
+)
 
 
 class TestWithSession:
@@ -141,6 +203,1579 @@ class TestValidateAndGetItem:
         assert "Unknown not found" in str(exc_info.value.detail)
 
 
+def seed_orders(count: int, customer_id: int = 1) -> list[str]:
+    """写入一个客户和若干订单，返回订单ID"""
+    session = DBSession()
+    session.merge(DBCustomer(id=customer_id, first_name="Jack"))
+    orders = [
+        DBOrder(
+            customer_id=customer_id,
+            total_price=10 + i,
+            status=OrderStatus.pending if i % 2 == 0 else OrderStatus.completed,
+            payment_status=PaymentStatus.unpaid,
+        )
+        for i in range(count)
+    ]
+    session.add_all(orders)
+    session.commit()
+    order_ids = [str(order.id) for order in orders]
+    session.close()
+    return order_ids
+
+
+class TestOrderPagination:
+    def test_limit_offset_pushed_to_sql(self, db_engine):
+        seed_orders(5)
+        order_ops = OrderOperations()
+
+        first_page = order_ops.get_all_orders(limit=2, offset=0)
+        second_page = order_ops.get_all_orders(limit=2, offset=2)
+        last_page = order_ops.get_all_orders(limit=2, offset=4)
+
+        assert len(first_page) == 2
+        assert len(second_page) == 2
+        assert len(last_page) == 1
+        page_ids = {o.id for o in first_page + second_page + last_page}
+        assert len(page_ids) == 5
+
+    def test_count_respects_filters(self, db_engine):
+        seed_orders(5)
+        order_ops = OrderOperations()
+
+        assert order_ops.count_orders() == 5
+        assert order_ops.count_orders(status="pending") == 3
+        assert order_ops.count_orders(status="completed") == 2
+
+
+class TestKeysetPagination:
+    def test_walks_all_orders_created_in_same_second(self, db_engine):
+        order_ids = seed_orders(5)
+        order_ops = OrderOperations()
+
+        seen, cursor = [], None
+        while True:
+            orders, cursor = order_ops.get_orders_after(cursor=cursor, limit=2)
+            seen.extend(order.id for order in orders)
+            if cursor is None:
+                break
+
+        assert sorted(seen) == sorted(order_ids)
+        assert len(seen) == len(set(seen))
+
+    def test_invalid_cursor(self, db_engine):
+        with pytest.raises(HTTPException) as exc_info:
+            OrderOperations().get_orders_after(cursor="not-a-cursor")
+        assert exc_info.value.status_code == 400
+
+
+def seed_product(quantity: int, price: float = 2.5) -> str:
+    session = DBSession()
+    product = DBProduct(name="p", price=price, quantity=quantity)
+    session.add(product)
+    session.commit()
+    product_id = str(product.id)
+    session.close()
+    return product_id
+
+
+def product_quantity(product_id: str) -> int:
+    session = DBSession()
+    quantity = session.get(DBProduct, UUID(product_id)).quantity
+    session.close()
+    return quantity
+
+
+class TestBatchOrderCreation:
+    def test_stock_is_validated_across_the_batch(self, db_engine):
+        seed_orders(0)
+        product_id = seed_product(quantity=5)
+        line = lambda quantity: [
+            OrderProductData(product_id=product_id, quantity=quantity)
+        ]
+        batch = [
+            OrderCreateData(customer_id=1, products=line(3)),
+            OrderCreateData(customer_id=1, products=line(3)),
+            OrderCreateData(customer_id=2, products=line(1)),
+            OrderCreateData(customer_id=1, products=line(2)),
+        ]
+
+        response = OrderOperations().create_orders_batch(batch)
+
+        assert (response.created, response.failed) == (2, 2)
+        assert [r.success for r in response.results] == [True, False, False, True]
+        assert response.results[1].error == "Insufficient stock"
+        assert response.results[2].error == "Customer not found"
+        assert response.results[0].order.total_price == 7.5
+        assert response.results[3].order.products[0].quantity == 2
+        assert OrderOperations().count_orders() == 2
+        assert product_quantity(product_id) == 0
+
+    def test_batch_of_orders_without_products(self, db_engine):
+        seed_orders(0)
+
+        response = OrderOperations().create_orders_batch(
+            [OrderCreateData(customer_id=1, products=[]) for _ in range(2)]
+        )
+
+        assert (response.created, response.failed) == (2, 0)
+        assert all(r.order.products == [] for r in response.results)
+        assert OrderOperations().count_orders() == 2
+
+
+class TestStockReservation:
+    def test_create_order_decrements_stock(self, db_engine):
+        seed_orders(0)
+        product_id = seed_product(quantity=5)
+        data = OrderCreateData(
+            customer_id=1,
+            products=[OrderProductData(product_id=product_id, quantity=2)],
+        )
+
+        order = OrderOperations().create_order(data)
+
+        assert product_quantity(product_id) == 3
+        assert [p.quantity for p in OrderOperations().get_order_by_id(order.id).products] == [2]
+
+    def test_insufficient_stock_rolls_back(self, db_engine):
+        seed_orders(0)
+        in_stock = seed_product(quantity=5)
+        short = seed_product(quantity=1)
+        data = OrderCreateData(
+            customer_id=1,
+            products=[
+                OrderProductData(product_id=in_stock, quantity=2),
+                OrderProductData(product_id=short, quantity=2),
+            ],
+        )
+
+        with pytest.raises(HTTPException):
+            OrderOperations().create_order(data)
+
+        assert product_quantity(in_stock) == 5
+        assert product_quantity(short) == 1
+        assert OrderOperations().count_orders() == 0
+
+    def test_create_order_without_products(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        seed_orders(0)
+        response = TestClient(app).post(
+            "/api/orders", json={"customer_id": 1, "products": []}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["products"] == []
+        assert OrderOperations().count_orders() == 1
+
+
+def expire_reservation(order_id: str) -> None:
+    session = DBSession()
+    order = session.get(DBOrder, UUID(order_id))
+    order.reservation_expires_at = datetime.utcnow() - timedelta(minutes=1)
+    session.commit()
+    session.close()
+
+
+class TestReservations:
+    def create_order(self, quantity=2, stock=5):
+        seed_orders(0)
+        product_id = seed_product(quantity=stock)
+        order = OrderOperations().create_order(
+            OrderCreateData(
+                customer_id=1,
+                products=[OrderProductData(product_id=product_id, quantity=quantity)],
+            )
+        )
+        return order, product_id
+
+    def test_new_order_is_reserved(self, db_engine):
+        order, _ = self.create_order()
+        assert order.reservation_status == "reserved"
+        assert order.reservation_expires_at is not None
+
+    def test_sweeper_releases_expired_stock(self, db_engine):
+        order, product_id = self.create_order()
+        active, _ = self.create_order()
+        expire_reservation(order.id)
+
+        released = OrderOperations().release_expired_reservations(batch_size=1)
+
+        assert released == 1
+        assert product_quantity(product_id) == 5
+        expired = OrderOperations().get_order_by_id(order.id)
+        assert expired.reservation_status == "expired"
+        assert OrderOperations().get_order_by_id(active.id).reservation_status == "reserved"
+
+        with pytest.raises(HTTPException):
+            OrderOperations().complete_reserved_order(order.id)
+
+        reserved = OrderOperations().reserve_order(order.id)
+        assert reserved.reservation_status == "reserved"
+        assert product_quantity(product_id) == 3
+
+    def test_sweeper_leaves_commit_to_caller_session(self, db_engine):
+        first, product_id = self.create_order()
+        second, _ = self.create_order()
+        expire_reservation(first.id)
+        expire_reservation(second.id)
+        commits = []
+
+        with DBSession() as session:
+            event.listen(session, "after_commit", lambda s: commits.append(s))
+            released = OrderOperations().release_expired_reservations(
+                batch_size=1, session=session
+            )
+            session.rollback()
+
+        assert released == 2
+        assert commits == []
+        assert product_quantity(product_id) == 3
+
+    def test_cancel_releases_stock(self, db_engine):
+        order, product_id = self.create_order()
+
+        canceled = OrderOperations().update_order_status(
+            order.id, OrderStatusUpdateData(status="canceled")
+        )
+
+        assert canceled.reservation_status == "cancelled"
+        assert product_quantity(product_id) == 5
+
+    def test_complete_reserved_order(self, db_engine):
+        order, product_id = self.create_order()
+
+        completed = OrderOperations().complete_reserved_order(order.id)
+
+        assert completed.status == "completed"
+        assert completed.payment_status == "paid"
+        assert completed.reservation_status == "completed"
+        assert product_quantity(product_id) == 3
+
+
+class TestPeriodicTask:
+    def test_run_once_records_duration(self):
+        metrics.reset()
+        task = PeriodicTask("unit_sweep", lambda: 3, interval_seconds=60)
+
+        assert task.run_once() == 3
+
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"]["unit_sweep.processed"] == 3
+        assert snapshot["timings"]["unit_sweep.duration"]["count"] == 1
+
+
+class TestEngineLifecycle:
+    def test_file_engine_uses_pool_and_wal(self, tmp_path):
+        engine = create_db_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}", pool_size=3, max_overflow=1
+        )
+        with engine.connect() as connection:
+            journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+
+        assert journal_mode == "wal"
+        assert engine.pool.size() == 3
+        engine.dispose()
+
+    def test_init_and_dispose(self, tmp_path):
+        previous_bind = DBSession.kw.get("bind")
+        engine = init_db(f"sqlite:///{tmp_path / 'life.db'}")
+        assert get_engine() is engine
+
+        dispose_db()
+
+        with pytest.raises(RuntimeError):
+            get_engine()
+        DBSession.configure(bind=previous_bind)
+
+
+class TestAsyncLayer:
+    def test_async_product_crud(self, async_db_engine):
+        async def scenario():
+            created = await create_product_async(ProductCreateData(quantity=7))
+            updated = await update_product_async(
+                created["id"], ProductUpdateData(name="renamed", quantity=3)
+            )
+            fetched = await get_product_by_id_async(created["id"])
+            await delete_product_by_id_async(created["id"])
+            return updated, fetched, await get_all_products_async({})
+
+        updated, fetched, remaining = asyncio.run(scenario())
+
+        assert updated["name"] == "renamed"
+        assert fetched["quantity"] == 3
+        assert remaining == []
+
+    def test_async_order_creation_and_webhook(self, async_db_engine):
+        seed_orders(0)
+        product_id = seed_product(quantity=5)
+        async_order_ops = AsyncOrderOperations()
+
+        async def scenario():
+            order = await async_order_ops.create_order(
+                OrderCreateData(
+                    customer_id=1,
+                    products=[OrderProductData(product_id=product_id, quantity=2)],
+                )
+            )
+            await payment_webhook_async(
+                PaymentWebhookPayload(order_id=order.id, payment_status="failed")
+            )
+            return await async_order_ops.get_order_by_id(order.id)
+
+        order = asyncio.run(scenario())
+
+        assert order.status == "canceled"
+        assert order.payment_status == "failed"
+        assert product_quantity(product_id) == 5
+
+
+class TestOrderLineItemLoading:
+    def test_line_items_loaded_in_one_query(self, db_engine):
+        order_ids = seed_orders(3)
+        session = DBSession()
+        product = DBProduct(name="p", price=1, quantity=10)
+        session.add(product)
+        session.flush()
+        session.execute(
+            order_product.insert(),
+            [
+                {"order_id": UUID(order_ids[0]), "product_id": product.id, "quantity": 1},
+                {"order_id": UUID(order_ids[1]), "product_id": product.id, "quantity": 2},
+            ],
+        )
+        session.commit()
+        session.close()
+
+        statements = []
+
+        @event.listens_for(db_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        orders = {o.id: o for o in OrderOperations().get_all_orders()}
+        event.remove(db_engine, "before_cursor_execute", record)
+
+        line_item_queries = [s for s in statements if "FROM order_product" in s]
+        assert len(line_item_queries) == 1
+        assert [p.quantity for p in orders[order_ids[0]].products] == [1]
+        assert [p.quantity for p in orders[order_ids[1]].products] == [2]
+        assert orders[order_ids[2]].products == []
+
+
+class TestRequestSession:
+    def test_nested_calls_share_one_commit(self, db_engine):
+        commits = []
+        dependency = get_db_session()
+        session = next(dependency)
+        event.listen(session, "after_commit", lambda s: commits.append(s))
+
+        product = create_product(ProductCreateData(quantity=4), session=session)
+        assert get_product_by_id(product["id"], session=session)["quantity"] == 4
+        assert commits == []
+
+        with pytest.raises(StopIteration):
+            next(dependency)
+        assert len(commits) == 1
+        assert product_quantity(product["id"]) == 4
+
+    def test_error_rolls_back_whole_request(self, db_engine):
+        dependency = get_db_session()
+        session = next(dependency)
+        product = create_product(ProductCreateData(quantity=4), session=session)
+
+        with pytest.raises(HTTPException):
+            dependency.throw(HTTPException(status_code=400, detail="boom"))
+
+        with pytest.raises(HTTPException) as exc_info:
+            get_product_by_id(product["id"])
+        assert exc_info.value.status_code == 404
+
+    def test_value_error_in_route_returns_400(self, async_db_engine):
+        from fastapi import Depends, FastAPI
+        from fastapi.testclient import TestClient
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from assignment_berkeley.helpers.db_helpers import get_async_db_session
+
+        created = []
+        app = FastAPI()
+
+        @app.get("/sync")
+        def sync_route(session: Session = Depends(get_db_session)):
+            created.append(create_product(ProductCreateData(quantity=1), session=session))
+            raise ValueError("bad sync input")
+
+        @app.get("/async")
+        async def async_route(session: AsyncSession = Depends(get_async_db_session)):
+            raise ValueError("bad async input")
+
+        client = TestClient(app)
+        for path, detail in [("/sync", "bad sync input"), ("/async", "bad async input")]:
+            response = client.get(path)
+            assert response.status_code == 400
+            assert response.json() == {"detail": detail}
+
+        # 出错的请求整体回滚
+        with pytest.raises(HTTPException) as exc_info:
+            get_product_by_id(created[0]["id"])
+        assert exc_info.value.status_code == 404
+
+
+class TestProductCache:
+    def test_backend_evicts_lru_and_expired_entries(self):
+        backend = TTLLRUBackend(max_size=2, ttl_seconds=60)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        assert backend.get("b") is None
+        assert backend.get("a") == 1
+
+        expiring = TTLLRUBackend(max_size=2, ttl_seconds=0)
+        expiring.set("a", 1)
+        assert expiring.get("a") is None
+
+    def test_reads_hit_cache_until_write(self, db_engine):
+        product_id = seed_product(quantity=5)
+        metrics.reset()
+
+        get_product_by_id(product_id)
+        get_product_by_id(product_id)
+        counters = metrics.snapshot()["counters"]
+        assert counters["product_cache.misses"] == 1
+        assert counters["product_cache.hits"] == 1
+
+        update_product(product_id, ProductUpdateData(name="renamed", quantity=9))
+        assert get_product_by_id(product_id)["quantity"] == 9
+
+    def test_order_invalidates_cached_stock(self, db_engine):
+        seed_orders(0)
+        product_id = seed_product(quantity=5)
+        assert get_product_by_id(product_id)["quantity"] == 5
+
+        OrderOperations().create_order(
+            OrderCreateData(
+                customer_id=1,
+                products=[OrderProductData(product_id=product_id, quantity=2)],
+            )
+        )
+        assert get_product_by_id(product_id)["quantity"] == 3
+
+    def test_rolled_back_write_does_not_stay_cached(self, db_engine):
+        product_id = seed_product(quantity=5)
+        dependency = get_db_session()
+        session = next(dependency)
+        update_product(
+            product_id, ProductUpdateData(name="draft", quantity=1), session=session
+        )
+        get_product_by_id(product_id, session=session)
+
+        with pytest.raises(HTTPException):
+            dependency.throw(HTTPException(status_code=400, detail="boom"))
+
+        assert get_product_by_id(product_id)["quantity"] == 5
+
+
+class TestFilterEngine:
+    def seed_catalog(self):
+        session = DBSession()
+        session.add_all(
+            [
+                DBProduct(name="apple", price=1.5, quantity=0),
+                DBProduct(name="apricot", price=4, quantity=3),
+                DBProduct(name="banana", price=8, quantity=10),
+            ]
+        )
+        session.commit()
+        session.close()
+
+    def names(self, filter_params):
+        return sorted(p["name"] for p in get_all_products(filter_params))
+
+    def test_operator_suffixes(self, db_engine):
+        self.seed_catalog()
+        assert self.names({"quantity_gt": 0}) == ["apricot", "banana"]
+        assert self.names({"quantity_lte": 0}) == ["apple"]
+        assert self.names({"price_gte": 2, "price_lt": 8}) == ["apricot"]
+        assert self.names({"name_in": ["apple", "banana"]}) == ["apple", "banana"]
+        assert self.names({"name_like": "%an%"}) == ["banana"]
+        assert self.names({"name_startswith": "ap", "name_ne": "apple"}) == ["apricot"]
+
+    def test_product_filters_run_in_sql(self, db_engine):
+        self.seed_catalog()
+        filter_params = product_filters(in_stock=True, min_price=5)
+        statements = []
+
+        @event.listens_for(db_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        products = get_all_products(filter_params, limit=10, offset=0)
+        event.remove(db_engine, "before_cursor_execute", record)
+
+        assert [p["name"] for p in products] == ["banana"]
+        assert count_products(filter_params) == 1
+        assert "product.quantity > ?" in statements[0]
+        assert "product.price >= ?" in statements[0]
+
+    def test_unknown_filter_is_rejected(self, db_engine):
+        with pytest.raises(HTTPException) as exc_info:
+            get_all_products({"colour_gt": 1})
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Unknown filter: colour_gt"
+
+
+def query_plans(engine, func) -> list[str]:
+    """运行 func，返回其中每条SELECT的 EXPLAIN QUERY PLAN 文本"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        func()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    with engine.connect() as conn:
+        return [
+            " ".join(
+                row[-1]
+                for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            )
+            for statement, parameters in statements
+        ]
+
+
+class TestOrderIndexes:
+    def test_filtered_order_list_uses_status_index(self, db_engine):
+        seed_orders(3)
+        order_ops = OrderOperations()
+        plans = query_plans(
+            db_engine,
+            lambda: order_ops.get_all_orders("pending", "unpaid", limit=10, offset=0),
+        )
+        assert "ix_orders_status_payment_created" in plans[0]
+
+        plans = query_plans(
+            db_engine, lambda: order_ops.count_orders("pending", "unpaid")
+        )
+        assert "ix_orders_status_payment_created" in plans[0]
+
+    def test_customer_orders_use_customer_index(self, db_engine):
+        seed_orders(3)
+        plans = query_plans(
+            db_engine,
+            lambda: OrderOperations().get_all({"customer_id": 1}, limit=10),
+        )
+        assert "ix_orders_customer_created" in plans[0]
+
+    def test_order_product_lookup_by_product_uses_index(self, db_engine):
+        with db_engine.connect() as conn:
+            plan = " ".join(
+                row[-1]
+                for row in conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN SELECT order_id FROM order_product WHERE product_id = ?",
+                    ("x",),
+                )
+            )
+        assert "ix_order_product_product_id" in plan
+
+
+class TestFastSerialization:
+    def test_to_dict_stringifies_uuid_and_datetime(self):
+        order_id = UUID("12345678-1234-5678-1234-567812345678")
+        created_at = datetime(2024, 1, 2, 3, 4, 5)
+        order = DBOrder(
+            id=order_id,
+            customer_id=1,
+            total_price=3,
+            status=OrderStatus.pending,
+            created_at=created_at,
+        )
+
+        data = to_dict(order)
+
+        assert data["id"] == str(order_id)
+        assert data["created_at"] == str(created_at)
+        assert data["updated_at"] is None
+        assert data["status"] is OrderStatus.pending
+
+    def test_fast_list_responses_match_validated_ones(self, app_db):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        seed_orders(0)
+        product_id = seed_product(quantity=5, price=2.5)
+        OrderOperations().create_order(
+            OrderCreateData(
+                customer_id=1,
+                products=[OrderProductData(product_id=product_id, quantity=2)],
+            )
+        )
+        urls = ["/api/products", "/api/products/cursor", "/api/orders", "/api/orders/cursor"]
+
+        # 进入 lifespan，与线上一样先执行 add_pagination 的启动钩子
+        with TestClient(app) as client:
+            fast = [client.get(url).json() for url in urls]
+            with patch("assignment_berkeley.helpers.responses.FAST_JSON_RESPONSES", False):
+                validated = [client.get(url).json() for url in urls]
+
+        assert fast == validated
+        assert fast[0]["items"][0]["price"] == 2.5
+        assert fast[2]["items"][0]["products"][0]["quantity"] == 2
+
+
+class TestColumnProjection:
+    def test_only_requested_columns_are_selected(self, db_engine):
+        seed_product(quantity=5, price=3)
+        statements = []
+
+        @event.listens_for(db_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        products = get_all_products({}, fields=["name", "price"])
+        event.remove(db_engine, "before_cursor_execute", record)
+
+        assert products == [{"name": "p", "price": 3}]
+        assert "product.quantity" not in statements[0]
+
+    def test_order_fields_with_products(self, db_engine):
+        seed_orders(0)
+        product_id = seed_product(quantity=5)
+        OrderOperations().create_order(
+            OrderCreateData(
+                customer_id=1,
+                products=[OrderProductData(product_id=product_id, quantity=2)],
+            )
+        )
+
+        orders = OrderOperations().get_all_orders(fields=["status", "products"])
+
+        assert list(orders[0]) == ["status", "products"]
+        assert orders[0]["products"][0].quantity == 2
+
+    def test_unknown_field_is_rejected(self, db_engine):
+        with pytest.raises(HTTPException) as exc_info:
+            get_all_products({}, fields=["id", "secret"])
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Unknown fields: secret"
+
+    def test_fields_query_parameter(self, app_db):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        seed_orders(2)
+        seed_product(quantity=3)
+        cases = [
+            ("/api/orders", "id,total_price", 2),
+            ("/api/products", "id,price", 1),
+            ("/customers", "id,first_name", 1),
+        ]
+
+        # 进入 lifespan：add_pagination 的启动钩子执行后投影的分页也要正常返回
+        with TestClient(app) as client:
+            for path, fields, total in cases:
+                response = client.get(path, params={"fields": fields})
+
+                assert response.status_code == 200, response.text
+                assert response.json()["total"] == total
+                assert all(
+                    set(item) == set(fields.split(","))
+                    for item in response.json()["items"]
+                )
+
+    def test_unknown_field_query_parameter_returns_400(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        client = TestClient(app)
+        for path in ["/api/orders", "/api/products", "/customers"]:
+            response = client.get(path, params={"fields": "id,bogus"})
+            assert response.status_code == 400, path
+            assert response.json() == {"detail": "Unknown fields: bogus"}
+
+
+class TestExport:
+    def seed_order_with_lines(self, quantities):
+        product_ids = [seed_product(quantity=10) for _ in quantities]
+        return OrderOperations().create_order(
+            OrderCreateData(
+                customer_id=1,
+                products=[
+                    OrderProductData(product_id=product_id, quantity=quantity)
+                    for product_id, quantity in zip(product_ids, quantities)
+                ],
+            )
+        )
+
+    def test_stream_groups_line_items_per_order(self, db_engine):
+        seed_orders(1)
+        first = self.seed_order_with_lines([1, 2])
+        second = self.seed_order_with_lines([3])
+
+        exported = {order["id"]: order for order in OrderOperations().stream_orders(batch_size=2)}
+
+        assert len(exported) == 3
+        assert sorted(line["quantity"] for line in exported[first.id]["products"]) == [1, 2]
+        assert [line["quantity"] for line in exported[second.id]["products"]] == [3]
+
+    def test_export_endpoints(self, async_db_engine):
+        import csv
+        import json
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        seed_orders(0)
+        order = self.seed_order_with_lines([1, 2])
+        client = TestClient(app)
+
+        response = client.get("/api/orders/export")
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["id"] for line in lines] == [order.id]
+        assert len(lines[0]["products"]) == 2
+
+        response = client.get("/api/orders/export", params={"format": "csv"})
+        rows = list(csv.DictReader(response.text.splitlines()))
+        assert len(rows) == 2
+        assert {row["status"] for row in rows} == {"pending"}
+
+        response = client.get("/api/products/export", params={"format": "csv"})
+        rows = list(csv.DictReader(response.text.splitlines()))
+        assert sorted(int(row["quantity"]) for row in rows) == [8, 9]
+
+
+class TestBulkProducts:
+    def test_json_import_reports_each_row(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        response = TestClient(app).post(
+            "/api/products/bulk",
+            json=[
+                {"name": "a", "price": 1, "quantity": 2},
+                {"name": "b", "price": -1, "quantity": 2},
+                "not an object",
+                {"name": "c", "price": 3, "quantity": 4},
+            ],
+        )
+
+        body = response.json()
+        assert (body["succeeded"], body["failed"]) == (2, 2)
+        assert [r["success"] for r in body["results"]] == [True, False, False, True]
+        assert body["results"][1]["error"].startswith("price:")
+        assert product_quantity(body["results"][3]["id"]) == 4
+
+    def test_streamed_ndjson_import_and_csv_update(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        client = TestClient(app)
+        ndjson = b'{"name": "a", "quantity": 1}\n{broken\n{"name": "b", "quantity": 2}\n'
+        created = client.post(
+            "/api/products/bulk",
+            content=ndjson,
+            headers={"Content-Type": "application/x-ndjson"},
+        ).json()
+        assert created["succeeded"] == 2
+        assert created["results"][1]["error"] == "Malformed record"
+
+        first_id = created["results"][0]["id"]
+        get_product_by_id(first_id)  # 预热缓存，更新后应失效
+        csv_body = (
+            "id,quantity,name\n"
+            f"{first_id},7,\n"
+            "00000000-0000-0000-0000-000000000000,1,x\n"
+        )
+        updated = client.patch(
+            "/api/products/bulk",
+            content=csv_body,
+            headers={"Content-Type": "text/csv"},
+        ).json()
+
+        assert [r["success"] for r in updated["results"]] == [True, False]
+        assert updated["results"][1]["error"] == "Product not found"
+        product = get_product_by_id(first_id)
+        assert (product["quantity"], product["name"]) == (7, "a")
+
+    def test_explicit_null_fails_only_its_row(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        product_ids = [seed_product(quantity=1) for _ in range(2)]
+        response = TestClient(app).patch(
+            "/api/products/bulk",
+            json=[
+                {"id": product_ids[0], "price": None},
+                {"id": product_ids[1], "quantity": 6},
+            ],
+        )
+
+        body = response.json()
+        assert [r["success"] for r in body["results"]] == [False, True]
+        assert body["results"][0]["error"].startswith("price:")
+        assert product_quantity(product_ids[1]) == 6
+
+    def test_chunks_commit_independently(self, async_db_engine):
+        from assignment_berkeley.operations.products import bulk_create_products_async
+
+        async def records():
+            for quantity in range(1, 6):
+                yield {"name": f"p{quantity}", "quantity": quantity}
+
+        result = asyncio.run(bulk_create_products_async(records(), chunk_size=2))
+
+        assert result.succeeded == 5
+        assert [r.index for r in result.results] == [0, 1, 2, 3, 4]
+        assert len(get_all_products({})) == 5
+
+
+class TestBulkPrimitives:
+    def test_customer_bulk_roundtrip(self, db_engine):
+        from assignment_berkeley.operations.customers import customer_interface
+
+        created = customer_interface.bulk_create(
+            [{"email": f"c{i}@example.com"} for i in range(4)]
+        )
+        ids = sorted(c["id"] for c in customer_interface.get_all())
+        updated = customer_interface.bulk_update(
+            [
+                {"id": ids[0], "email": "first@example.com"},
+                {"id": ids[1], "first_name": "Ann", "last_name": "Lee"},
+                {"id": 999, "email": "missing@example.com"},
+            ]
+        )
+        deleted = customer_interface.bulk_delete([ids[2], ids[3], 999])
+
+        assert (created, updated, deleted) == (4, 2, 2)
+        remaining = {c["id"]: c for c in customer_interface.get_all()}
+        assert set(remaining) == {ids[0], ids[1]}
+        assert remaining[ids[0]]["email"] == "first@example.com"
+        assert remaining[ids[1]]["first_name"] == "Ann"
+
+    def test_bulk_statements_are_set_based(self, db_engine):
+        from assignment_berkeley.operations.products import product_interface
+
+        product_ids = [seed_product(quantity=1) for _ in range(3)]
+        statements = []
+
+        @event.listens_for(db_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement.split()[0], executemany, "product_fts" in statement))
+
+        product_interface.bulk_update(
+            [{"id": product_id, "quantity": 9} for product_id in product_ids]
+        )
+        product_interface.bulk_delete(product_ids[:2])
+        event.remove(db_engine, "before_cursor_execute", record)
+
+        # 只改库存不需要同步全文索引；删除时依次删掉 order_product 关联行、产品行和索引行
+        assert statements == [
+            ("UPDATE", True, False),
+            ("DELETE", False, False),
+            ("DELETE", False, False),
+            ("DELETE", False, True),
+        ]
+        assert product_quantity(product_ids[2]) == 9
+
+    def test_bulk_delete_removes_order_line_items(self, db_engine):
+        seed_orders(0)
+        product_id = seed_product(quantity=5)
+        order = OrderOperations().create_order(
+            OrderCreateData(
+                customer_id=1,
+                products=[OrderProductData(product_id=product_id, quantity=2)],
+            )
+        )
+
+        assert OrderOperations().bulk_delete([order.id]) == 1
+
+        with DBSession() as session:
+            assert session.execute(order_product.select()).all() == []
+
+    def test_async_bulk_primitives(self, async_db_engine):
+        from assignment_berkeley.operations.products import async_product_interface
+
+        async def scenario():
+            await async_product_interface.bulk_create(
+                [{"name": "a", "price": 1, "quantity": 1}, {"name": "b", "price": 1, "quantity": 2}]
+            )
+            ids = [p["id"] for p in await async_product_interface.get_all()]
+            updated = await async_product_interface.bulk_update(
+                [{"id": product_id, "quantity": 5} for product_id in ids]
+            )
+            deleted = await async_product_interface.bulk_delete(ids[:1])
+            return updated, deleted, await async_product_interface.get_all()
+
+        updated, deleted, remaining = asyncio.run(scenario())
+
+        assert (updated, deleted) == (2, 1)
+        assert [p["quantity"] for p in remaining] == [5]
+
+
+class TestWebhookIdempotency:
+    def create_order(self):
+        seed_orders(0)
+        product_id = seed_product(quantity=5)
+        return OrderOperations().create_order(
+            OrderCreateData(
+                customer_id=1,
+                products=[OrderProductData(product_id=product_id, quantity=1)],
+            )
+        )
+
+    def orders_statements(self, engine, func):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            result = func()
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        return result, [s for s in statements if "orders" in s]
+
+    def test_duplicate_delivery_returns_stored_response(self, db_engine):
+        order = self.create_order()
+        payload = PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+        first = payment_webhook(payload)
+
+        # 内存缓存命中：不访问数据库
+        second, touched = self.orders_statements(db_engine, lambda: payment_webhook(payload))
+        assert second == first
+        assert touched == []
+
+        # 缓存丢失（如重启后）：从 webhook_event 读取，仍然不访问订单
+        webhook_response_cache.clear()
+        third, touched = self.orders_statements(db_engine, lambda: payment_webhook(payload))
+        assert third == first
+        assert touched == []
+
+    def test_failed_delivery_is_not_recorded(self, db_engine):
+        from assignment_berkeley.db.models import DBWebhookEvent
+
+        payload = PaymentWebhookPayload(
+            order_id="12345678-1234-4678-9234-567812345678", payment_status="paid"
+        )
+        for _ in range(2):
+            with pytest.raises(HTTPException) as exc_info:
+                payment_webhook(payload)
+            assert exc_info.value.status_code == 404
+
+        session = DBSession()
+        assert session.query(DBWebhookEvent).count() == 0
+        session.close()
+
+    def test_distinct_idempotency_keys_are_processed(self, db_engine):
+        order = self.create_order()
+        payload = PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+        payment_webhook(payload, "delivery-1")
+
+        with pytest.raises(HTTPException) as exc_info:
+            payment_webhook(payload, "delivery-2")
+        assert "must be 'pending'" in exc_info.value.detail
+
+
+class TestWebhookInbox:
+    def create_order(self):
+        return TestWebhookIdempotency.create_order(self)
+
+    def inbox_rows(self):
+        session = DBSession()
+        rows = [
+            (row.status.value, row.error)
+            for row in session.query(DBWebhookInbox).order_by(DBWebhookInbox.id)
+        ]
+        session.close()
+        return rows
+
+    def test_queued_webhook_is_applied_by_worker(self, db_engine):
+        metrics.reset()
+        order = self.create_order()
+        response = enqueue_payment_webhook(
+            PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+        )
+        assert response.success
+        assert OrderOperations().get_order_by_id(order.id).payment_status == "unpaid"
+
+        assert process_webhook_inbox(10) == 1
+        assert OrderOperations().get_order_by_id(order.id).payment_status == "paid"
+        assert self.inbox_rows() == [("done", None)]
+        snapshot = metrics.snapshot()
+        assert snapshot["gauges"]["webhook_inbox.depth"] == 0
+        assert snapshot["counters"]["webhook_inbox.done"] == 1
+
+    def test_failed_row_does_not_block_batch(self, db_engine):
+        order = self.create_order()
+        enqueue_payment_webhook(
+            PaymentWebhookPayload(
+                order_id="a2345678-1234-4678-9234-567812345678", payment_status="paid"
+            )
+        )
+        enqueue_payment_webhook(
+            PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+        )
+
+        assert process_webhook_inbox(10) == 2
+        assert self.inbox_rows() == [("failed", "Order not found"), ("done", None)]
+        assert OrderOperations().get_order_by_id(order.id).payment_status == "paid"
+
+    def test_full_queue_rejects_with_503(self, db_engine):
+        order = self.create_order()
+        payload = PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+        with patch("assignment_berkeley.operations.webhooks.WEBHOOK_QUEUE_MAX_DEPTH", 1):
+            enqueue_payment_webhook(payload)
+            with pytest.raises(HTTPException) as exc_info:
+                enqueue_payment_webhook(payload)
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"]
+
+    def test_enqueue_uses_depth_calibrated_by_worker(self, db_engine):
+        order = self.create_order()
+        payload = PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+        process_webhook_inbox(10)
+        statements = []
+
+        @event.listens_for(db_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        enqueue_payment_webhook(payload)
+        enqueue_payment_webhook(payload)
+        event.remove(db_engine, "before_cursor_execute", record)
+
+        assert not any("count(" in statement for statement in statements)
+        assert metrics.snapshot()["gauges"]["webhook_inbox.depth"] == 2
+
+    def test_prune_removes_only_expired_done_rows(self, db_engine):
+        from assignment_berkeley.operations.webhooks import prune_webhook_inbox
+
+        order = self.create_order()
+        enqueue_payment_webhook(
+            PaymentWebhookPayload(
+                order_id="a2345678-1234-4678-9234-567812345678", payment_status="paid"
+            )
+        )
+        for _ in range(3):
+            enqueue_payment_webhook(
+                PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+            )
+        process_webhook_inbox(10)
+        enqueue_payment_webhook(
+            PaymentWebhookPayload(order_id=order.id, payment_status="paid")
+        )
+
+        assert prune_webhook_inbox(3600) == 0
+        assert prune_webhook_inbox(-60, batch_size=2) == 3
+        assert self.inbox_rows() == [("failed", "Order not found"), ("pending", None)]
+
+    def test_queued_mode_endpoint_returns_202(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        order = self.create_order()
+        with patch("assignment_berkeley.routers.webhooks.WEBHOOK_INGESTION_MODE", "queued"):
+            response = TestClient(app).post(
+                "/api/payment-webhook",
+                json={"order_id": order.id, "payment_status": "paid"},
+                headers={"Authorization": "Bearer expected_token"},
+            )
+        assert response.status_code == 202
+        assert self.inbox_rows() == [("pending", None)]
+
+
+class TestPaymentWebhookBatch:
+    def create_orders(self, count):
+        seed_orders(0)
+        product_id = seed_product(quantity=10)
+        ops = OrderOperations()
+        orders = [
+            ops.create_order(
+                OrderCreateData(
+                    customer_id=1,
+                    products=[OrderProductData(product_id=product_id, quantity=1)],
+                )
+            )
+            for _ in range(count)
+        ]
+        return product_id, [order.id for order in orders]
+
+    def test_batch_reports_per_order_outcomes(self, db_engine):
+        product_id, (paid, failed, completed) = self.create_orders(3)
+        OrderOperations().update_order_status(
+            completed, OrderStatusUpdateData(status="completed")
+        )
+        missing = "a2345678-1234-4678-9234-567812345678"
+        payload = PaymentWebhookBatchPayload(
+            payments=[
+                {"order_id": paid, "payment_status": "paid"},
+                {"order_id": failed, "payment_status": "FAILED"},
+                {"order_id": completed, "payment_status": "paid"},
+                {"order_id": missing, "payment_status": "paid"},
+                {"order_id": paid, "payment_status": "failed"},
+                {"order_id": failed, "payment_status": "refunded"},
+            ]
+        )
+
+        response = payment_webhook_batch(payload)
+        assert (response.succeeded, response.failed) == (2, 4)
+        assert [result.error for result in response.results] == [
+            None,
+            None,
+            "Order status must be 'pending'",
+            "Order not found",
+            "Duplicate order_id in batch",
+            "Invalid payment status. Must be 'paid' or 'failed'",
+        ]
+        ops = OrderOperations()
+        assert ops.get_order_by_id(paid).status == "completed"
+        assert ops.get_order_by_id(failed).status == "canceled"
+        assert ops.get_order_by_id(failed).payment_status == "failed"
+        # 支付失败的订单归还库存：10 - 3 + 1
+        assert product_quantity(product_id) == 8
+
+    def test_batch_loads_orders_in_one_query(self, db_engine):
+        _, order_ids = self.create_orders(5)
+        payload = PaymentWebhookBatchPayload(
+            payments=[
+                {"order_id": order_id, "payment_status": "paid"} for order_id in order_ids
+            ]
+        )
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_engine, "before_cursor_execute", record)
+        try:
+            assert payment_webhook_batch(payload).succeeded == 5
+        finally:
+            event.remove(db_engine, "before_cursor_execute", record)
+        selects = [s for s in statements if s.lstrip().startswith("SELECT") and "FROM orders" in s]
+        updates = [s for s in statements if s.lstrip().startswith("UPDATE orders")]
+        assert len(selects) <= 2
+        assert len(updates) == 2
+
+    def test_replayed_batch_returns_first_outcome(self, db_engine):
+        _, (order_id,) = self.create_orders(1)
+        payload = PaymentWebhookBatchPayload(
+            payments=[{"order_id": order_id, "payment_status": "paid"}]
+        )
+        first = payment_webhook_batch(payload)
+        second = payment_webhook_batch(payload)
+        assert second == first
+        # 单条回调与批量回调共用幂等键
+        single = payment_webhook(
+            PaymentWebhookPayload(order_id=order_id, payment_status="paid")
+        )
+        assert single.success
+        assert single.updated_at == first.results[0].updated_at
+
+    def test_endpoint_requires_token(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        _, (order_id,) = self.create_orders(1)
+        client = TestClient(app)
+        body = {"payments": [{"order_id": order_id, "payment_status": "paid"}]}
+        response = client.post(
+            "/api/payment-webhook/batch", json=body, headers={"Authorization": "Bearer wrong"}
+        )
+        assert response.status_code == 403
+        response = client.post(
+            "/api/payment-webhook/batch",
+            json=body,
+            headers={"Authorization": "Bearer expected_token"},
+        )
+        assert response.status_code == 200
+        assert response.json()["succeeded"] == 1
+
+
+class TestCustomerListing:
+    def seed_customers(self):
+        session = DBSession()
+        session.add_all(
+            [
+                DBCustomer(first_name="Ann", last_name="Lee", email="ann@example.com"),
+                DBCustomer(first_name="Bob", last_name="Leon", email="bob@example.com"),
+                DBCustomer(first_name="Annie", last_name="lemon", email="annie@example.com"),
+                DBCustomer(first_name="Carl", last_name="Lf", email="carl@example.com"),
+            ]
+        )
+        session.commit()
+        session.close()
+
+    def emails(self, **filters):
+        from assignment_berkeley.operations.customers import (
+            customer_filters,
+            read_all_customers,
+        )
+
+        return [c["email"] for c in read_all_customers(customer_filters(**filters))]
+
+    def test_prefix_and_email_filters(self, db_engine):
+        self.seed_customers()
+        assert self.emails(last_name="Le") == ["ann@example.com", "bob@example.com"]
+        assert self.emails(first_name="Ann") == ["ann@example.com", "annie@example.com"]
+        assert self.emails(email="carl@example.com") == ["carl@example.com"]
+        assert self.emails(first_name="Ann", last_name="le") == ["annie@example.com"]
+
+    def test_lookups_use_indexes(self, db_engine):
+        from assignment_berkeley.operations.customers import (
+            customer_filters,
+            read_all_customers,
+        )
+
+        self.seed_customers()
+        for filters, index in [
+            ({"email": "ann@example.com"}, "ix_customer_email"),
+            ({"last_name": "Le"}, "ix_customer_last_name"),
+            ({"first_name": "An"}, "ix_customer_first_name"),
+        ]:
+            plans = query_plans(
+                db_engine, lambda: read_all_customers(customer_filters(**filters))
+            )
+            assert index in plans[0]
+
+    def test_endpoint_paginates(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        self.seed_customers()
+        client = TestClient(app)
+        page = client.get("/customers", params={"size": 2, "page": 2}).json()
+        assert page["total"] == 4
+        assert [c["email"] for c in page["items"]] == [
+            "annie@example.com",
+            "carl@example.com",
+        ]
+
+        page = client.get("/customers", params={"last_name": "Leo"}).json()
+        assert page["total"] == 1
+        assert page["items"][0] == {
+            "id": 2,
+            "first_name": "Bob",
+            "last_name": "Leon",
+            "email": "bob@example.com",
+        }
+
+
+class TestCustomerOrderHistory:
+    def seed_history(self):
+        order_ids = seed_orders(4)
+        seed_orders(2, customer_id=2)
+        product_id = seed_product(quantity=5)
+        session = DBSession()
+        # 下单时间依次递增
+        for minutes, order_id in enumerate(order_ids):
+            session.get(DBOrder, UUID(order_id)).created_at = datetime(2026, 1, 1, 0, minutes)
+        session.execute(
+            order_product.insert(),
+            [
+                {"order_id": UUID(order_ids[0]), "product_id": UUID(product_id), "quantity": 2},
+                {"order_id": UUID(order_ids[3]), "product_id": UUID(product_id), "quantity": 1},
+            ],
+        )
+        session.commit()
+        session.close()
+        return order_ids, product_id
+
+    def test_summary_is_aggregated_in_sql(self, db_engine):
+        self.seed_history()
+        summary = OrderOperations().get_customer_order_summary(1)
+        assert summary.order_count == 4
+        # 只统计已完成的订单：11 + 13
+        assert summary.lifetime_spend == 24
+        assert summary.last_order_at is not None
+
+    def test_unknown_customer_returns_404(self, db_engine):
+        with pytest.raises(HTTPException) as exc_info:
+            OrderOperations().get_customer_order_summary(42)
+        assert exc_info.value.status_code == 404
+
+    def test_page_with_lines_in_one_query(self, db_engine):
+        order_ids, product_id = self.seed_history()
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_engine, "before_cursor_execute", record)
+        try:
+            orders = OrderOperations().get_customer_orders(1, limit=3, offset=0)
+        finally:
+            event.remove(db_engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
+        assert [order.id for order in orders] == order_ids[:0:-1]
+        assert orders[0].products == [OrderProductData(product_id=product_id, quantity=1)]
+        assert orders[1].products == []
+
+    def test_endpoint(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        order_ids, _ = self.seed_history()
+        client = TestClient(app)
+        body = client.get("/customers/1/orders", params={"size": 3, "page": 2}).json()
+        assert body["summary"]["order_count"] == 4
+        assert body["summary"]["last_order_at"] == "2026-01-01 00:03:00"
+        assert body["orders"]["total"] == 4
+        [oldest] = body["orders"]["items"]
+        assert oldest["id"] == order_ids[0]
+        assert oldest["products"][0]["quantity"] == 2
+        assert client.get("/customers/42/orders").status_code == 404
+
+
+class TestSalesRollups:
+    def place_orders(self):
+        seed_orders(0)
+        product_id = seed_product(quantity=20)
+        ops = OrderOperations()
+
+        def place(quantity):
+            return ops.create_order(
+                OrderCreateData(
+                    customer_id=1,
+                    products=[OrderProductData(product_id=product_id, quantity=quantity)],
+                )
+            ).id
+
+        return product_id, [place(quantity) for quantity in (1, 2, 3, 4)]
+
+    def snapshot(self, product_id):
+        from assignment_berkeley.operations.sales import get_customer_sales, get_product_sales
+
+        return get_customer_sales(1), get_product_sales(product_id)
+
+    def test_counters_follow_order_lifecycle(self, db_engine):
+        product_id, (by_status, by_webhook, by_batch, canceled) = self.place_orders()
+        customer, product = self.snapshot(product_id)
+        assert (customer.order_count, customer.completed_order_count) == (4, 0)
+        assert customer.last_order_at is not None
+        assert (product.units_ordered, product.units_sold) == (10, 0)
+
+        ops = OrderOperations()
+        ops.update_order_status(by_status, OrderStatusUpdateData(status="completed"))
+        payment_webhook(PaymentWebhookPayload(order_id=by_webhook, payment_status="paid"))
+        payment_webhook_batch(
+            PaymentWebhookBatchPayload(
+                payments=[
+                    {"order_id": by_batch, "payment_status": "paid"},
+                    {"order_id": canceled, "payment_status": "failed"},
+                ]
+            )
+        )
+        # 重复投递不会重复计数
+        payment_webhook(PaymentWebhookPayload(order_id=by_webhook, payment_status="paid"))
+
+        customer, product = self.snapshot(product_id)
+        assert (customer.order_count, customer.completed_order_count) == (4, 3)
+        assert customer.lifetime_spend == 2.5 * (1 + 2 + 3)
+        assert (product.units_ordered, product.units_sold) == (10, 6)
+
+    def test_failed_order_leaves_counters_unchanged(self, db_engine):
+        product_id, _ = self.place_orders()
+        before = self.snapshot(product_id)
+        with pytest.raises(HTTPException):
+            OrderOperations().create_order(
+                OrderCreateData(
+                    customer_id=1,
+                    products=[OrderProductData(product_id=product_id, quantity=100)],
+                )
+            )
+        assert self.snapshot(product_id) == before
+
+    def test_rebuild_matches_incremental_counters(self, db_engine):
+        from assignment_berkeley.operations.sales import rebuild_sales_rollups
+
+        product_id, order_ids = self.place_orders()
+        OrderOperations().update_order_status(
+            order_ids[0], OrderStatusUpdateData(status="completed")
+        )
+        incremental = self.snapshot(product_id)
+
+        session = DBSession()
+        rebuild_sales_rollups(session)
+        session.commit()
+        session.close()
+        assert self.snapshot(product_id) == incremental
+
+
+class TestAnalyticsBuckets:
+    def run_lifecycle(self):
+        product_id, (completed, paid, canceled, pending) = TestSalesRollups.place_orders(self)
+        OrderOperations().update_order_status(
+            completed, OrderStatusUpdateData(status="completed")
+        )
+        payment_webhook(PaymentWebhookPayload(order_id=paid, payment_status="paid"))
+        payment_webhook(PaymentWebhookPayload(order_id=canceled, payment_status="failed"))
+        return product_id
+
+    def window(self):
+        now = datetime.utcnow()
+        return now - timedelta(days=1), now + timedelta(hours=1)
+
+    def test_range_queries_read_only_buckets(self, db_engine):
+        from assignment_berkeley.operations.analytics import (
+            Granularity,
+            get_order_event_counts,
+            get_revenue,
+            get_top_products,
+        )
+
+        product_id = self.run_lifecycle()
+        start, end = self.window()
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_engine, "before_cursor_execute", record)
+        try:
+            counts = get_order_event_counts(start, end)
+            [hourly] = get_revenue(start, end)
+            [daily] = get_revenue(start, end, Granularity.day)
+            [top] = get_top_products(start, end)
+        finally:
+            event.remove(db_engine, "before_cursor_execute", record)
+
+        assert not [s for s in statements if "FROM orders" in s]
+        assert (counts.placed, counts.completed, counts.canceled) == (4, 2, 1)
+        assert (hourly.revenue, hourly.orders) == (2.5 * 3, 2)
+        assert daily.bucket.endswith("T00:00:00")
+        assert (daily.revenue, daily.orders) == (hourly.revenue, hourly.orders)
+        assert (top.product_id, top.units_sold) == (product_id, 3)
+
+    def test_empty_and_invalid_ranges(self, db_engine):
+        from assignment_berkeley.operations.analytics import get_order_event_counts
+
+        start, end = self.window()
+        assert get_order_event_counts(start, end).placed == 0
+        with pytest.raises(HTTPException) as exc_info:
+            get_order_event_counts(end, start)
+        assert exc_info.value.status_code == 400
+
+    def test_rebuild_matches_incremental_buckets(self, db_engine):
+        from assignment_berkeley.operations.analytics import get_order_event_counts, get_top_products
+        from assignment_berkeley.operations.sales import rebuild_sales_rollups
+
+        self.run_lifecycle()
+        start, end = self.window()
+        incremental = (get_order_event_counts(start, end), get_top_products(start, end))
+        session = DBSession()
+        rebuild_sales_rollups(session)
+        session.commit()
+        session.close()
+        assert (get_order_event_counts(start, end), get_top_products(start, end)) == incremental
+
+    def test_endpoints(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        self.run_lifecycle()
+        client = TestClient(app)
+        assert client.get("/api/analytics/orders").json() == {
+            "placed": 4,
+            "completed": 2,
+            "canceled": 1,
+        }
+        revenue = client.get("/api/analytics/revenue", params={"granularity": "day"}).json()
+        assert revenue[0]["revenue"] == 2.5 * 3
+        assert len(client.get("/api/analytics/top-products").json()) == 1
+
+
+class TestProductSearch:
+    def seed_catalog(self):
+        ops = [
+            ("Red apple", "Crisp and sweet"),
+            ("Green apple", "Sour, good for baking pies"),
+            ("Apple pie", "Baked with red apples"),
+            ("Banana", "Yellow and sweet"),
+        ]
+        return [
+            create_product(ProductCreateData(name=name, description=description))["id"]
+            for name, description in ops
+        ]
+
+    def names(self, query, **kwargs):
+        from assignment_berkeley.operations.products import search_products
+
+        return [p["name"] for p in search_products(query, **kwargs)]
+
+    def test_ranked_prefix_search(self, db_engine):
+        from assignment_berkeley.operations.products import product_interface
+
+        self.seed_catalog()
+        assert set(self.names("apple")) == {"Red apple", "Green apple", "Apple pie"}
+        assert set(self.names("swe")) == {"Banana", "Red apple"}
+        assert self.names("apple pie")[0] == "Apple pie"
+        assert self.names('pie" OR "x') == []
+        assert self.names("  ") == []
+        assert product_interface.search_count("apple") == 3
+        assert len(self.names("apple", limit=2, offset=2)) == 1
+
+    def test_index_follows_writes(self, db_engine):
+        from assignment_berkeley.operations.products import product_interface
+
+        red, green, pie, banana = self.seed_catalog()
+        update_product(red, ProductUpdateData(name="Red cherry"))
+        product_interface.delete(banana)
+        product_interface.bulk_update([{"id": green, "description": "Tart cherry flavour"}])
+        product_interface.bulk_delete([pie])
+
+        assert set(self.names("cherry")) == {"Red cherry", "Green apple"}
+        assert self.names("apple") == ["Green apple"]
+        assert self.names("banana") == []
+
+    def test_search_endpoint(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+
+        self.seed_catalog()
+        client = TestClient(app)
+        page = client.get("/api/products/search", params={"q": "apple", "size": 2}).json()
+        assert page["total"] == 3
+        assert len(page["items"]) == 2
+        assert client.get("/api/products/search").status_code == 422
+
+    def test_bulk_create_without_ids_is_indexed(self, async_db_engine):
+        from fastapi.testclient import TestClient
+        from assignment_berkeley.main import app
+        from assignment_berkeley.operations.products import (
+            async_product_interface,
+            product_interface,
+        )
+
+        # 主键由列默认值生成
+        product_interface.bulk_create(
+            [{"name": "zebra lamp", "price": 1, "quantity": 1}]
+        )
+        asyncio.run(
+            async_product_interface.bulk_create(
+                [{"name": "zebra rug", "price": 1, "quantity": 1}]
+            )
+        )
+
+        assert set(self.names("zebra")) == {"zebra lamp", "zebra rug"}
+        page = TestClient(app).get("/api/products/search", params={"q": "zebra"}).json()
+        assert page["total"] == 2
+
+    def test_create_all_with_only_models_imported(self):
+        import subprocess
+        import sys
+
+        # 新进程中只导入 db.models，create_all 也要建出 product_fts
+        script = (
+            "from sqlalchemy import create_engine, inspect\n"
+            "from assignment_berkeley.db.models import Base\n"
+            "engine = create_engine('sqlite://')\n"
+            "Base.metadata.create_all(engine)\n"
+            "print('product_fts' in inspect(engine).get_table_names())\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "True"
+
+
 # 运行测试的辅助函数
 def run_tests():
     pytest.main([__file__])